@@ -0,0 +1,78 @@
+# Response compression benchmark.
+#
+# Builds a synthetic `/products/` listing, then for each encoding and level
+# reports bytes on the wire, compression ratio, CPU time to compress, and the
+# estimated transfer time over a slow store link.
+#
+#     python benchmarks/compression.py --rows 5000 --link-kbps 2000
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from util.compression import brotli, compress
+
+
+def product_listing(rows: int) -> bytes:
+    rng = random.Random(42)
+    words = ["organic", "whole", "milk", "bread", "rice", "olive", "oil", "green", "tea", "fresh", "frozen", "pack"]
+    products = [
+        {
+            "id": i,
+            "name": " ".join(rng.choices(words, k=3)).title(),
+            "desc": " ".join(rng.choices(words, k=12)),
+            "unit": rng.randint(0, 500),
+            "price": round(rng.uniform(0.5, 80), 2),
+            "cat_id": rng.randint(1, 30),
+            "supplier_id": rng.randint(1, 60),
+            "is_active": True,
+        }
+        for i in range(1, rows + 1)
+    ]
+    return json.dumps(products).encode()
+
+
+def cpu_times(fn, runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        t = time.process_time()
+        fn()
+        times.append(time.process_time() - t)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--link-kbps", type=float, default=2000, help="store link bandwidth in kilobits per second")
+    args = parser.parse_args()
+
+    body = product_listing(args.rows)
+    configs = [("identity", None)] + [("gzip", level) for level in (1, 4, 6, 9)]
+    if brotli is not None:
+        configs += [("br", quality) for quality in (1, 4, 6, 11)]
+    else:
+        print("brotli not installed; gzip only")
+
+    print(f"{args.rows} products, {len(body):,} bytes of JSON, link {args.link_kbps:g} kbit/s\n")
+    print(f"{'encoding':<10}{'level':>6}{'bytes':>12}{'ratio':>8}{'cpu ms':>10}{'wire ms':>10}{'total ms':>10}")
+    for encoding, level in configs:
+        if encoding == "identity":
+            size, cpu = len(body), 0.0
+        else:
+            levels = {"gzip_level": level} if encoding == "gzip" else {"brotli_quality": level}
+            size = len(compress(encoding, body, **levels))
+            cpu = statistics.median(cpu_times(lambda: compress(encoding, body, **levels), args.runs)) * 1000
+        wire = size * 8 / args.link_kbps
+        print(f"{encoding:<10}{level if level is not None else '-':>6}{size:>12,}{len(body) / size:>8.1f}{cpu:>10.2f}{wire:>10.1f}{cpu + wire:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Pricing engine benchmark.
+#
+# Prices a synthetic catalogue against a set of promotions with the
+# vectorised engine, and a sample of it with a per-line Python loop for
+# comparison. With --db, also runs the full reprice job (load, price, write
+# changed rows) against a throwaway SQLite database.
+#
+#     python benchmarks/pricing.py --products 500000 --rules 200 --db
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+
+def synthetic_rules(count: int, categories: int, suppliers: int, rng: random.Random) -> list[dict]:
+    rules = []
+    for i in range(1, count + 1):
+        kind = rng.choice(["percent", "amount", "price"])
+        scope = rng.choice(["category", "supplier", "store"])
+        rules.append({
+            "id": i,
+            "name": f"rule {i}",
+            "kind": kind,
+            "value": {"percent": rng.uniform(5, 40), "amount": rng.uniform(0.1, 3), "price": rng.uniform(1, 30)}[kind],
+            "product_id": None,
+            "category_id": rng.randint(1, categories) if scope == "category" else None,
+            "supplier_id": rng.randint(1, suppliers) if scope == "supplier" else None,
+            "min_quantity": rng.choice([1, 1, 1, 2, 5]),
+        })
+    return rules
+
+
+def python_loop(rules: list[dict], products, quantity: float) -> list[float]:
+    out = []
+    for product_id, price, category_id, supplier_id in products:
+        best = price
+        for rule in rules:
+            if quantity < rule["min_quantity"]:
+                continue
+            if rule["category_id"] is not None and rule["category_id"] != category_id:
+                continue
+            if rule["supplier_id"] is not None and rule["supplier_id"] != supplier_id:
+                continue
+            if rule["kind"] == "percent":
+                candidate = price * (1 - rule["value"] / 100)
+            elif rule["kind"] == "amount":
+                candidate = price - rule["value"]
+            else:
+                candidate = rule["value"]
+            best = min(best, max(candidate, 0))
+        out.append(best)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=500_000)
+    parser.add_argument("--rules", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--suppliers", type=int, default=200)
+    parser.add_argument("--loop-sample", type=int, default=5_000)
+    parser.add_argument("--db", action="store_true", help="also time the reprice job on a temporary SQLite database")
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/pricing.db"
+    from model_folder.model import PricingRule, Product
+    from util.pricing import RuleSet, price_lines
+
+    rng = random.Random(42)
+    rules = synthetic_rules(args.rules, args.categories, args.suppliers, rng)
+    products = [
+        (i, round(rng.uniform(0.5, 80), 2), rng.randint(1, args.categories), rng.randint(1, args.suppliers))
+        for i in range(1, args.products + 1)
+    ]
+    catalogue = np.array(products, dtype=float)
+    rule_set = RuleSet([PricingRule(**rule) for rule in rules])
+
+    start = time.perf_counter()
+    unit, _ = price_lines(rule_set, catalogue[:, 1], catalogue[:, 0], catalogue[:, 2], catalogue[:, 3], np.ones(len(catalogue)))
+    vectorised = time.perf_counter() - start
+    start = time.perf_counter()
+    looped = python_loop(rules, products[:args.loop_sample], 1)
+    loop = (time.perf_counter() - start) * len(products) / args.loop_sample
+    assert np.allclose(unit[:args.loop_sample], looped)
+    print(f"{args.products} products x {args.rules} rules")
+    print(f"  vectorised      {vectorised * 1000:10.0f} ms")
+    print(f"  python loop     {loop * 1000:10.0f} ms (extrapolated from {args.loop_sample})")
+
+    if args.db:
+        from sqlalchemy import insert
+        from database import SessionLocal, engine
+        from util.pricing import reprice
+        from util.schema import bootstrap_schema
+
+        bootstrap_schema(engine)
+        with SessionLocal() as db:
+            db.execute(insert(Product), [
+                {"id": p, "name": f"p{p}", "price": price, "cat_id": c, "supplier_id": s, "unit": 0} for p, price, c, s in products
+            ])
+            db.execute(insert(PricingRule), [{**rule, "is_active": True} for rule in rules])
+            db.commit()
+            for label in ("first reprice", "no-op reprice"):
+                start = time.perf_counter()
+                result = reprice(db, datetime.datetime.utcnow())
+                print(f"  {label:15} {(time.perf_counter() - start) * 1000:10.0f} ms  {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Startup-time benchmark.
+#
+# Measures how long a fresh worker process takes to import the app and run its
+# startup hook, and compares the schema check done at startup with the
+# `create_all` call every worker used to make at import.
+#
+#     python benchmarks/startup.py --runs 10
+#     DATABASE_URL=postgresql://... python benchmarks/startup.py
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKER_BOOT = """
+import asyncio, time
+t = time.perf_counter()
+from route import app
+async def boot():
+    async with app.router.lifespan_context(app):
+        pass
+asyncio.run(boot())
+print(time.perf_counter() - t)
+"""
+
+
+def boot_times(runs: int, env: dict) -> list[float]:
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", WORKER_BOOT], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def call_times(fn, runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return times
+
+
+def report(label: str, times: list[float]) -> None:
+    print(f"{label:<32} median {statistics.median(times) * 1000:8.2f} ms   max {max(times) * 1000:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    tmp = None
+    if "DATABASE_URL" not in env:
+        tmp = tempfile.TemporaryDirectory()
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    os.environ["DATABASE_URL"] = env["DATABASE_URL"]
+
+    from database import engine
+    from model_folder import model
+    from util.schema import bootstrap_schema, verify_schema
+
+    bootstrap_schema(engine)
+    report("worker import + startup", boot_times(args.runs, env))
+    report("verify_schema (startup check)", call_times(lambda: verify_schema(engine), args.runs))
+    report("create_all (old import-time DDL)", call_times(lambda: model.Base.metadata.create_all(bind=engine), args.runs))
+
+    engine.dispose()
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
-from database import Base, engine
-from model_folder.model import Staff, Supplier, Product, Category  # Add all your models
+# Creates or upgrades the database schema. Run once per deploy, before starting
+# the API workers:
+#
+#     python createtables.py
+from database import engine
+from util.schema import bootstrap_schema
 
-# This will create the tables in your PostgreSQL DB
-Base.metadata.create_all(bind=engine)
+if __name__ == "__main__":
+    version = bootstrap_schema(engine)
+    print(f"Schema is at version {version}")
@@ -1,24 +1,256 @@
 # database.py
 
+import hashlib
+import hmac
+import itertools
+import math
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import time
+from http.cookies import CookieError, SimpleCookie
+from contextvars import ContextVar
+from typing import Annotated, Optional
+from fastapi import Depends
+from sqlalchemy import Select, create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
 from dotenv import load_dotenv
 
 load_dotenv()  # Load environment variables from .env
 
-# DATABASE_URL = os.getenv("DATABASE_URL")
-DATABASE_URL = "sqlite:///./inventory.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./inventory.db")
+# Comma-separated read replicas; leave unset to send everything to DATABASE_URL.
+REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+# How long a client's reads stay on the primary after it changed something.
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+# Default per-request statement timeout in milliseconds (PostgreSQL only); 0 disables it.
+STATEMENT_TIMEOUT_MS = int(os.getenv("STATEMENT_TIMEOUT_MS", "0"))
 
-# Check if using SQLite
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(DATABASE_URL)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-print(f"Connected to DB: {DATABASE_URL}")
\ No newline at end of file
+def make_engine(url: str):
+    # Check if using SQLite
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(url, pool_pre_ping=True)
+
+
+engine = make_engine(DATABASE_URL)
+replica_engines = [make_engine(url) for url in REPLICA_DATABASE_URLS]
+_replica_cycle = itertools.cycle(replica_engines)
+
+# Read-your-writes marker returned to the client after a write, and sent back on its next requests.
+STICKY_COOKIE = "primary_until"
+STICKY_HEADER = "x-primary-until"
+
+# Set per request: whether the handler only reads, which staff member is calling,
+# until when (epoch seconds) the client's reads must use the primary, and, for
+# the response, until when they must after this request's writes.
+read_only_request: ContextVar[bool] = ContextVar("read_only_request", default=False)
+current_staff_id: ContextVar[Optional[int]] = ContextVar("current_staff_id", default=None)
+primary_until: ContextVar[float] = ContextVar("primary_until", default=0.0)
+request_writes: ContextVar[Optional[dict]] = ContextVar("request_writes", default=None)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends plain SELECTs from read-only requests to a replica and
+    everything else to the primary.
+
+    A session that has flushed keeps reading from the primary, and so does
+    every request of a client for REPLICA_STICKY_SECONDS after it committed a
+    change (read-your-writes). The deadline travels with the client as a
+    signed cookie/header, so it holds whichever worker process serves the
+    next request; see ReadOnlyRequestMiddleware.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (
+            not replica_engines
+            or not read_only_request.get()
+            or self._flushing
+            or self.info.get("wrote")
+            or not isinstance(clause, Select)
+            or clause._for_update_arg is not None
+            or primary_until.get() > time.time()
+        ):
+            return engine
+        return next(_replica_cycle)
+
+
+def _signature(value: str) -> str:
+    from util.auth import SECRET_KEY  # util.auth imports this module
+    return hmac.new(SECRET_KEY.encode(), value.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def sticky_token(until: float) -> str:
+    value = f"{until:.3f}"
+    return f"{value}.{_signature(value)}"
+
+
+def sticky_until(headers: dict[str, str]) -> float:
+    """Deadline carried by a request's sticky cookie or header (lower-cased header names); 0 if absent or forged."""
+    token = headers.get(STICKY_HEADER)
+    if token is None and "cookie" in headers:
+        try:
+            morsel = SimpleCookie(headers["cookie"]).get(STICKY_COOKIE)
+        except CookieError:
+            morsel = None
+        token = morsel.value if morsel is not None else None
+    if not token or "." not in token:
+        return 0.0
+    value, _, signature = token.rpartition(".")
+    if not hmac.compare_digest(signature, _signature(value)):
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def sticky_to_primary(headers: dict[str, str]) -> bool:
+    """Whether this request's client wrote within REPLICA_STICKY_SECONDS, so its reads must use the primary."""
+    return bool(replica_engines) and sticky_until(headers) > time.time()
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_wrote(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _stick_to_primary(session):
+    writes = request_writes.get()
+    if session.info.get("wrote") and writes is not None and replica_engines:
+        writes["until"] = time.time() + REPLICA_STICKY_SECONDS
+
+
+class ReadOnlyRequestMiddleware:
+    """
+    Marks GET/HEAD requests as read-only so their queries may use a replica.
+
+    With replicas configured, a response to a request that committed a write
+    carries a signed deadline (STICKY_COOKIE, and the STICKY_HEADER header
+    for clients without cookies). Requests sending it back read from the
+    primary until it passes, on every worker process.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if replica_engines:
+            headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+            until = sticky_until(headers)
+        else:
+            until = 0.0
+        writes: dict = {}
+
+        async def stamp(message):
+            if message["type"] == "http.response.start" and "until" in writes:
+                token = sticky_token(writes["until"])
+                cookie = f"{STICKY_COOKIE}={token}; Max-Age={math.ceil(REPLICA_STICKY_SECONDS)}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [
+                    *message.get("headers", []), (b"set-cookie", cookie.encode()), (STICKY_HEADER.encode(), token.encode()),
+                ]}
+            await send(message)
+
+        tokens = [
+            (read_only_request, read_only_request.set(scope["method"] in ("GET", "HEAD"))),
+            (primary_until, primary_until.set(until)),
+            (request_writes, request_writes.set(writes)),
+        ]
+        try:
+            await self.app(scope, receive, stamp)
+        finally:
+            for var, token in tokens:
+                var.reset(token)
+
+
+@event.listens_for(RoutingSession, "after_begin")
+def _apply_request_settings(session, transaction, connection):
+    # SET LOCAL / SET TRANSACTION only last until the transaction ends, so
+    # nothing leaks to the next user of the pooled connection.
+    if connection.dialect.name != "postgresql":
+        return
+    if session.info.get("read_only"):
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+    timeout = session.info.get("statement_timeout_ms")
+    if timeout:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+print(f"Connected to DB: {DATABASE_URL}")
+
+
+def get_db():
+    """
+    The request's unit of work.
+
+    FastAPI caches a dependency within a request, so get_current_user and the
+    handler share this one session (and at most one pooled connection).
+    GET/HEAD requests get a read-only transaction, and every transaction gets
+    STATEMENT_TIMEOUT_MS unless the route overrides it with statement_timeout().
+    """
+    # Responses are built from the objects just written, so committing must not expire them.
+    db = SessionLocal(expire_on_commit=False)
+    db.info["read_only"] = read_only_request.get()
+    db.info["statement_timeout_ms"] = STATEMENT_TIMEOUT_MS
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+dbDepend = Annotated[Session, Depends(get_db)]
+
+
+def statement_timeout(milliseconds: int):
+    """
+    Route dependency overriding STATEMENT_TIMEOUT_MS for one endpoint:
+
+        @router.get("/report", dependencies=[statement_timeout(60_000)])
+
+    Route-level dependencies are solved before the handler's parameters, so
+    the setting is in place before the first query of the request.
+    """
+    def apply(db: dbDepend):
+        db.info["statement_timeout_ms"] = milliseconds
+    return Depends(apply)
+
+
+def dispose_engines(close: bool = True) -> None:
+    engine.dispose(close=close)
+    for replica in replica_engines:
+        replica.dispose(close=close)
+
+
+# A worker forked from a parent that already opened connections (gunicorn
+# --preload, multiprocessing) must not reuse the parent's sockets: give the
+# child a fresh pool and leave the parent's connections alone.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: dispose_engines(close=False))
+
+
+def enable_wal(bind=engine) -> str:
+    """Switch a SQLite database to WAL so readers don't block the writer. Returns the journal mode."""
+    if bind.dialect.name != "sqlite":
+        return ""
+    with bind.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA journal_mode=WAL").scalar()
+
+
+def check_worker_safety(workers: int, bind=engine) -> None:
+    """Refuse multi-process serving on setups that only work with a single process."""
+    if workers <= 1 or bind.dialect.name != "sqlite":
+        return
+    if bind.url.database in (None, "", ":memory:"):
+        raise RuntimeError("An in-memory SQLite database cannot be shared between worker processes")
+    with bind.connect() as conn:
+        mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+    if str(mode).lower() != "wal":
+        raise RuntimeError(
+            f"SQLite is in '{mode}' journal mode; run `python createtables.py` to enable WAL "
+            "before serving with more than one worker"
+        )
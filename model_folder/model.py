@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, Boolean, Text, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
 
 Base =  declarative_base()
 
+# Bump together with util/schema.py MIGRATIONS whenever a table or column changes.
+SCHEMA_VERSION = 17
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+
 class Category(Base):
     __tablename__ = "categories"
     id = Column(Integer, primary_key=True, index=True)
@@ -44,6 +51,7 @@ class Supplier(Base):
     other_details = Column(String)
 
     products = relationship("Product", back_populates="supplier")
+    purchase_orders = relationship("PurchaseOrder", back_populates="supplier")
 
 class Staff(Base):
     __tablename__ = "staffs"
@@ -84,6 +92,7 @@ class Product(Base):
     cat_id = Column(Integer, ForeignKey("categories.id"))
     supplier_id = Column(Integer, ForeignKey("suppliers.id"))
     status = Column(String, default="Available")
+    code = Column(String, unique=True, index=True)  # SKU or barcode printed on the label
 
     category = relationship("Category", back_populates="products")
     supplier = relationship("Supplier", back_populates="products")
@@ -99,6 +108,8 @@ class Order(Base):
 
     order_details = relationship("Order_Detail", back_populates="order")
 
+    __table_args__ = (Index("ix_orders_customer_date", "customer_id", "order_date"),)
+
 class Order_Detail(Base):
     __tablename__ = "order_details"
     id = Column(Integer, primary_key=True, index=True)
@@ -110,7 +121,255 @@ class Order_Detail(Base):
     bill_number = Column(Integer, ForeignKey("payments.bill_number"))
     discount = Column(Float)
     total = Column(Float)
+    quantity = Column(Integer, default=1)
+    location_id = Column(Integer, ForeignKey("locations.id"))
 
     order = relationship("Order", back_populates="order_details")
     product = relationship("Product", back_populates="order_details")
-    payment = relationship("Payment", back_populates="order_detail")
\ No newline at end of file
+    payment = relationship("Payment", back_populates="order_detail")
+
+    __table_args__ = (Index("ix_order_details_product_date", "product_id", "date"),)
+
+class ArchivedOrder(Base):
+    """Order moved out of `orders` by the archival job (util/archive.py); same columns and ids."""
+    __tablename__ = "orders_archive"
+    id = Column(Integer, primary_key=True)
+    customer_id = Column(Integer, ForeignKey("users.id"))
+    detail = Column(String)
+    is_active = Column(Boolean)
+    order_date = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    order_details = relationship("ArchivedOrderDetail", back_populates="order")
+
+    __table_args__ = (Index("ix_orders_archive_customer_date", "customer_id", "order_date"),)
+
+class ArchivedOrderDetail(Base):
+    __tablename__ = "order_details_archive"
+    id = Column(Integer, primary_key=True)
+    price = Column(Float)
+    date = Column(DateTime)
+    is_active = Column(Boolean)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    bill_number = Column(Integer, ForeignKey("payments.bill_number"))
+    discount = Column(Float)
+    total = Column(Float)
+    quantity = Column(Integer)
+    location_id = Column(Integer, ForeignKey("locations.id"))
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    order = relationship("ArchivedOrder", back_populates="order_details")
+    product = relationship("Product")
+    payment = relationship("Payment")
+
+    __table_args__ = (Index("ix_order_details_archive_product_date", "product_id", "date"),)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, index=True)
+    status = Column(String, default="queued")  # queued, running, succeeded, failed, cancelled
+    payload = Column(Text)  # JSON
+    result = Column(Text)  # JSON
+    error = Column(String)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    cancel_requested = Column(Boolean, default=False)
+    created_by = Column(Integer, ForeignKey("staffs.id"))
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    run_after = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    lease_until = Column(DateTime)  # while running: renewed by the worker's heartbeat, reclaimed once past
+    dedupe_key = Column(String)  # at most one queued job per key; see util.jobs.enqueue_if_idle
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ux_jobs_queued_dedupe_key", "dedupe_key", unique=True,
+              sqlite_where=text("status = 'queued'"), postgresql_where=text("status = 'queued'")),
+    )
+
+
+class ReorderPoint(Base):
+    __tablename__ = "reorder_points"
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    daily_velocity = Column(Float)
+    reorder_point = Column(Integer)
+    computed_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class Watermark(Base):
+    """Last processed id (or cutoff time) for incremental jobs, keyed by job name."""
+    __tablename__ = "watermarks"
+    name = Column(String, primary_key=True)
+    value = Column(Integer, default=0)
+
+
+class StockMovement(Base):
+    """Append-only record of every change to Product.unit."""
+    __tablename__ = "stock_movements"
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    quantity = Column(Integer)  # signed change to Product.unit
+    kind = Column(String)  # receipt, sale, return, adjustment, transfer, count
+    reference = Column(String)  # e.g. "order_detail:12"
+    batch_id = Column(String)  # set-based writes share one id
+    location_id = Column(Integer, ForeignKey("locations.id"))  # None: not tracked per location
+    staff_id = Column(Integer, ForeignKey("staffs.id"))
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_stock_movements_product_seq", "product_id", "id"),
+        Index("ix_stock_movements_product_time", "product_id", "created_at"),
+        Index("ix_stock_movements_time", "created_at"),
+        Index("ix_stock_movements_batch_product", "batch_id", "product_id"),
+    )
+
+class StockSnapshot(Base):
+    """Product.unit as of `taken_at`, i.e. after every movement created up to then."""
+    __tablename__ = "stock_snapshots"
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    unit = Column(Integer)
+    taken_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (Index("ix_stock_snapshots_product_time", "product_id", "taken_at"),)
+
+
+class PurchaseOrder(Base):
+    __tablename__ = "purchase_orders"
+    id = Column(Integer, primary_key=True, index=True)
+    supplier_id = Column(Integer, ForeignKey("suppliers.id"), index=True)
+    status = Column(String, default="open")  # open, received, cancelled
+    reference = Column(String)
+    location_id = Column(Integer, ForeignKey("locations.id"))  # where the delivery is received
+    created_by = Column(Integer, ForeignKey("staffs.id"))
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    received_at = Column(DateTime)
+
+    supplier = relationship("Supplier", back_populates="purchase_orders")
+    lines = relationship("PurchaseOrderLine", back_populates="purchase_order")
+
+class PurchaseOrderLine(Base):
+    __tablename__ = "purchase_order_lines"
+    id = Column(Integer, primary_key=True, index=True)
+    purchase_order_id = Column(Integer, ForeignKey("purchase_orders.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    quantity = Column(Integer)
+    unit_cost = Column(Float)
+    received_quantity = Column(Integer, default=0)
+
+    purchase_order = relationship("PurchaseOrder", back_populates="lines")
+
+
+class Location(Base):
+    __tablename__ = "locations"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True)
+    kind = Column(String, default="store")  # store, warehouse
+    address = Column(String)
+    is_active = Column(Boolean, default=True)
+
+    stock = relationship("LocationStock", back_populates="location")
+
+class LocationStock(Base):
+    """Per-location quantity; Product.unit remains the global total across locations."""
+    __tablename__ = "location_stock"
+    location_id = Column(Integer, ForeignKey("locations.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    quantity = Column(Integer, default=0)
+
+    location = relationship("Location", back_populates="stock")
+
+    __table_args__ = (Index("ix_location_stock_product", "product_id"),)
+
+
+class IdempotencyKey(Base):
+    """Stored response of a write made with an Idempotency-Key header, replayed on retry."""
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)  # "<staff id>:<client key>"
+    fingerprint = Column(String)  # hash of method, path and body
+    status_code = Column(Integer)  # None while the first request is still running
+    content_type = Column(String)
+    response_body = Column(Text)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)  # when the current holder claimed the key
+    locked_until = Column(DateTime)  # while status_code is None: a retry may take over after this
+    expires_at = Column(DateTime, index=True)
+
+
+class AuditEvent(Base):
+    """One change to a row, written in batches by util/audit.py."""
+    __tablename__ = "audit_log"
+    id = Column(Integer, primary_key=True, index=True)
+    staff_id = Column(Integer, ForeignKey("staffs.id"))  # None: background jobs and scripts
+    entity = Column(String)  # table name
+    entity_id = Column(String)  # primary key, comma-separated if composite
+    action = Column(String)  # insert, update, delete, bulk_update, bulk_delete
+    changes = Column(Text)  # JSON: {"before": {...}, "after": {...}}
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+    __table_args__ = (
+        Index("ix_audit_log_entity_time", "entity", "entity_id", "created_at"),
+        Index("ix_audit_log_staff_time", "staff_id", "created_at"),
+    )
+
+
+class PricingRule(Base):
+    """
+    A promotion. It applies to lines matching every scope column that is set
+    (none set: the whole catalogue), bought in at least `min_quantity`, between
+    `starts_at` and `ends_at`. The cheapest applicable rule wins; see util/pricing.py.
+    """
+    __tablename__ = "pricing_rules"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    kind = Column(String)  # percent (off), amount (off per unit), price (fixed unit price)
+    value = Column(Float)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"))
+    supplier_id = Column(Integer, ForeignKey("suppliers.id"))
+    min_quantity = Column(Integer, default=1)
+    starts_at = Column(DateTime)
+    ends_at = Column(DateTime)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ProductPrice(Base):
+    """Single-unit selling price of each product after promotions, refreshed by the pricing.reprice job."""
+    __tablename__ = "product_prices"
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    list_price = Column(Float)
+    unit_price = Column(Float)
+    rule_id = Column(Integer, ForeignKey("pricing_rules.id"))  # None: list price
+    computed_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class DemandForecast(Base):
+    """Expected daily sales of a product over the next `horizon_days`, from the demand.forecast job."""
+    __tablename__ = "demand_forecasts"
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    method = Column(String)  # exponential, moving_average
+    horizon_days = Column(Integer)
+    daily = Column(Text)  # JSON list, one quantity per day starting on the day of computed_at
+    total = Column(Float)
+    computed_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+
+class StockTake(Base):
+    """A physical count session; counts are staged in stock_take_lines and applied in one go."""
+    __tablename__ = "stock_takes"
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, default="open")  # open, applied, cancelled
+    reference = Column(String)
+    location_id = Column(Integer, ForeignKey("locations.id"))  # None: counts are of Product.unit
+    batch_id = Column(String)  # stock movements written on apply
+    created_by = Column(Integer, ForeignKey("staffs.id"))
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    applied_at = Column(DateTime)
+
+class StockTakeLine(Base):
+    __tablename__ = "stock_take_lines"
+    stock_take_id = Column(Integer, ForeignKey("stock_takes.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    counted = Column(Integer)
+    expected = Column(Integer)  # stock on record when applied; None while open
@@ -1,13 +1,48 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from database import engine
-import model_folder.model as model
-from route_folder import category, payment, product, role, staff, user, order, orderdetail, supplier
+from database import ReadOnlyRequestMiddleware, dispose_engines, engine
+from route_folder import category, payment, product, role, staff, user, order, orderdetail, supplier, job, reorder, stock, purchaseorder, location, audit, pricing, forecast, stocktake
 from util import auth
+from util.audit import writer as audit_writer
+from util.changes import follower as change_follower
+from util.coalesce import CoalescingMiddleware
+from util.compression import CompressionMiddleware
+from util.idempotency import IdempotencyMiddleware
+from util.jobs import workers as job_workers
+from util.ratelimit import RateLimitMiddleware
+from util.schema import verify_schema
+from util.stream import product_feed
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema changes are applied by `python createtables.py`; workers only check the version.
+    verify_schema(engine)
+    audit_writer.start()
+    job_workers.start()
+    change_follower.start()
+    product_feed.start()
+    yield
+    await product_feed.stop()
+    change_follower.stop()
+    job_workers.stop()
+    # After the workers, so changes made by jobs that were still running are written too.
+    audit_writer.stop()
+    # Graceful shutdown: close this worker's pooled connections.
+    dispose_engines()
 
+app = FastAPI(lifespan=lifespan)
+
+
+# The last middleware added runs first: CORS, then rate limiting, then coalescing, then compression, then idempotency.
+# Compression sits outside idempotency so stored responses are replayed uncompressed and re-negotiated;
+# coalescing sits outside compression so waiters share the already compressed bytes.
+app.add_middleware(ReadOnlyRequestMiddleware)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(CoalescingMiddleware)
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  # Replace with frontend origin
@@ -16,8 +51,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-model.Base.metadata.create_all(bind=engine)
-
 app.include_router(auth.app, prefix="/auth", tags=["Auth"])
 app.include_router(category.router, prefix="/categories", tags=["Categories"])
 app.include_router(role.router, prefix="/roles", tags=["Roles"])
@@ -28,3 +61,12 @@ app.include_router(supplier.router, prefix="/suppliers", tags=["Supplier"])
 app.include_router(user.router, prefix="/users", tags=["Users"])
 app.include_router(order.router, prefix="/orders", tags=["Order"])
 app.include_router(orderdetail.router, prefix="/orderdetails", tags=["OrderDetails"])
+app.include_router(job.router, prefix="/jobs", tags=["Jobs"])
+app.include_router(reorder.router, prefix="/reorder", tags=["Reorder"])
+app.include_router(stock.router, prefix="/stock", tags=["Stock"])
+app.include_router(purchaseorder.router, prefix="/purchase-orders", tags=["PurchaseOrders"])
+app.include_router(location.router, prefix="/locations", tags=["Locations"])
+app.include_router(audit.router, prefix="/audit", tags=["Audit"])
+app.include_router(pricing.router, prefix="/pricing", tags=["Pricing"])
+app.include_router(forecast.router, prefix="/forecasts", tags=["Forecasts"])
+app.include_router(stocktake.router, prefix="/stocktakes", tags=["StockTakes"])
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Query, status
+from model_folder.model import AuditEvent
+from database import dbDepend
+from typing import Annotated, Any, List, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+import json
+from util.auth import userDepend
+
+router = APIRouter()
+
+# --- Pydantic Schemas ---
+class AuditEventResponse(BaseModel):
+    id: int
+    staff_id: Optional[int]
+    entity: str
+    entity_id: Optional[str]
+    action: str
+    changes: Any
+    created_at: datetime
+
+class AuditQuery(BaseModel):
+    entity: Optional[str] = Field(None, description="Table name, e.g. `products`")
+    entity_id: Optional[str] = None
+    staff_id: Optional[int] = None
+    action: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    before_id: Optional[int] = Field(None, description="`id` of the last event on the previous page")
+    limit: int = Field(100, gt=0, le=1000)
+
+# --- FastAPI Router ---
+@router.get("/", status_code=status.HTTP_200_OK, response_model=List[AuditEventResponse], summary="Search the audit log")
+async def list_audit_events(db: dbDepend, params: Annotated[AuditQuery, Query()], user: userDepend):
+    """
+    Recorded changes, newest first.
+
+    Events are written in batches a moment after the change commits, so the
+    last second or so may not be visible yet.
+    """
+    query = db.query(AuditEvent)
+    if params.entity is not None:
+        query = query.filter(AuditEvent.entity == params.entity)
+    if params.entity_id is not None:
+        query = query.filter(AuditEvent.entity_id == params.entity_id)
+    if params.staff_id is not None:
+        query = query.filter(AuditEvent.staff_id == params.staff_id)
+    if params.action is not None:
+        query = query.filter(AuditEvent.action == params.action)
+    if params.since is not None:
+        query = query.filter(AuditEvent.created_at >= params.since)
+    if params.until is not None:
+        query = query.filter(AuditEvent.created_at <= params.until)
+    if params.before_id is not None:
+        query = query.filter(AuditEvent.id < params.before_id)
+    return [
+        AuditEventResponse(
+            id=event.id,
+            staff_id=event.staff_id,
+            entity=event.entity,
+            entity_id=event.entity_id,
+            action=event.action,
+            changes=json.loads(event.changes) if event.changes else None,
+            created_at=event.created_at,
+        )
+        for event in query.order_by(AuditEvent.id.desc()).limit(params.limit)
+    ]
@@ -1,23 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, status
+from fastapi import APIRouter, HTTPException, Path, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session, joinedload
-from model_folder.model import Category, Staff
-from database import SessionLocal
+from model_folder.model import Category, Product
+from database import dbDepend
 from typing import Annotated, List, Optional
 from pydantic import BaseModel, Field
-from util.auth import get_current_user
+from util.auth import userDepend
+from util.productcache import catalogue_changed
+from util.writes import update_returning
 
-#Dependecies
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 router = APIRouter()
 
-dbDepend = Annotated[Session, Depends(get_db)]
-userDepend = Annotated[Staff, Depends(get_current_user)]
 
 # --- Pydantic Schemas ---
 class CategoryCreate(BaseModel):
@@ -37,6 +30,10 @@ class CategoryResponse(CategoryCreate):
         from_attributes = True
 
 
+def _product_count(db: Session, cate_id: int) -> int:
+    # A COUNT instead of lazy-loading every product of the category.
+    return db.query(func.count(Product.id)).filter(Product.cat_id == cate_id).scalar()
+
 # --- FastAPI Router ---
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=CategoryResponse, summary="Create new category")
 async def create_category(db: dbDepend, cate: CategoryCreate, user: userDepend):
@@ -44,13 +41,12 @@ async def create_category(db: dbDepend, cate: CategoryCreate, user: userDepend):
     new_cate = Category(**cate.dict(), is_active=True)
     db.add(new_cate)
     db.commit()
-    db.refresh(new_cate)
     return CategoryResponse(
         id=new_cate.id,
         name=new_cate.name,
         description=new_cate.description,
         is_active=new_cate.is_active,
-        product_count=len(new_cate.products)
+        product_count=0
     )
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=List[CategoryResponse], summary="All active categories")
@@ -103,49 +99,47 @@ async def update_category(db: dbDepend, cate_id: Annotated[int, Path(..., gt=0)]
     cat = db.query(Category).filter(Category.id == cate_id).first()
     if not cat:
         raise HTTPException(status_code=404, detail="Category does not exist")
-    for field, value in cate_req.model_dump(exclude_unset=True).items():
+    changes = cate_req.model_dump(exclude_unset=True)
+    for field, value in changes.items():
         setattr(cat, field, value)
+    if "name" in changes:
+        catalogue_changed(db)  # cached products carry the category name
     db.commit()
-    db.refresh(cat)
 
     return CategoryResponse(
         id=cat.id,
         name=cat.name,
         description=cat.description,
         is_active=cat.is_active,
-        product_count=len(cat.products)
+        product_count=_product_count(db, cat.id)
     )
 
 @router.patch("/{cate_id}/deactivate", status_code=status.HTTP_200_OK, response_model=CategoryResponse, summary="Deactivate category")
 async def deactivate_category(db: dbDepend, cate_id: Annotated[int, Path(gt=0)], user: userDepend):
     """Soft delete (deactivate) a category."""
-    cat = db.query(Category).filter(Category.id == cate_id).first()
+    cat = update_returning(db, Category, {"is_active": False}, Category.id == cate_id)
     if not cat:
         raise HTTPException(status_code=404, detail="Category does not exist")
-    cat.is_active = False
     db.commit()
-    db.refresh(cat)
     return CategoryResponse(
         id=cat.id,
         name=cat.name,
         description=cat.description,
         is_active=cat.is_active,
-        product_count=len(cat.products)
+        product_count=_product_count(db, cat.id)
     )
 
 @router.patch("/{cate_id}/reactivate", status_code=status.HTTP_200_OK, response_model=CategoryResponse, summary="Reactivate category")
 async def reactivate_category(db: dbDepend, cate_id: Annotated[int, Path(gt=0)], user: userDepend):
     """Reactivate a previously soft-deleted category."""
-    cat = db.query(Category).filter(Category.id == cate_id).first()
+    cat = update_returning(db, Category, {"is_active": True}, Category.id == cate_id)
     if not cat:
         raise HTTPException(status_code=404, detail="Category does not exist")
-    cat.is_active = True
     db.commit()
-    db.refresh(cat)
     return CategoryResponse(
         id=cat.id,
         name=cat.name,
         description=cat.description,
         is_active=cat.is_active,
-        product_count=len(cat.products)
+        product_count=_product_count(db, cat.id)
     )
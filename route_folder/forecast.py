@@ -0,0 +1,87 @@
+from fastapi import APIRouter, HTTPException, Path, status
+from model_folder.model import DemandForecast, Product, Supplier
+from database import dbDepend
+from typing import Annotated, List
+from pydantic import BaseModel
+from datetime import datetime
+import json
+from util.auth import userDepend
+from util.jobs import enqueue
+import util.forecast  # registers the scheduled "demand.forecast" job
+
+router = APIRouter()
+
+# --- Pydantic Schemas ---
+class ProductForecast(BaseModel):
+    product_id: int
+    method: str
+    horizon_days: int
+    daily: List[float]
+    total: float
+    unit: int  # current stock
+    shortfall: float  # forecast demand not covered by current stock
+    computed_at: datetime
+
+class SupplierForecast(BaseModel):
+    supplier_id: int
+    supplier_name: str
+    total: float
+    shortfall: float
+    products: List[ProductForecast]
+
+class ForecastQueued(BaseModel):
+    job_id: int
+    status: str
+
+def _product_forecast(forecast: DemandForecast, unit) -> ProductForecast:
+    return ProductForecast(
+        product_id=forecast.product_id,
+        method=forecast.method,
+        horizon_days=forecast.horizon_days,
+        daily=json.loads(forecast.daily),
+        total=forecast.total,
+        unit=unit or 0,
+        shortfall=max(forecast.total - (unit or 0), 0),
+        computed_at=forecast.computed_at,
+    )
+
+# --- FastAPI Router ---
+@router.post("/run", status_code=status.HTTP_202_ACCEPTED, response_model=ForecastQueued, summary="Recompute demand forecasts")
+async def run_forecasts(db: dbDepend, user: userDepend):
+    """Queue a full-catalogue forecast run (otherwise nightly); poll `/jobs/{job_id}` for the result."""
+    job = enqueue(db, "demand.forecast", created_by=user.id)
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/products/{product_id}", status_code=status.HTTP_200_OK, response_model=ProductForecast, summary="Demand forecast of a product")
+async def get_product_forecast(db: dbDepend, product_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Forecast daily demand of a product, as of the last run."""
+    row = (
+        db.query(DemandForecast, Product.unit)
+        .join(Product, Product.id == DemandForecast.product_id)
+        .filter(DemandForecast.product_id == product_id)
+        .first()
+    )
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Forecast not found")
+    return _product_forecast(*row)
+
+@router.get("/suppliers/{supplier_id}", status_code=status.HTTP_200_OK, response_model=SupplierForecast, summary="Demand forecast of a supplier's products")
+async def get_supplier_forecast(db: dbDepend, supplier_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Forecasts of every product of a supplier, largest shortfall first, with totals to size the next purchase order."""
+    supplier = db.query(Supplier).filter(Supplier.id == supplier_id).first()
+    if supplier is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Supplier not found")
+    rows = (
+        db.query(DemandForecast, Product.unit)
+        .join(Product, Product.id == DemandForecast.product_id)
+        .filter(Product.supplier_id == supplier_id)
+        .all()
+    )
+    products = sorted((_product_forecast(*row) for row in rows), key=lambda p: (-p.shortfall, p.product_id))
+    return SupplierForecast(
+        supplier_id=supplier.id,
+        supplier_name=supplier.name,
+        total=sum(p.total for p in products),
+        shortfall=sum(p.shortfall for p in products),
+        products=products,
+    )
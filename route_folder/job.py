@@ -0,0 +1,86 @@
+from fastapi import APIRouter, HTTPException, Path, Query, status
+from model_folder.model import Job
+from database import dbDepend
+from typing import Annotated, Any, List, Optional
+from pydantic import BaseModel
+from datetime import datetime
+import json
+from util.auth import userDepend
+from util.jobs import request_cancel
+
+router = APIRouter()
+
+# --- Pydantic Schemas ---
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    max_attempts: int
+    cancel_requested: bool
+    error: Optional[str] = None
+    result: Optional[Any] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @classmethod
+    def from_job(cls, job: Job, with_result: bool = True) -> "JobResponse":
+        return cls(
+            id=job.id,
+            kind=job.kind,
+            status=job.status,
+            attempts=job.attempts or 0,
+            max_attempts=job.max_attempts,
+            cancel_requested=bool(job.cancel_requested),
+            error=job.error,
+            result=json.loads(job.result) if with_result and job.result else None,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+        )
+
+# --- FastAPI Router ---
+@router.get("/", status_code=status.HTTP_200_OK, response_model=List[JobResponse], summary="List recent jobs")
+async def list_jobs(db: dbDepend, user: userDepend, job_status: Annotated[Optional[str], Query(alias="status")] = None, limit: Annotated[int, Query(gt=0, le=500)] = 50):
+    """List the most recent jobs, optionally filtered by status (results omitted)."""
+    query = db.query(Job)
+    if job_status:
+        query = query.filter(Job.status == job_status)
+    return [JobResponse.from_job(job, with_result=False) for job in query.order_by(Job.id.desc()).limit(limit).all()]
+
+@router.get("/{job_id}", status_code=status.HTTP_200_OK, response_model=JobResponse, summary="Get job status")
+async def get_job(db: dbDepend, job_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Poll a job's status; `result` is filled once it has succeeded."""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return JobResponse.from_job(job)
+
+@router.post("/{job_id}/cancel", status_code=status.HTTP_200_OK, response_model=JobResponse, summary="Cancel job")
+async def cancel_job(db: dbDepend, job_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Cancel a queued job, or ask a running job to stop."""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if job.status not in ("queued", "running"):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is already {job.status}")
+    return JobResponse.from_job(request_cancel(db, job))
+
+@router.post("/{job_id}/retry", status_code=status.HTTP_200_OK, response_model=JobResponse, summary="Retry job")
+async def retry_job(db: dbDepend, job_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Queue a failed or cancelled job again with a fresh attempt budget."""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if job.status not in ("failed", "cancelled"):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}")
+    job.status = "queued"
+    job.attempts = 0
+    job.cancel_requested = False
+    job.error = None
+    job.run_after = datetime.utcnow()
+    job.started_at = None
+    job.finished_at = None
+    db.commit()
+    return JobResponse.from_job(job)
@@ -0,0 +1,144 @@
+from fastapi import APIRouter, HTTPException, Path, Query, status
+from sqlalchemy.orm import Session
+from model_folder.model import Location, LocationStock, Product
+from database import dbDepend
+from typing import Annotated, List, Literal, Optional
+from pydantic import BaseModel, Field
+from util.auth import userDepend
+from util.ledger import record_transfer
+from util.writes import update_returning
+
+router = APIRouter()
+
+# --- Pydantic Schemas ---
+class LocationCreate(BaseModel):
+    name: str = Field(..., min_length=2, example="Main warehouse")
+    kind: Literal["store", "warehouse"] = "store"
+    address: Optional[str] = None
+
+class LocationResponse(LocationCreate):
+    id: int
+    is_active: bool
+
+    class Config:
+        from_attributes = True
+
+class LocationStockResponse(BaseModel):
+    location_id: int
+    product_id: int
+    quantity: int
+
+    class Config:
+        from_attributes = True
+
+class ProductAvailability(BaseModel):
+    product_id: int
+    total: int
+    unassigned: int  # part of Product.unit not held at any location
+    locations: List[LocationStockResponse]
+
+class TransferLine(BaseModel):
+    product_id: int = Field(..., gt=0)
+    quantity: int = Field(..., gt=0)
+
+class TransferRequest(BaseModel):
+    from_location_id: int = Field(..., gt=0)
+    to_location_id: int = Field(..., gt=0)
+    lines: List[TransferLine] = Field(..., min_length=1)
+
+class TransferResult(BaseModel):
+    moved: int
+
+def _get_location(db: Session, location_id: int) -> Location:
+    location = db.query(Location).filter(Location.id == location_id).first()
+    if not location:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Location not found")
+    return location
+
+# --- FastAPI Router ---
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=LocationResponse, summary="Create location")
+async def create_location(db: dbDepend, loc: LocationCreate, user: userDepend):
+    """Add a store or warehouse."""
+    location = Location(**loc.model_dump(), is_active=True)
+    db.add(location)
+    db.commit()
+    return location
+
+@router.get("/", status_code=status.HTTP_200_OK, response_model=List[LocationResponse], summary="All active locations")
+async def get_locations(db: dbDepend, user: userDepend):
+    """Retrieve all active locations."""
+    return db.query(Location).filter(Location.is_active == True).order_by(Location.id).all()
+
+@router.post("/transfers", status_code=status.HTTP_200_OK, response_model=TransferResult, summary="Transfer stock between locations")
+async def transfer_stock(db: dbDepend, req: TransferRequest, user: userDepend):
+    """Move stock from one location to another; the global Product.unit is unchanged."""
+    if req.from_location_id == req.to_location_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Source and destination are the same location")
+    for location_id in (req.from_location_id, req.to_location_id):
+        if not _get_location(db, location_id).is_active:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Location {location_id} is inactive")
+    wanted: dict[int, int] = {}
+    for line in req.lines:
+        wanted[line.product_id] = wanted.get(line.product_id, 0) + line.quantity
+    reference = f"transfer:{req.from_location_id}->{req.to_location_id}"
+    # In product order, so concurrent transfers lock the same rows in the same order.
+    short = [
+        product_id for product_id in sorted(wanted)
+        if not record_transfer(db, product_id, wanted[product_id], req.from_location_id, req.to_location_id, reference)
+    ]
+    if short:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Not enough stock at source for products: {short}")
+    db.commit()
+    return {"moved": sum(wanted.values())}
+
+@router.get("/availability/{product_id}", status_code=status.HTTP_200_OK, response_model=ProductAvailability, summary="Stock of a product per location")
+async def get_product_availability(db: dbDepend, product_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Global stock of a product and its breakdown by location."""
+    total = db.query(Product.unit).filter(Product.id == product_id).first()
+    if total is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    rows = db.query(LocationStock).filter(LocationStock.product_id == product_id).order_by(LocationStock.location_id).all()
+    total = total[0] or 0
+    return {
+        "product_id": product_id,
+        "total": total,
+        "unassigned": total - sum(row.quantity or 0 for row in rows),
+        "locations": rows,
+    }
+
+@router.get("/{location_id}", status_code=status.HTTP_200_OK, response_model=LocationResponse, summary="Get location by ID")
+async def get_location(db: dbDepend, location_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Retrieve a location by its ID."""
+    return _get_location(db, location_id)
+
+@router.get("/{location_id}/stock", status_code=status.HTTP_200_OK, response_model=List[LocationStockResponse], summary="Stock held at a location")
+async def get_location_stock(db: dbDepend, location_id: Annotated[int, Path(gt=0)], user: userDepend,
+                             after_product_id: int = 0, limit: Annotated[int, Query(gt=0, le=1000)] = 200):
+    """Products held at a location, paged by product id."""
+    _get_location(db, location_id)
+    return (
+        db.query(LocationStock)
+        .filter(LocationStock.location_id == location_id, LocationStock.product_id > after_product_id)
+        .order_by(LocationStock.product_id)
+        .limit(limit)
+        .all()
+    )
+
+@router.patch("/{location_id}/deactivate", status_code=status.HTTP_200_OK, response_model=LocationResponse, summary="Deactivate location")
+async def deactivate_location(db: dbDepend, location_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Soft delete (deactivate) a location."""
+    location = update_returning(db, Location, {"is_active": False}, Location.id == location_id)
+    if not location:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Location not found")
+    db.commit()
+    return location
+
+@router.patch("/{location_id}/reactivate", status_code=status.HTTP_200_OK, response_model=LocationResponse, summary="Reactivate location")
+async def reactivate_location(db: dbDepend, location_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Reactivate a previously soft-deleted location."""
+    location = update_returning(db, Location, {"is_active": True}, Location.id == location_id)
+    if not location:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Location not found")
+    db.commit()
+    return location
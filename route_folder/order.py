@@ -1,24 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, Path, status
-from sqlalchemy.orm import Session
-from model_folder.model import Order, Staff
-from database import SessionLocal
-from typing import Annotated, Optional
-from pydantic import BaseModel, Field
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
+from model_folder.model import ArchivedOrder, ArchivedOrderDetail, Order, Order_Detail
+from database import dbDepend
+from typing import Annotated, List, Optional
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
-from util.auth import get_current_user
+from util.auth import userDepend
+from util.archive import restore_order
+from util.batch import in_request_order, parse_ids
+from util.pricing import line_total
+from util.jobs import enqueue
+from util.writes import update_returning
 
 
-# Dependencies
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 router = APIRouter()
-dbDepend = Annotated[Session, Depends(get_db)]
-userDepend = Annotated[Staff, Depends(get_current_user)]
 
 # --- Pydantic Schemas ---
 class OrderCreate(BaseModel):
@@ -33,6 +29,56 @@ class OrderResponse(OrderCreate):
     class Config:
         from_attributes = True
 
+class OrderBulkRequest(BaseModel):
+    ids: Optional[List[int]] = Field(None, example=[1, 2, 3])
+    customer_id: Optional[int] = None
+    before: Optional[datetime] = Field(None, description="Only orders placed before this time")
+
+    @model_validator(mode="after")
+    def require_filter(self):
+        if self.ids is None and self.customer_id is None and self.before is None:
+            raise ValueError("Provide ids, customer_id or before")
+        return self
+
+class BulkResult(BaseModel):
+    affected: int
+
+class OrderBatch(BaseModel):
+    items: List[OrderResponse]
+    missing: List[int]
+
+class ArchiveQueued(BaseModel):
+    job_id: int
+    status: str
+
+class ReceiptLine(BaseModel):
+    id: int
+    product_id: Optional[int]
+    product_name: Optional[str]
+    quantity: int
+    price: float
+    discount: float
+    payment_type: Optional[str]
+    line_total: float
+
+class Receipt(OrderResponse):
+    lines: List[ReceiptLine]
+    subtotal: float
+    discount_total: float
+    total: float
+
+def _bulk_set_active(db: Session, req: OrderBulkRequest, active: bool) -> int:
+    query = db.query(Order).filter(Order.is_active == (not active))
+    if req.ids is not None:
+        query = query.filter(Order.id.in_(req.ids))
+    if req.customer_id is not None:
+        query = query.filter(Order.customer_id == req.customer_id)
+    if req.before is not None:
+        query = query.filter(Order.order_date < req.before)
+    affected = query.update({Order.is_active: active}, synchronize_session=False)
+    db.commit()
+    return affected
+
 # --- FastAPI Router ---
 @router.post("/", status_code=status.HTTP_201_CREATED, summary="Add new order")
 async def add_order(db: dbDepend, orde: OrderCreate, user: userDepend):
@@ -40,9 +86,24 @@ async def add_order(db: dbDepend, orde: OrderCreate, user: userDepend):
     new_order = Order(**orde.dict())
     db.add(new_order)
     db.commit()
-    db.refresh(new_order)
     return new_order
 
+@router.post("/bulk/deactivate", status_code=status.HTTP_200_OK, response_model=BulkResult, summary="Deactivate many orders")
+async def bulk_deactivate_orders(db: dbDepend, req: OrderBulkRequest, user: userDepend):
+    """Deactivate every matching active order with a single UPDATE."""
+    return {"affected": _bulk_set_active(db, req, False)}
+
+@router.post("/bulk/reactivate", status_code=status.HTTP_200_OK, response_model=BulkResult, summary="Reactivate many orders")
+async def bulk_reactivate_orders(db: dbDepend, req: OrderBulkRequest, user: userDepend):
+    """Reactivate every matching inactive order with a single UPDATE."""
+    return {"affected": _bulk_set_active(db, req, True)}
+
+@router.post("/archive", status_code=status.HTTP_202_ACCEPTED, response_model=ArchiveQueued, summary="Archive old and closed orders now")
+async def archive_orders_now(db: dbDepend, user: userDepend):
+    """Queue the archival job that otherwise runs on its schedule; poll `/jobs/{job_id}` for the counts moved."""
+    job = enqueue(db, "orders.archive", created_by=user.id)
+    return {"job_id": job.id, "status": job.status}
+
 @router.get("/active", status_code=status.HTTP_200_OK, summary="Get all active orders")
 async def get_all_active_orders(db: dbDepend, user: userDepend):
     """Get all active orders."""
@@ -55,14 +116,79 @@ async def get_inactive_orders(db: dbDepend, user: userDepend):
     orders = db.query(Order).filter(Order.is_active == False).order_by(Order.id).all()
     return orders
 
+@router.get("/batch", status_code=status.HTTP_200_OK, response_model=OrderBatch, summary="Get many orders by ID")
+async def get_orders_by_ids(db: dbDepend, ids: Annotated[List[int], Depends(parse_ids)], user: userDepend):
+    """Orders for `ids` in request order from one IN query; unknown ids are listed in `missing`."""
+    orders = db.query(Order).filter(Order.id.in_(ids)).all()
+    if len(orders) < len(ids):
+        orders += db.query(ArchivedOrder).filter(ArchivedOrder.id.in_(ids)).all()
+    items, missing = in_request_order(orders, ids, lambda order: order.id)
+    return {"items": items, "missing": missing}
+
 @router.get("/{order_id}", status_code=status.HTTP_200_OK, summary="Get order by ID")
 async def get_order_by_id(db: dbDepend, order_id: Annotated[int, Path(..., gt=0)], user: userDepend):
-    """Get order by ID."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    """Get order by ID, from the archive if it has been archived."""
+    order = db.query(Order).filter(Order.id == order_id).first() or db.query(ArchivedOrder).filter(ArchivedOrder.id == order_id).first()
     if order:
         return order
     raise HTTPException(status_code=404, detail="Order not found")
 
+@router.get("/{order_id}/receipt", status_code=status.HTTP_200_OK, response_model=Receipt, summary="Order with its lines and totals")
+async def get_order_receipt(db: dbDepend, order_id: Annotated[int, Path(..., gt=0)], user: userDepend):
+    """
+    An order with its active lines, product names, payment types and totals.
+
+    Three queries whatever the number of lines: the order, its lines with
+    products and payments (one batched selectinload), and the totals summed
+    in SQL. Archived orders are looked up in the archive tables.
+    """
+    for order_model, detail_model in ((Order, Order_Detail), (ArchivedOrder, ArchivedOrderDetail)):
+        order = (
+            db.query(order_model)
+            .options(selectinload(order_model.order_details).options(joinedload(detail_model.product), joinedload(detail_model.payment)))
+            .filter(order_model.id == order_id)
+            .first()
+        )
+        if order is not None:
+            break
+    else:
+        raise HTTPException(status_code=404, detail="Order not found")
+    gross = func.coalesce(detail_model.price, 0) * func.coalesce(detail_model.quantity, 1)
+    subtotal, discount_total = (
+        db.query(
+            func.coalesce(func.sum(gross), 0),
+            func.coalesce(func.sum(gross * func.coalesce(detail_model.discount, 0) / 100), 0),
+        )
+        .filter(detail_model.order_id == order_id, detail_model.is_active == True)
+        .one()
+    )
+    lines = []
+    for detail in sorted(order.order_details, key=lambda d: d.id):
+        if not detail.is_active:
+            continue
+        price, quantity, discount = detail.price or 0, detail.quantity or 1, detail.discount or 0
+        lines.append(ReceiptLine(
+            id=detail.id,
+            product_id=detail.product_id,
+            product_name=detail.product.name if detail.product else None,
+            quantity=quantity,
+            price=price,
+            discount=discount,
+            payment_type=detail.payment.payment_type if detail.payment else None,
+            line_total=line_total(price, quantity, discount),
+        ))
+    return Receipt(
+        id=order.id,
+        customer_id=order.customer_id,
+        detail=order.detail,
+        order_date=order.order_date,
+        is_active=order.is_active,
+        lines=lines,
+        subtotal=subtotal,
+        discount_total=discount_total,
+        total=subtotal - discount_total,
+    )
+
 @router.put("/{order_id}", status_code=status.HTTP_200_OK, summary="Update order")
 async def update_order(db: dbDepend, order_id: Annotated[int, Path(..., gt=0)],    order_req: OrderCreate, user: userDepend):
     """Update order."""
@@ -72,25 +198,33 @@ async def update_order(db: dbDepend, order_id: Annotated[int, Path(..., gt=0)],
     for field, value in order_req.model_dump(exclude_unset=True).items():
         setattr(order, field, value)
     db.commit()
-    db.refresh(order)
     return {"message": "Order updated successfully"}
 
 @router.patch("/{order_id}", status_code=status.HTTP_200_OK, summary="Deactivate orders")
 async def deactivate_order(db: dbDepend, order_id: Annotated[int, Path(..., gt=0)], user: userDepend):
     """Deactivate order."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = update_returning(db, Order, {"is_active": False}, Order.id == order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
-    order.is_active = False
     db.commit()
     return {"message": "Order deactivated successfully"}
 
 @router.patch("/{order_id}/reactivate", status_code=status.HTTP_200_OK, summary="Activate orders")
 async def reactivate_order(db: dbDepend, order_id: Annotated[int, Path(..., gt=0)], user: userDepend):
     """Reactivate order."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = update_returning(db, Order, {"is_active": True}, Order.id == order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
-    order.is_active = True
     db.commit()
     return {"message": "Order reactivated successfully"}
+
+@router.post("/{order_id}/restore", status_code=status.HTTP_200_OK, response_model=OrderResponse, summary="Restore archived order")
+async def restore_archived_order(db: dbDepend, order_id: Annotated[int, Path(..., gt=0)], user: userDepend):
+    """Move an archived order and its lines back to the live tables."""
+    order = restore_order(db, order_id)
+    if order is None:
+        if db.query(Order.id).filter(Order.id == order_id).first():
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Order is not archived")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    db.commit()
+    return order
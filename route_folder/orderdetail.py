@@ -1,23 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Path
+from fastapi import APIRouter, HTTPException, status, Path
+from sqlalchemy import String, cast, func, literal, select
 from sqlalchemy.orm import Session, joinedload
-from database import SessionLocal
+from database import dbDepend
 from typing import Annotated, List, Optional
-from model_folder.model import Order_Detail, Staff
-from pydantic import BaseModel, computed_field
+from model_folder.model import ArchivedOrderDetail, Order_Detail
+from pydantic import BaseModel, Field, computed_field, model_validator
 from datetime import datetime
-from util.auth import get_current_user
-
-# Dependencies
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from util.auth import userDepend
+from util.ledger import record_movement, record_movements
+from util.pricing import line_total, quote
+from util.writes import update_returning
 
 router = APIRouter()
-dbDepend = Annotated[Session, Depends(get_db)]
-userDepend = Annotated[Staff, Depends(get_current_user)]
 
 # --- Pydantic Schemas ---
 class OrderDetailBase(BaseModel):
@@ -26,6 +20,8 @@ class OrderDetailBase(BaseModel):
     bill_number: Optional[int] = None
     price: Optional[float] = None
     discount: Optional[float] = None
+    quantity: Optional[int] = Field(1, gt=0)
+    location_id: Optional[int] = None
     # total is calculated, not inputted
 
 class Order_DetailOut(OrderDetailBase):
@@ -36,32 +32,88 @@ class Order_DetailOut(OrderDetailBase):
 
     @computed_field(return_type=float)
     def total(self) -> float:
-            return (self.price or 0) * (1 - (self.discount or 0) / 100)
+        return line_total(self.price, self.quantity, self.discount)
 
     model_config = {
         "from_attributes": True,
         "populate_by_name": True,
     }
 
+class OrderDetailBulkRequest(BaseModel):
+    ids: Optional[List[int]] = Field(None, example=[1, 2, 3])
+    order_ids: Optional[List[int]] = None
+    before: Optional[datetime] = Field(None, description="Only lines dated before this time")
+
+    @model_validator(mode="after")
+    def require_filter(self):
+        if self.ids is None and self.order_ids is None and self.before is None:
+            raise ValueError("Provide ids, order_ids or before")
+        return self
+
+class BulkResult(BaseModel):
+    affected: int
+
+def _bulk_set_active(db: Session, req: OrderDetailBulkRequest, active: bool) -> int:
+    criteria = [Order_Detail.is_active == (not active)]
+    if req.ids is not None:
+        criteria.append(Order_Detail.id.in_(req.ids))
+    if req.order_ids is not None:
+        criteria.append(Order_Detail.order_id.in_(req.order_ids))
+    if req.before is not None:
+        criteria.append(Order_Detail.date < req.before)
+    # Voiding lines puts their stock back; reactivating sells it again.
+    sign = -1 if active else 1
+    record_movements(
+        db,
+        select(
+            Order_Detail.product_id.label("product_id"),
+            (sign * func.coalesce(Order_Detail.quantity, 1)).label("quantity"),
+            (literal("order_detail:") + cast(Order_Detail.id, String)).label("reference"),
+            Order_Detail.location_id.label("location_id"),
+        ).where(Order_Detail.product_id.isnot(None), *criteria),
+        "sale" if active else "return",
+    )
+    affected = db.query(Order_Detail).filter(*criteria).update({Order_Detail.is_active: active}, synchronize_session=False)
+    db.commit()
+    return affected
+
 # --- FastAPI Router ---
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=OrderDetailBase, summary="Create new Order detail")
 async def create_order_detail(order_req: OrderDetailBase, db: dbDepend, user: userDepend):
-    """Create a new order_detail."""
+    """Create a new order_detail; without a price, the product is priced with the promotions in force."""
     new_order = Order_Detail(**order_req.dict())
+    if new_order.price is None and new_order.product_id is not None:
+        priced = quote(db, [(new_order.product_id, new_order.quantity or 1)])[0]
+        if priced is not None:
+            new_order.price = priced["list_price"]
+            if new_order.discount is None:
+                new_order.discount = priced["discount"]
     db.add(new_order)
+    db.flush()
+    record_movement(db, new_order.product_id, -(new_order.quantity or 1), "sale", f"order_detail:{new_order.id}", new_order.location_id)
     db.commit()
-    db.refresh(new_order)
     return new_order
 
 
+@router.post("/bulk/deactivate", status_code=status.HTTP_200_OK, response_model=BulkResult, summary="Deactivate many Order details")
+async def bulk_deactivate_order_details(req: OrderDetailBulkRequest, db: dbDepend, user: userDepend):
+    """Deactivate every matching active order_detail with a single UPDATE."""
+    return {"affected": _bulk_set_active(db, req, False)}
+
+
+@router.post("/bulk/reactivate", status_code=status.HTTP_200_OK, response_model=BulkResult, summary="Reactivate many Order details")
+async def bulk_reactivate_order_details(req: OrderDetailBulkRequest, db: dbDepend, user: userDepend):
+    """Reactivate every matching inactive order_detail with a single UPDATE."""
+    return {"affected": _bulk_set_active(db, req, True)}
+
+
 @router.get("/active", status_code=status.HTTP_200_OK, response_model=List[Order_DetailOut], summary="Get all active Order details")
 async def get_all_order_details(db: dbDepend, user: userDepend):
     """Get all active order_details."""
     result = db.query(Order_Detail).options(joinedload(Order_Detail.payment)).filter(Order_Detail.is_active == True).all()
     return [
     Order_DetailOut.model_validate(detail).model_copy(update={
-        "total": (detail.price or 0) * (1 - (detail.discount or 0) / 100),
         "payment_type": detail.payment.payment_type if detail.payment else None
     })
     for detail in result
@@ -74,7 +126,6 @@ async def get_all_inactive_order_details(db: dbDepend, user: userDepend):
     result = db.query(Order_Detail).options(joinedload(Order_Detail.payment)).filter(Order_Detail.is_active == False).all()
     return [
     Order_DetailOut.model_validate(detail).model_copy(update={
-        "total": (detail.price or 0) * (1 - (detail.discount or 0) / 100),
         "payment_type": detail.payment.payment_type if detail.payment else None
     })
     for detail in result
@@ -83,17 +134,16 @@ async def get_all_inactive_order_details(db: dbDepend, user: userDepend):
 
 @router.get("/{detail_id}", status_code=status.HTTP_200_OK, response_model=Order_DetailOut, summary="Get Order detail by id")
 async def get_order_detail(detail_id: int, db: dbDepend, user: userDepend):
-    """Get order_detail by id."""
-    result = db.query(Order_Detail).options(joinedload(Order_Detail.payment)).filter(Order_Detail.id == detail_id, Order_Detail.is_active == True).first()
+    """Get order_detail by id, from the archive if its order has been archived."""
+    result = (
+        db.query(Order_Detail).options(joinedload(Order_Detail.payment)).filter(Order_Detail.id == detail_id, Order_Detail.is_active == True).first()
+        or db.query(ArchivedOrderDetail).options(joinedload(ArchivedOrderDetail.payment)).filter(ArchivedOrderDetail.id == detail_id, ArchivedOrderDetail.is_active == True).first()
+    )
     if not result:
         raise HTTPException(status_code=404, detail="Order_Detail not found")
-    return [
-    Order_DetailOut.model_validate(detail).model_copy(update={
-        "total": (detail.price or 0) * (1 - (detail.discount or 0) / 100),
-        "payment_type": detail.payment.payment_type if detail.payment else None
+    return Order_DetailOut.model_validate(result).model_copy(update={
+        "payment_type": result.payment.payment_type if result.payment else None
     })
-    for detail in result
-]
 
 @router.patch("/{detail_id}", status_code=status.HTTP_200_OK, response_model=Order_DetailOut, summary="Update Order detail")
 async def update_order_detail(detail_id: int, updated: OrderDetailBase, db: dbDepend, user: userDepend):
@@ -101,22 +151,28 @@ async def update_order_detail(detail_id: int, updated: OrderDetailBase, db: dbDe
     result = db.query(Order_Detail).options(joinedload(Order_Detail.payment)).filter(Order_Detail.id == detail_id, Order_Detail.is_active == True).first()
     if not result:
         raise HTTPException(status_code=404, detail="Order_Detail not found")
-    for key, value in updated.model_dump(exclude_unset=True).items():
+    old_line = (result.product_id, result.quantity or 1, result.location_id)
+    changes = updated.model_dump(exclude_unset=True)
+    for key, value in changes.items():
         setattr(result, key, value)
+    if "bill_number" in changes:
+        db.expire(result, ["payment"])
+    if (result.product_id, result.quantity or 1, result.location_id) != old_line:
+        reference = f"order_detail:{result.id}"
+        record_movement(db, old_line[0], old_line[1], "return", reference, old_line[2])
+        record_movement(db, result.product_id, -(result.quantity or 1), "sale", reference, result.location_id)
     db.commit()
-    db.refresh(result)
     return Order_DetailOut.model_validate(result).model_copy(update={
-        "total": (result.price or 0) * (1 - (result.discount or 0) / 100),
         "payment_type": result.payment.payment_type if result.payment else None
     })
 
 @router.patch("/{detail_id}/deactivate", status_code=status.HTTP_200_OK, summary="Deactivate order_detail")
 async def deactivate_order_detail(detail_id: int, db: dbDepend, user: userDepend):
     """Deactivate order_detail."""
-    detail = db.query(Order_Detail).filter(Order_Detail.id == detail_id, Order_Detail.is_active == True).first()
+    detail = update_returning(db, Order_Detail, {"is_active": False}, Order_Detail.id == detail_id, Order_Detail.is_active == True)
     if not detail:
         raise HTTPException(status_code=404, detail="Order_Detail not found")
-    detail.is_active = False
+    record_movement(db, detail.product_id, detail.quantity or 1, "return", f"order_detail:{detail.id}", detail.location_id)
     db.commit()
     return {"detail": "Order_Detail soft-deleted"}
 
@@ -124,12 +180,11 @@ async def deactivate_order_detail(detail_id: int, db: dbDepend, user: userDepend
 @router.patch("/{detail_id}/reactivate", status_code=status.HTTP_200_OK, summary="Reactivate order_detail")
 async def reactivate_order_detail(detail_id: int, db: dbDepend, user: userDepend):
     """Reactivate order_detail."""
-    detail = db.query(Order_Detail).filter(Order_Detail.id == detail_id, Order_Detail.is_active == False).first()
+    detail = update_returning(db, Order_Detail, {"is_active": True}, Order_Detail.id == detail_id, Order_Detail.is_active == False)
     if not detail:
         raise HTTPException(status_code=404, detail="Order_Detail not found")
-    detail.is_active = True
+    record_movement(db, detail.product_id, -(detail.quantity or 1), "sale", f"order_detail:{detail.id}", detail.location_id)
     db.commit()
-    db.refresh(detail)
     return {"detail": "Order_Detail reactivated"}
 
 
@@ -1,22 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, status
-from sqlalchemy.orm import Session
-from model_folder.model import Payment, Staff
-from database import SessionLocal
+from fastapi import APIRouter, HTTPException, Path, status
+from model_folder.model import Payment
+from database import dbDepend
 from typing import Annotated, Literal, List, Optional
 from pydantic import BaseModel, Field
-from util.auth import get_current_user
-
-#Dependecies
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from util.auth import userDepend
+from util.writes import update_returning
 
 router = APIRouter()
-dbDepend = Annotated[Session, Depends(get_db)]
-userDepend = Annotated[Staff, Depends(get_current_user)]
 
 # --- Pydantic Schemas ---
 class PaymentCreate(BaseModel):
@@ -43,7 +33,6 @@ async def add_payment_info(db: dbDepend, pay: PaymentCreate, user: userDepend):
     new_pay = Payment(**pay.model_dump(), is_active=True)
     db.add(new_pay)
     db.commit()
-    db.refresh(new_pay)
     return new_pay
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=List[PaymentResponse], summary="Get all available payment types")
@@ -74,27 +63,22 @@ async def update_payment_info(db: dbDepend, pay_id: Annotated[int, Path(gt=0)],
     for field, value in pay_req.model_dump(exclude_unset=True).items():
         setattr(pay, field, value)
     db.commit()
-    db.refresh(pay)
     return pay
 
 @router.patch("/{pay_id}/deactivate", status_code=status.HTTP_200_OK, response_model=PaymentResponse, summary="Deactivate payment type")
 async def deactivate_payment(db: dbDepend, pay_id: Annotated[int, Path(gt=0)], user: userDepend):
     """Soft delete (deactivate) a payment."""
-    pay = db.query(Payment).filter(Payment.bill_number == pay_id, Payment.is_active == True).first()
+    pay = update_returning(db, Payment, {"is_active": False}, Payment.bill_number == pay_id, Payment.is_active == True)
     if not pay:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found")
-    pay.is_active = False
     db.commit()
-    db.refresh(pay)
     return pay
 
 @router.patch("/{pay_id}/reactivate", status_code=status.HTTP_200_OK, response_model=PaymentResponse, summary="Reactivate payment type")
 async def reactivate_payment(db: dbDepend, pay_id: Annotated[int, Path(gt=0)], user: userDepend):
     """Reactivate a previously soft-deleted payment."""
-    pay = db.query(Payment).filter(Payment.bill_number == pay_id, Payment.is_active == False).first()
+    pay = update_returning(db, Payment, {"is_active": True}, Payment.bill_number == pay_id, Payment.is_active == False)
     if not pay:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found")
-    pay.is_active = True
     db.commit()
-    db.refresh(pay)
     return pay
@@ -0,0 +1,145 @@
+from fastapi import APIRouter, HTTPException, Path, status
+from model_folder.model import Category, PricingRule, Product, ProductPrice, Supplier
+from database import dbDepend
+from typing import Annotated, List, Literal, Optional
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+from util.auth import userDepend
+from util.jobs import enqueue, enqueue_if_idle
+from util.pricing import quote
+from util.writes import update_returning
+
+router = APIRouter()
+
+# --- Pydantic Schemas ---
+class PricingRuleCreate(BaseModel):
+    name: str = Field(..., min_length=2, example="Summer drinks -10%")
+    kind: Literal["percent", "amount", "price"] = Field(..., description="percent off, amount off per unit, or fixed unit price")
+    value: float = Field(..., ge=0)
+    product_id: Optional[int] = None
+    category_id: Optional[int] = None
+    supplier_id: Optional[int] = None
+    min_quantity: int = Field(1, gt=0, description="Quantity break: applies from this many units per line")
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_rule(self):
+        if self.kind == "percent" and self.value > 100:
+            raise ValueError("A percent rule cannot exceed 100")
+        if self.starts_at is not None and self.ends_at is not None and self.ends_at <= self.starts_at:
+            raise ValueError("ends_at must be after starts_at")
+        return self
+
+class PricingRuleResponse(PricingRuleCreate):
+    id: int
+    is_active: bool
+
+    class Config:
+        from_attributes = True
+
+class QuoteLine(BaseModel):
+    product_id: int
+    quantity: int = Field(1, gt=0)
+
+class QuoteRequest(BaseModel):
+    lines: List[QuoteLine] = Field(..., min_length=1, max_length=1000)
+    at: Optional[datetime] = Field(None, description="Price as of this time; defaults to now")
+
+class QuotedLine(QuoteLine):
+    list_price: float
+    unit_price: float
+    rule_id: Optional[int]
+    discount: float
+    line_total: float
+
+class QuoteResponse(BaseModel):
+    lines: List[QuotedLine]
+    total: float
+
+class ProductPriceResponse(BaseModel):
+    product_id: int
+    list_price: float
+    unit_price: float
+    rule_id: Optional[int]
+    computed_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class RepriceQueued(BaseModel):
+    job_id: int
+    status: str
+
+# Models a rule may be scoped to, by PricingRuleCreate field.
+SCOPES = {"product_id": (Product, "Product"), "category_id": (Category, "Category"), "supplier_id": (Supplier, "Supplier")}
+
+def _queue_reprice(user_id: int) -> None:
+    # Back-to-back rule edits share one queued reprice; a running one may predate the edit.
+    enqueue_if_idle("pricing.reprice", created_by=user_id, include_running=False)
+
+# --- FastAPI Router ---
+@router.post("/rules", status_code=status.HTTP_201_CREATED, response_model=PricingRuleResponse, summary="Create pricing rule")
+async def create_rule(db: dbDepend, rule: PricingRuleCreate, user: userDepend):
+    """Create a promotion; stored prices are refreshed by a background reprice."""
+    for field, (model, label) in SCOPES.items():
+        value = getattr(rule, field)
+        if value is not None and not db.query(model.id).filter(model.id == value).first():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{label} not found")
+    new_rule = PricingRule(**rule.model_dump(), is_active=True)
+    db.add(new_rule)
+    db.commit()
+    _queue_reprice(user.id)
+    return new_rule
+
+@router.get("/rules", status_code=status.HTTP_200_OK, response_model=List[PricingRuleResponse], summary="List pricing rules")
+async def list_rules(db: dbDepend, user: userDepend, include_inactive: bool = False):
+    """List promotions, active ones only unless `include_inactive`."""
+    query = db.query(PricingRule)
+    if not include_inactive:
+        query = query.filter(PricingRule.is_active == True)
+    return query.order_by(PricingRule.id).all()
+
+@router.patch("/rules/{rule_id}/deactivate", status_code=status.HTTP_200_OK, response_model=PricingRuleResponse, summary="Deactivate pricing rule")
+async def deactivate_rule(db: dbDepend, rule_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """End a promotion early."""
+    rule = update_returning(db, PricingRule, {"is_active": False}, PricingRule.id == rule_id)
+    if rule is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pricing rule not found")
+    db.commit()
+    _queue_reprice(user.id)
+    return rule
+
+@router.patch("/rules/{rule_id}/reactivate", status_code=status.HTTP_200_OK, response_model=PricingRuleResponse, summary="Reactivate pricing rule")
+async def reactivate_rule(db: dbDepend, rule_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Reactivate a deactivated promotion."""
+    rule = update_returning(db, PricingRule, {"is_active": True}, PricingRule.id == rule_id)
+    if rule is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pricing rule not found")
+    db.commit()
+    _queue_reprice(user.id)
+    return rule
+
+@router.post("/quote", status_code=status.HTTP_200_OK, response_model=QuoteResponse, summary="Price a basket")
+async def quote_basket(db: dbDepend, req: QuoteRequest, user: userDepend):
+    """Price every line of a basket with the promotions in force, in one pass."""
+    priced = quote(db, [(line.product_id, line.quantity) for line in req.lines], req.at)
+    missing = [line.product_id for line, result in zip(req.lines, priced) if result is None]
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Products not found: {missing}")
+    lines = [QuotedLine(quantity=line.quantity, **result) for line, result in zip(req.lines, priced)]
+    return {"lines": lines, "total": sum(line.line_total for line in lines)}
+
+@router.post("/reprice", status_code=status.HTTP_202_ACCEPTED, response_model=RepriceQueued, summary="Reprice the catalogue")
+async def reprice_catalogue(db: dbDepend, user: userDepend):
+    """Queue a catalogue-wide reprice; poll `/jobs/{job_id}` for the counts."""
+    job = enqueue(db, "pricing.reprice", created_by=user.id)
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/products/{product_id}", status_code=status.HTTP_200_OK, response_model=ProductPriceResponse, summary="Current selling price of a product")
+async def get_product_price(db: dbDepend, product_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Single-unit price after promotions, as of the last reprice."""
+    price = db.query(ProductPrice).filter(ProductPrice.product_id == product_id).first()
+    if price is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product price not found")
+    return price
@@ -1,22 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, status
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, status
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
-from model_folder.model import Product, Staff, Supplier
-from database import SessionLocal
+from model_folder.model import Category, Job, Product, Supplier
+from database import dbDepend
 from typing import Annotated, Literal, List, Optional
-from pydantic import BaseModel, Field
-from util.auth import get_current_user
-
-# Dependencies
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from pydantic import BaseModel, Field, model_validator
+import csv
+import os
+from util.auth import userDepend
+from util.batch import in_request_order, parse_ids
+from util.jobs import JobContext, enqueue, job_handler
+from util.ledger import record_movement
+from util.productcache import cache as code_cache, catalogue_changed, product_changed
+from util.stream import STREAM_KEEPALIVE_SECONDS, format_event, hub
+from util.writes import update_returning
 
 router = APIRouter()
-dbDepend = Annotated[Session, Depends(get_db)]
-userDepend = Annotated[Staff, Depends(get_current_user)]
+
+# Where finished CSV exports are written; shared by every worker process on the host.
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
 
 # --- Pydantic Schemas ---
 class ProductCreate(BaseModel):
@@ -27,6 +31,7 @@ class ProductCreate(BaseModel):
     price: float = Field(..., example=19.99)
     cat_id: int = Field(..., example=1)
     supplier_id: int = Field(..., example=1)
+    code: Optional[str] = Field(None, min_length=1, max_length=64, example="4006381333931")
 
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
@@ -36,6 +41,7 @@ class ProductUpdate(BaseModel):
     price: Optional[float] = None
     cat_id: Optional[int] = None
     supplier_id: Optional[int] = None
+    code: Optional[str] = Field(None, min_length=1, max_length=64)
 
 class ProductResponse(BaseModel):
     id: int
@@ -47,18 +53,141 @@ class ProductResponse(BaseModel):
     supplier_id: int
     status: str
     category_name: str
+    code: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class ProductBulkRequest(BaseModel):
+    ids: Optional[List[int]] = Field(None, example=[1, 2, 3])
+    supplier_id: Optional[int] = None
+    cat_id: Optional[int] = None
+
+    @model_validator(mode="after")
+    def require_filter(self):
+        if self.ids is None and self.supplier_id is None and self.cat_id is None:
+            raise ValueError("Provide ids, supplier_id or cat_id")
+        return self
+
+class BulkResult(BaseModel):
+    affected: int
+
+class ProductBatch(BaseModel):
+    items: List[ProductResponse]
+    missing: List[int]
+
+class ExportQueued(BaseModel):
+    job_id: int
+    status: str
+
+# --- Background jobs ---
+def _export_path(job_id: int) -> str:
+    return os.path.join(EXPORT_DIR, f"products-{job_id}.csv")
+
+@job_handler("products.export")
+def export_products(db: Session, ctx: JobContext):
+    """Write the whole catalogue as CSV to EXPORT_DIR, streaming rows in batches."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = _export_path(ctx.job_id)
+    partial = f"{path}.partial"
+    columns = ["id", "code", "name", "desc", "unit", "price", "cat_id", "supplier_id", "status"]
+    rows = 0
+    query = db.query(*[getattr(Product, c) for c in columns]).order_by(Product.id)
+    if ctx.payload.get("status"):
+        query = query.filter(Product.status == ctx.payload["status"])
+    try:
+        with open(partial, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in query.yield_per(1000):
+                writer.writerow(row)
+                rows += 1
+                if rows % 1000 == 0:
+                    ctx.check_cancelled()
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    # The file is served by GET /products/export/{job_id}; the job result stays small.
+    return {"rows": rows, "download": f"/products/export/{ctx.job_id}"}
+
+def _write_error(e: IntegrityError) -> Exception:
+    """The HTTP error for the constraint a product write broke; other errors are returned unchanged."""
+    # SQLite: "UNIQUE constraint failed: products.code"; PostgreSQL names the unique index.
+    message = str(e.orig).lower()
+    if "products.code" in message or "ix_products_code" in message:
+        return HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Product code already in use")
+    return e
+
+def _check_references(db: Session, cat_id: Optional[int], supplier_id: Optional[int]) -> None:
+    """404 unless the category and supplier a product write points at exist.
+
+    Checked up front rather than mapped from the constraint error: SQLite does not enforce
+    foreign keys, so a bad id would otherwise be written and break every later read.
+    """
+    if cat_id is not None and db.get(Category, cat_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+    if supplier_id is not None and db.get(Supplier, supplier_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Supplier not found")
+
 # --- FastAPI Router ---
+@router.post("/export", status_code=status.HTTP_202_ACCEPTED, response_model=ExportQueued, summary="Export products as CSV in the background")
+async def export_products_csv(db: dbDepend, user: userDepend, prod_status: Optional[Literal["Available", "Unavailable"]] = None):
+    """Queue a CSV export; poll `/jobs/{job_id}` for the result."""
+    job = enqueue(db, "products.export", {"status": prod_status}, created_by=user.id)
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/export/{job_id}", summary="Download a finished CSV export")
+async def download_export(db: dbDepend, job_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """The CSV written by a succeeded `products.export` job."""
+    job = db.query(Job).filter(Job.id == job_id, Job.kind == "products.export").first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export not found")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Export is {job.status}")
+    path = _export_path(job_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export file no longer exists")
+    return FileResponse(path, media_type="text/csv", filename=f"products-{job_id}.csv")
+
+def _bulk_set_status(db: Session, req: ProductBulkRequest, from_status: str, to_status: str) -> int:
+    query = db.query(Product).filter(Product.status == from_status)
+    if req.ids is not None:
+        query = query.filter(Product.id.in_(req.ids))
+    if req.supplier_id is not None:
+        query = query.filter(Product.supplier_id == req.supplier_id)
+    if req.cat_id is not None:
+        query = query.filter(Product.cat_id == req.cat_id)
+    affected = query.update({Product.status: to_status}, synchronize_session=False)
+    catalogue_changed(db)
+    db.commit()
+    return affected
+
+@router.post("/bulk/deactivate", status_code=status.HTTP_200_OK, response_model=BulkResult, summary="Deactivate many products")
+async def bulk_deactivate_products(db: dbDepend, req: ProductBulkRequest, user: userDepend):
+    """Mark every matching Available product Unavailable with a single UPDATE."""
+    return {"affected": _bulk_set_status(db, req, "Available", "Unavailable")}
+
+@router.post("/bulk/reactivate", status_code=status.HTTP_200_OK, response_model=BulkResult, summary="Reactivate many products")
+async def bulk_reactivate_products(db: dbDepend, req: ProductBulkRequest, user: userDepend):
+    """Mark every matching Unavailable product Available with a single UPDATE."""
+    return {"affected": _bulk_set_status(db, req, "Unavailable", "Available")}
+
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=ProductResponse, summary="Create new product")
 async def create_product(db: dbDepend, prod: ProductCreate, user: userDepend):
     """Add a new product with default status 'Available'."""
-    new_prod = Product(**prod.model_dump(), status="Available")
+    _check_references(db, prod.cat_id, prod.supplier_id)
+    # Opening stock goes through the ledger like any other movement.
+    new_prod = Product(**prod.model_dump(exclude={"unit"}), unit=0, status="Available")
     db.add(new_prod)
+    try:
+        db.flush()
+    except IntegrityError as e:
+        db.rollback()
+        raise _write_error(e)
+    record_movement(db, new_prod.id, prod.unit, "adjustment", f"product:{new_prod.id}")
     db.commit()
-    db.refresh(new_prod)
     return {
         **new_prod.__dict__,
         "category_name": new_prod.category.name
@@ -82,6 +211,59 @@ async def get_all_unavailable_products(db: dbDepend, user: userDepend):
         for prod in products
     ]
 
+@router.get("/batch", status_code=status.HTTP_200_OK, response_model=ProductBatch, summary="Get many products by ID")
+async def get_products_by_ids(db: dbDepend, ids: Annotated[List[int], Depends(parse_ids)], user: userDepend):
+    """Products for `ids` in request order from one IN query; unknown ids are listed in `missing`."""
+    products = db.query(Product).options(joinedload(Product.category)).filter(Product.id.in_(ids)).all()
+    items, missing = in_request_order(products, ids, lambda prod: prod.id)
+    return {
+        "items": [{**prod.__dict__, "category_name": prod.category.name} for prod in items],
+        "missing": missing,
+    }
+
+@router.get("/by-code/{code}", status_code=status.HTTP_200_OK, response_model=ProductResponse, summary="Get product by SKU or barcode")
+async def get_product_by_code(db: dbDepend, code: Annotated[str, Path(min_length=1, max_length=64)], user: userDepend):
+    """Scan lookup; answered from the in-process cache when the code was looked up recently."""
+    cached = code_cache.get(code)
+    if cached is not None:
+        return cached
+    generation = code_cache.generation
+    prod = db.query(Product).options(joinedload(Product.category)).filter(Product.code == code).first()
+    if not prod:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    result = ProductResponse.model_validate({**prod.__dict__, "category_name": prod.category.name}).model_dump()
+    code_cache.put(code, result, generation)
+    return result
+
+@router.get("/stream", summary="Stream product price, stock and status changes")
+async def stream_product_changes(db: dbDepend, request: Request, user: userDepend):
+    """
+    Server-Sent Events replacing polling of the product listing.
+
+    Each `product` event carries `id`, `price`, `unit` and `status` after a
+    committed change. `resync` means many products changed at once and
+    `dropped` that this client fell behind; reload the listing on either.
+    """
+    db.close()  # hand the connection back to the pool for the life of the stream
+    subscriber = hub.subscribe()
+
+    async def events():
+        try:
+            yield f"retry: {int(STREAM_KEEPALIVE_SECONDS * 1000)}\n\n"
+            while not subscriber.closed:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            hub.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.get("/{prod_id}", status_code=status.HTTP_200_OK, response_model=ProductResponse, summary="Get product by ID")
 async def get_product_by_id(db: dbDepend, prod_id: Annotated[int, Path(gt=0)], user: userDepend):
     """Retrieve a product by its ID."""
@@ -99,10 +281,21 @@ async def update_product(db: dbDepend, prod_id: Annotated[int, Path(gt=0)], prod
     prod = db.query(Product).options(joinedload(Product.category)).filter(Product.id == prod_id).first()
     if not prod:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-    for field, value in prod_req.model_dump(exclude_unset=True).items():
+    update_data = prod_req.model_dump(exclude_unset=True)
+    _check_references(db, update_data.get("cat_id"), update_data.get("supplier_id"))
+    new_unit = update_data.pop("unit", None)
+    for field, value in update_data.items():
         setattr(prod, field, value)
+    if "cat_id" in update_data:
+        db.expire(prod, ["category"])
+    try:
+        db.flush()
+    except IntegrityError as e:
+        db.rollback()
+        raise _write_error(e)
+    if new_unit is not None:
+        record_movement(db, prod.id, new_unit - (prod.unit or 0), "adjustment", f"product:{prod.id}")
     db.commit()
-    db.refresh(prod)
     return {
         **prod.__dict__,
         "category_name": prod.category.name
@@ -111,12 +304,11 @@ async def update_product(db: dbDepend, prod_id: Annotated[int, Path(gt=0)], prod
 @router.patch("/{prod_id}/deactivate", status_code=status.HTTP_200_OK, response_model=ProductResponse, summary="Deactivate product")
 async def deactivate_product(db: dbDepend, prod_id: Annotated[int, Path(gt=0)], user: userDepend):
     """Mark a product as Unavailable."""
-    prod = db.query(Product).options(joinedload(Product.category)).filter(Product.id == prod_id, Product.status == "Available").first()
+    prod = update_returning(db, Product, {"status": "Unavailable"}, Product.id == prod_id, Product.status == "Available")
     if not prod:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-    prod.status = "Unavailable"
+    product_changed(db, prod.id)
     db.commit()
-    db.refresh(prod)
     return {
         **prod.__dict__,
         "category_name": prod.category.name
@@ -125,12 +317,11 @@ async def deactivate_product(db: dbDepend, prod_id: Annotated[int, Path(gt=0)],
 @router.patch("/{prod_id}/reactivate", status_code=status.HTTP_200_OK, response_model=ProductResponse, summary="Reactivate product")
 async def reactivate_product(db: dbDepend, prod_id: Annotated[int, Path(gt=0)], user: userDepend):
     """Mark a previously unavailable product as Available."""
-    prod = db.query(Product).options(joinedload(Product.category)).filter(Product.id == prod_id, Product.status == "Unavailable").first()
+    prod = update_returning(db, Product, {"status": "Available"}, Product.id == prod_id, Product.status == "Unavailable")
     if not prod:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-    prod.status = "Available"
+    product_changed(db, prod.id)
     db.commit()
-    db.refresh(prod)
     return {
         **prod.__dict__,
         "category_name": prod.category.name
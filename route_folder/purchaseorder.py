@@ -0,0 +1,172 @@
+from fastapi import APIRouter, HTTPException, Path, Query, status
+from sqlalchemy import String, cast, func, insert, literal, select
+from sqlalchemy.orm import Session, selectinload
+from model_folder.model import Location, Product, PurchaseOrder, PurchaseOrderLine, Supplier
+from database import dbDepend
+from typing import Annotated, List, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+from util.auth import userDepend
+from util.ledger import record_movements
+from util.writes import update_returning
+
+router = APIRouter()
+
+# --- Pydantic Schemas ---
+class PurchaseOrderLineCreate(BaseModel):
+    product_id: int = Field(..., gt=0, example=1)
+    quantity: int = Field(..., gt=0, example=24)
+    unit_cost: Optional[float] = Field(None, ge=0, example=3.5)
+
+class PurchaseOrderCreate(BaseModel):
+    supplier_id: int = Field(..., gt=0, example=1)
+    reference: Optional[str] = Field(None, example="INV-2024-0042")
+    location_id: Optional[int] = Field(None, gt=0, description="Location that receives the delivery")
+    lines: List[PurchaseOrderLineCreate] = Field(..., min_length=1)
+
+class PurchaseOrderLineResponse(BaseModel):
+    id: int
+    product_id: int
+    quantity: int
+    unit_cost: Optional[float]
+    received_quantity: int
+
+    class Config:
+        from_attributes = True
+
+class PurchaseOrderSummary(BaseModel):
+    id: int
+    supplier_id: int
+    status: str
+    reference: Optional[str]
+    location_id: Optional[int] = None
+    created_at: datetime
+    received_at: Optional[datetime]
+    line_count: int
+    total_quantity: int
+    total_cost: float
+
+class PurchaseOrderResponse(PurchaseOrderSummary):
+    lines: List[PurchaseOrderLineResponse]
+
+def _summaries(db: Session, query) -> List[PurchaseOrderSummary]:
+    """Purchase orders with their line aggregates, computed in one grouped query."""
+    rows = (
+        query.outerjoin(PurchaseOrderLine, PurchaseOrderLine.purchase_order_id == PurchaseOrder.id)
+        .with_entities(
+            PurchaseOrder,
+            func.count(PurchaseOrderLine.id),
+            func.coalesce(func.sum(PurchaseOrderLine.quantity), 0),
+            func.coalesce(func.sum(PurchaseOrderLine.quantity * func.coalesce(PurchaseOrderLine.unit_cost, 0)), 0),
+        )
+        .group_by(PurchaseOrder.id)
+        .order_by(PurchaseOrder.id.desc())
+        .all()
+    )
+    return [
+        PurchaseOrderSummary(
+            id=po.id, supplier_id=po.supplier_id, status=po.status, reference=po.reference, location_id=po.location_id,
+            created_at=po.created_at, received_at=po.received_at,
+            line_count=count, total_quantity=quantity, total_cost=cost,
+        )
+        for po, count, quantity, cost in rows
+    ]
+
+def _get_po(db: Session, po_id: int) -> PurchaseOrderResponse:
+    po = db.query(PurchaseOrder).options(selectinload(PurchaseOrder.lines)).filter(PurchaseOrder.id == po_id).first()
+    if not po:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Purchase order not found")
+    return PurchaseOrderResponse(
+        id=po.id, supplier_id=po.supplier_id, status=po.status, reference=po.reference, location_id=po.location_id,
+        created_at=po.created_at, received_at=po.received_at,
+        line_count=len(po.lines),
+        total_quantity=sum(line.quantity for line in po.lines),
+        total_cost=sum(line.quantity * (line.unit_cost or 0) for line in po.lines),
+        lines=po.lines,
+    )
+
+# --- FastAPI Router ---
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=PurchaseOrderSummary, summary="Create purchase order")
+async def create_purchase_order(db: dbDepend, po_req: PurchaseOrderCreate, user: userDepend):
+    """Create an open purchase order against a supplier; lines are inserted in one batch."""
+    if not db.query(Supplier.id).filter(Supplier.id == po_req.supplier_id, Supplier.is_active == True).first():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Supplier not found")
+    product_ids = {line.product_id for line in po_req.lines}
+    found = {pid for (pid,) in db.query(Product.id).filter(Product.id.in_(product_ids))}
+    if found != product_ids:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Products not found: {sorted(product_ids - found)}")
+    if po_req.location_id is not None and not db.query(Location.id).filter(Location.id == po_req.location_id, Location.is_active == True).first():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Location not found")
+    po = PurchaseOrder(supplier_id=po_req.supplier_id, reference=po_req.reference, location_id=po_req.location_id, status="open", created_by=user.id)
+    db.add(po)
+    db.flush()
+    db.execute(insert(PurchaseOrderLine), [
+        {**line.model_dump(), "purchase_order_id": po.id, "received_quantity": 0}
+        for line in po_req.lines
+    ])
+    db.commit()
+    return _summaries(db, db.query(PurchaseOrder).filter(PurchaseOrder.id == po.id))[0]
+
+@router.get("/", status_code=status.HTTP_200_OK, response_model=List[PurchaseOrderSummary], summary="List purchase orders")
+async def list_purchase_orders(db: dbDepend, user: userDepend, supplier_id: Optional[int] = None,
+                               po_status: Annotated[Optional[str], Query(alias="status")] = None):
+    """Purchase orders, newest first, optionally filtered by supplier and status."""
+    query = db.query(PurchaseOrder)
+    if supplier_id is not None:
+        query = query.filter(PurchaseOrder.supplier_id == supplier_id)
+    if po_status is not None:
+        query = query.filter(PurchaseOrder.status == po_status)
+    return _summaries(db, query)
+
+@router.get("/{po_id}", status_code=status.HTTP_200_OK, response_model=PurchaseOrderResponse, summary="Get purchase order with lines")
+async def get_purchase_order(db: dbDepend, po_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Retrieve a purchase order and its lines."""
+    return _get_po(db, po_id)
+
+@router.post("/{po_id}/receive", status_code=status.HTTP_200_OK, response_model=PurchaseOrderSummary, summary="Receive purchase order")
+async def receive_purchase_order(db: dbDepend, po_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """
+    Receive every outstanding line and add it to stock.
+
+    A fixed number of set-based statements in one transaction, whatever the
+    number of lines.
+    """
+    claimed = (
+        db.query(PurchaseOrder)
+        .filter(PurchaseOrder.id == po_id, PurchaseOrder.status == "open")
+        .update({PurchaseOrder.status: "received", PurchaseOrder.received_at: datetime.utcnow()}, synchronize_session=False)
+    )
+    if claimed != 1:
+        db.rollback()
+        if not db.query(PurchaseOrder.id).filter(PurchaseOrder.id == po_id).first():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Purchase order not found")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Purchase order is not open")
+    outstanding = PurchaseOrderLine.quantity - func.coalesce(PurchaseOrderLine.received_quantity, 0)
+    record_movements(
+        db,
+        select(
+            PurchaseOrderLine.product_id.label("product_id"),
+            outstanding.label("quantity"),
+            (literal("purchase_order:") + cast(PurchaseOrderLine.purchase_order_id, String)).label("reference"),
+            PurchaseOrder.location_id.label("location_id"),
+        )
+        .join(PurchaseOrder, PurchaseOrder.id == PurchaseOrderLine.purchase_order_id)
+        .where(PurchaseOrderLine.purchase_order_id == po_id, outstanding > 0),
+        "receipt",
+    )
+    db.query(PurchaseOrderLine).filter(PurchaseOrderLine.purchase_order_id == po_id).update(
+        {PurchaseOrderLine.received_quantity: PurchaseOrderLine.quantity}, synchronize_session=False
+    )
+    db.commit()
+    return _summaries(db, db.query(PurchaseOrder).filter(PurchaseOrder.id == po_id))[0]
+
+@router.post("/{po_id}/cancel", status_code=status.HTTP_200_OK, response_model=PurchaseOrderSummary, summary="Cancel purchase order")
+async def cancel_purchase_order(db: dbDepend, po_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Cancel an open purchase order."""
+    po = update_returning(db, PurchaseOrder, {"status": "cancelled"}, PurchaseOrder.id == po_id, PurchaseOrder.status == "open")
+    if po is None:
+        if not db.query(PurchaseOrder.id).filter(PurchaseOrder.id == po_id).first():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Purchase order not found")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Purchase order is not open")
+    db.commit()
+    return _summaries(db, db.query(PurchaseOrder).filter(PurchaseOrder.id == po_id))[0]
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, HTTPException, Path, status
+from sqlalchemy import func
+from model_folder.model import Product, ReorderPoint, Supplier
+from database import dbDepend
+from typing import Annotated, List, Optional
+from pydantic import BaseModel
+from datetime import datetime
+from util.auth import userDepend
+from util.jobs import enqueue
+import util.reorder  # registers the scheduled "reorder.evaluate" job
+
+router = APIRouter()
+
+# --- Pydantic Schemas ---
+class ReorderResponse(BaseModel):
+    product_id: int
+    daily_velocity: float
+    reorder_point: int
+    computed_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class LowStockProduct(BaseModel):
+    id: int
+    name: str
+    unit: int
+    reorder_point: int
+    daily_velocity: float
+
+class LowStockSupplier(BaseModel):
+    supplier_id: Optional[int]
+    supplier_name: Optional[str]
+    products: List[LowStockProduct]
+
+class EvaluateQueued(BaseModel):
+    job_id: int
+    status: str
+
+# --- FastAPI Router ---
+@router.get("/low-stock", status_code=status.HTTP_200_OK, response_model=List[LowStockSupplier], summary="Products at or below their reorder point, by supplier")
+async def get_low_stock(db: dbDepend, user: userDepend, supplier_id: Optional[int] = None):
+    """Available products whose stock is at or below their reorder point, grouped by supplier."""
+    reorder_point = func.coalesce(ReorderPoint.reorder_point, 0)
+    query = (
+        db.query(Product.id, Product.name, Product.unit, Product.supplier_id, Supplier.name, reorder_point, func.coalesce(ReorderPoint.daily_velocity, 0.0))
+        .outerjoin(ReorderPoint, ReorderPoint.product_id == Product.id)
+        .outerjoin(Supplier, Supplier.id == Product.supplier_id)
+        .filter(Product.status == "Available", func.coalesce(Product.unit, 0) <= reorder_point)
+    )
+    if supplier_id is not None:
+        query = query.filter(Product.supplier_id == supplier_id)
+    groups: dict[Optional[int], LowStockSupplier] = {}
+    for prod_id, name, unit, sup_id, sup_name, point, velocity in query.order_by(Product.supplier_id, Product.id):
+        group = groups.setdefault(sup_id, LowStockSupplier(supplier_id=sup_id, supplier_name=sup_name, products=[]))
+        group.products.append(LowStockProduct(id=prod_id, name=name, unit=unit or 0, reorder_point=point, daily_velocity=velocity))
+    return list(groups.values())
+
+@router.post("/evaluate", status_code=status.HTTP_202_ACCEPTED, response_model=EvaluateQueued, summary="Recompute reorder points")
+async def evaluate_reorder_points(db: dbDepend, user: userDepend, full: bool = False):
+    """Queue an evaluation; by default only products with new order lines are re-checked."""
+    job = enqueue(db, "reorder.evaluate", {"full": full}, created_by=user.id)
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/{product_id}", status_code=status.HTTP_200_OK, response_model=ReorderResponse, summary="Reorder point of a product")
+async def get_reorder_point(db: dbDepend, product_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Retrieve the last computed velocity and reorder point of a product."""
+    point = db.query(ReorderPoint).filter(ReorderPoint.product_id == product_id).first()
+    if not point:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reorder point not computed yet")
+    return point
@@ -1,23 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Path, status
 from model_folder.model import Staff
-from database import SessionLocal
+from database import dbDepend
 from typing import Annotated, List, Optional
 from pydantic import BaseModel, Field, EmailStr
 from util.security import hash_password
-from util.auth import get_current_user
-
-#Dependecies
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from util.auth import userDepend
+from util.writes import update_returning
 
 router = APIRouter()
-dbDepend = Annotated[Session, Depends(get_db)]
-userDepend = Annotated[Staff, Depends(get_current_user)]
 
 # --- Pydantic Schemas ---
 
@@ -60,7 +50,6 @@ async def create_staff_member(db: dbDepend, staff: StaffCreate): #user: userDepe
                       
     db.add(new_staff)
     db.commit()
-    db.refresh(new_staff)
     return new_staff
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=List[StaffResponse], summary="Get all active staff members")
@@ -95,27 +84,22 @@ async def update_staff(db: dbDepend, staff_id: Annotated[int, Path(..., gt=0)],
     for field, value in update_data.items():
         setattr(staff, field, value)
     db.commit()
-    db.refresh(staff)
     return staff
 
 @router.patch("/{staff_id}/deactivate", status_code=status.HTTP_200_OK, response_model=StaffResponse, summary="Deactivate staff member")
 async def deactivate_staff(db: dbDepend, staff_id: Annotated[int, Path(..., gt=0)], user: userDepend):#
     """Deactivate a staff member (mark as deleted)."""
-    staff = db.query(Staff).filter(Staff.id == staff_id).first()
+    staff = update_returning(db, Staff, {"is_active": False}, Staff.id == staff_id)
     if not staff:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Staff member not found")
-    staff.is_active = False
     db.commit()
-    db.refresh(staff)
     return staff
 
 @router.patch("/{staff_id}/reactivate", status_code=status.HTTP_200_OK, response_model=StaffResponse, summary="Reactivate staff member")
 async def reactivate_staff(db: dbDepend, staff_id: Annotated[int, Path(..., gt=0)], user: userDepend):#
     """Reactivate a previously deactivated staff member."""
-    staff = db.query(Staff).filter(Staff.id == staff_id).first()
+    staff = update_returning(db, Staff, {"is_active": True}, Staff.id == staff_id)
     if not staff:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Staff member not found")
-    staff.is_active = True
     db.commit()
-    db.refresh(staff)
     return staff
\ No newline at end of file
@@ -0,0 +1,78 @@
+from fastapi import APIRouter, HTTPException, Path, Query, status
+from model_folder.model import Product, StockMovement
+from database import dbDepend
+from typing import Annotated, List, Literal, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+from util.auth import userDepend
+from util.jobs import enqueue
+from util.ledger import record_movement, stock_at
+
+router = APIRouter()
+
+# --- Pydantic Schemas ---
+class StockAdjustment(BaseModel):
+    product_id: int = Field(..., gt=0, example=1)
+    quantity: int = Field(..., example=-2, description="Signed change to the product's stock")
+    kind: Literal["receipt", "adjustment"] = "adjustment"
+    reference: Optional[str] = Field(None, example="damaged in transit")
+
+class MovementResponse(BaseModel):
+    id: int
+    product_id: int
+    quantity: int
+    kind: str
+    reference: Optional[str]
+    staff_id: Optional[int]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class StockLevel(BaseModel):
+    product_id: int
+    at: datetime
+    unit: int
+
+class SnapshotQueued(BaseModel):
+    job_id: int
+    status: str
+
+# --- FastAPI Router ---
+@router.post("/adjustments", status_code=status.HTTP_201_CREATED, response_model=StockLevel, summary="Record a stock movement")
+async def adjust_stock(db: dbDepend, adj: StockAdjustment, user: userDepend):
+    """Record a receipt or manual adjustment and apply it to the product's stock."""
+    if not db.query(Product.id).filter(Product.id == adj.product_id).first():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    record_movement(db, adj.product_id, adj.quantity, adj.kind, adj.reference)
+    db.commit()
+    unit = db.query(Product.unit).filter(Product.id == adj.product_id).scalar()
+    return {"product_id": adj.product_id, "at": datetime.utcnow(), "unit": unit or 0}
+
+@router.post("/snapshots", status_code=status.HTTP_202_ACCEPTED, response_model=SnapshotQueued, summary="Take stock snapshots now")
+async def queue_snapshots(db: dbDepend, user: userDepend):
+    """Queue a snapshot of every product that moved since the last one."""
+    job = enqueue(db, "ledger.snapshot", created_by=user.id)
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/{product_id}", status_code=status.HTTP_200_OK, response_model=StockLevel, summary="Stock of a product at a point in time")
+async def get_stock(db: dbDepend, product_id: Annotated[int, Path(gt=0)], user: userDepend, at: Optional[datetime] = None):
+    """Stock now, or at `at` (nearest snapshot plus the movements since)."""
+    if not db.query(Product.id).filter(Product.id == product_id).first():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    at = at or datetime.utcnow()
+    return {"product_id": product_id, "at": at, "unit": stock_at(db, product_id, at)}
+
+@router.get("/{product_id}/movements", status_code=status.HTTP_200_OK, response_model=List[MovementResponse], summary="Stock movements of a product")
+async def get_movements(db: dbDepend, product_id: Annotated[int, Path(gt=0)], user: userDepend,
+                        since: Optional[datetime] = None, until: Optional[datetime] = None,
+                        before_id: Optional[int] = None, limit: Annotated[int, Query(gt=0, le=1000)] = 100):
+    """Newest first; pass the last `id` as `before_id` to page back through history."""
+    query = db.query(StockMovement).filter(StockMovement.product_id == product_id)
+    if since is not None:
+        query = query.filter(StockMovement.created_at >= since)
+    if until is not None:
+        query = query.filter(StockMovement.created_at <= until)
+    if before_id is not None:
+        query = query.filter(StockMovement.id < before_id)
+    return query.order_by(StockMovement.id.desc()).limit(limit).all()
@@ -0,0 +1,201 @@
+from fastapi import APIRouter, HTTPException, Path, Query, Request, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from model_folder.model import Location, StockTake, StockTakeLine
+from database import dbDepend
+from typing import Annotated, List, Literal, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+from util.auth import userDepend
+from util.stocktake import MAX_REJECTED, CountParser, apply_stock_take, stage_counts, variance, variance_summary
+
+router = APIRouter()
+
+# --- Pydantic Schemas ---
+class StockTakeCreate(BaseModel):
+    reference: Optional[str] = Field(None, example="Q3 count, aisles 1-4")
+    location_id: Optional[int] = Field(None, gt=0, description="Location being counted; omit to count total stock")
+
+class StockTakeResponse(BaseModel):
+    id: int
+    status: str
+    reference: Optional[str]
+    location_id: Optional[int]
+    created_by: Optional[int]
+    created_at: datetime
+    applied_at: Optional[datetime]
+    line_count: int
+
+class RejectedLine(BaseModel):
+    line: int
+    reason: str
+
+class CountUploadResult(BaseModel):
+    received: int
+    staged: int
+    rejected_count: int
+    rejected: List[RejectedLine]  # the first few; see rejected_count
+    line_count: int  # products staged in the session so far
+
+class VarianceLine(BaseModel):
+    product_id: int
+    code: Optional[str]
+    name: Optional[str]
+    expected: int
+    counted: int
+    variance: int
+    value: float
+
+class VarianceSummary(BaseModel):
+    lines: int
+    lines_with_variance: int
+    units_over: int
+    units_short: int
+    net_value: float
+
+class VarianceReport(BaseModel):
+    stock_take: StockTakeResponse
+    summary: VarianceSummary
+    lines: List[VarianceLine]
+
+class ApplyResult(BaseModel):
+    stock_take: StockTakeResponse
+    summary: VarianceSummary
+    batch_id: str
+
+def _summaries(db: Session, query) -> List[StockTakeResponse]:
+    """Stock takes with their staged line counts, in one grouped query."""
+    rows = (
+        query.outerjoin(StockTakeLine, StockTakeLine.stock_take_id == StockTake.id)
+        .with_entities(StockTake, func.count(StockTakeLine.product_id))
+        .group_by(StockTake.id)
+        .order_by(StockTake.id.desc())
+        .all()
+    )
+    return [
+        StockTakeResponse(
+            id=take.id, status=take.status, reference=take.reference, location_id=take.location_id,
+            created_by=take.created_by, created_at=take.created_at, applied_at=take.applied_at, line_count=count,
+        )
+        for take, count in rows
+    ]
+
+def _summary(db: Session, take_id: int) -> StockTakeResponse:
+    return _summaries(db, db.query(StockTake).filter(StockTake.id == take_id))[0]
+
+def _get_take(db: Session, take_id: int, open_only: bool = False) -> StockTake:
+    take = db.query(StockTake).filter(StockTake.id == take_id).first()
+    if not take:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stock take not found")
+    if open_only and take.status != "open":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Stock take is not open")
+    return take
+
+# --- FastAPI Router ---
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=StockTakeResponse, summary="Start a stock take")
+async def create_stock_take(db: dbDepend, req: StockTakeCreate, user: userDepend):
+    """Open a count session, for one location or for total stock."""
+    if req.location_id is not None and not db.query(Location.id).filter(Location.id == req.location_id, Location.is_active == True).first():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Location not found")
+    take = StockTake(reference=req.reference, location_id=req.location_id, status="open", created_by=user.id)
+    db.add(take)
+    db.commit()
+    return _summary(db, take.id)
+
+@router.get("/", status_code=status.HTTP_200_OK, response_model=List[StockTakeResponse], summary="List stock takes")
+async def list_stock_takes(db: dbDepend, user: userDepend,
+                           take_status: Annotated[Optional[Literal["open", "applied", "cancelled"]], Query(alias="status")] = None):
+    """Stock takes, newest first, optionally filtered by status."""
+    query = db.query(StockTake)
+    if take_status is not None:
+        query = query.filter(StockTake.status == take_status)
+    return _summaries(db, query)
+
+@router.get("/{take_id}", status_code=status.HTTP_200_OK, response_model=StockTakeResponse, summary="Get stock take")
+async def get_stock_take(db: dbDepend, take_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Retrieve a stock take and the number of products counted so far."""
+    _get_take(db, take_id)
+    return _summary(db, take_id)
+
+@router.post("/{take_id}/counts", status_code=status.HTTP_200_OK, response_model=CountUploadResult, summary="Upload a count file",
+             openapi_extra={"requestBody": {"required": True, "content": {"text/csv": {"schema": {"type": "string"}}}}})
+async def upload_counts(db: dbDepend, take_id: Annotated[int, Path(gt=0)], request: Request, user: userDepend, replace: bool = False):
+    """
+    Stage a CSV count file sent as the raw request body.
+
+    The header names `product_id` or `code`, and `counted`. The body is parsed
+    as it arrives, but nothing is written until it has all been received, so
+    a slow upload never holds the database's write lock; the rows are then
+    staged a batch at a time. Counts for the same product add up, across
+    lines and uploads; `replace` discards earlier uploads first. Invalid lines
+    are reported and skipped.
+    """
+    _get_take(db, take_id, open_only=True)
+    db.rollback()  # end the read transaction while the body is being received
+    parser = CountParser()
+    rows: list = []
+    try:
+        async for chunk in request.stream():
+            rows.extend(parser.feed(chunk))
+        rows.extend(parser.feed(b"", final=True))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    take = _get_take(db, take_id, open_only=True)  # it may have been applied or cancelled meanwhile
+    if replace:
+        db.query(StockTakeLine).filter(StockTakeLine.stock_take_id == take.id).delete(synchronize_session=False)
+    staged, rejected = stage_counts(db, take.id, rows, parser.by_code)
+    db.commit()
+    return {
+        "received": len(rows),
+        "staged": staged,
+        "rejected_count": len(rejected),
+        "rejected": [{"line": line, "reason": reason} for line, reason in rejected[:MAX_REJECTED]],
+        "line_count": _summary(db, take.id).line_count,
+    }
+
+@router.get("/{take_id}/variance", status_code=status.HTTP_200_OK, response_model=VarianceReport, summary="Stock take variance report")
+async def get_variance(db: dbDepend, take_id: Annotated[int, Path(gt=0)], user: userDepend,
+                       include_matching: bool = False, limit: Annotated[int, Query(gt=0, le=10000)] = 1000,
+                       offset: Annotated[int, Query(ge=0)] = 0):
+    """
+    Counted against recorded stock, largest value difference first.
+
+    While open this compares with current stock; once applied, with the stock
+    on record at the time. Lines that match are left out unless `include_matching`.
+    """
+    take = _get_take(db, take_id)
+    lines = variance(take).subquery()
+    query = db.query(lines)
+    if not include_matching:
+        query = query.filter(lines.c.variance != 0)
+    rows = query.order_by(func.abs(lines.c.value).desc(), lines.c.product_id).offset(offset).limit(limit).all()
+    return {
+        "stock_take": _summary(db, take.id),
+        "summary": variance_summary(db, take),
+        "lines": [row._asdict() for row in rows],
+    }
+
+@router.post("/{take_id}/apply", status_code=status.HTTP_200_OK, response_model=ApplyResult, summary="Apply stock take")
+async def apply_counts(db: dbDepend, take_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """
+    Set stock to the counted quantities in one transaction.
+
+    The differences are recorded as `count` movements referencing the stock
+    take, with a fixed number of set-based statements whatever the number of lines.
+    """
+    take = _get_take(db, take_id, open_only=True)
+    batch_id = apply_stock_take(db, take)
+    if batch_id is None:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Stock take is not open")
+    db.commit()
+    db.refresh(take)
+    return {"stock_take": _summary(db, take.id), "summary": variance_summary(db, take), "batch_id": batch_id}
+
+@router.post("/{take_id}/cancel", status_code=status.HTTP_200_OK, response_model=StockTakeResponse, summary="Cancel stock take")
+async def cancel_stock_take(db: dbDepend, take_id: Annotated[int, Path(gt=0)], user: userDepend):
+    """Cancel an open stock take; its staged counts are kept but never applied."""
+    take = _get_take(db, take_id, open_only=True)
+    take.status = "cancelled"
+    db.commit()
+    return _summary(db, take_id)
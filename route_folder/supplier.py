@@ -1,23 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
 from typing import Optional
-from model_folder.model import Supplier, Staff
-from database import SessionLocal
-from typing import List, Annotated
-from util.auth import get_current_user
-
-#Dependecies
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from model_folder.model import Supplier
+from database import dbDepend
+from typing import List
+from util.auth import userDepend
+from util.writes import update_returning
 
 router = APIRouter()
-dbDepend = Annotated[Session, Depends(get_db)]
-userDepend = Annotated[Staff, Depends(get_current_user)]
 
 # --- Pydantic Schemas ---
 class SupplierBase(BaseModel):
@@ -40,7 +30,6 @@ async def create_supplier(supplier: SupplierBase, db: dbDepend, user: userDepend
     new_supplier = Supplier(**supplier.dict())
     db.add(new_supplier)
     db.commit()
-    db.refresh(new_supplier)
     return new_supplier
 
 @router.get("/", status_code=status.HTTP_200_OK,response_model=List[SupplierOut], summary="Get all active suppliers")
@@ -79,32 +68,29 @@ def update_supplier(supplier_id: int, updated: SupplierBase, db: dbDepend, user:
     for key, value in updated.model_dump(exclude_unset=True).items():
         setattr(supplier, key, value)
     db.commit()
-    db.refresh(supplier)
     return supplier
 
 @router.patch("/{supplier_id}/deactivate", status_code=status.HTTP_200_OK, response_model=SupplierOut, summary="Deactivate supplier")
 def deactivate_supplier(supplier_id: int, db: dbDepend, user: userDepend):
     """Soft delete (deactivate) a supplier."""
-    supplier = db.query(Supplier).filter(Supplier.id == supplier_id, Supplier.is_active == True).first()
+    supplier = update_returning(db, Supplier, {"is_active": False}, Supplier.id == supplier_id, Supplier.is_active == True)
     if not supplier:
         raise HTTPException(status_code=404, detail="Supplier not found")
-    supplier.is_active = False
     db.commit()
     return {"message": f"Supplier {supplier_id} deactivated."}
 
 @router.patch("/{supplier_id}/reactivate", status_code=status.HTTP_200_OK, response_model=SupplierOut, summary="Reactivate supplier")
 def reactivate_supplier(supplier_id: int, db: dbDepend, user: userDepend):
     """Reactivate a previously soft-deleted supplier."""
-    supplier = db.query(Supplier).filter(Supplier.id == supplier_id, Supplier.is_active == False).first()
+    supplier = update_returning(db, Supplier, {"is_active": True}, Supplier.id == supplier_id, Supplier.is_active == False)
     if not supplier:
         raise HTTPException(status_code=404, detail="Supplier not found")
-    supplier.is_active = True
     db.commit()
     return {"message": f"Supplier {supplier_id} reactivated."}
 
 
 @router.post("/admin/reset-suppliers")
-def reset_supplier_table(db: Session = Depends(get_db)):
+def reset_supplier_table(db: dbDepend):
     Supplier.__table__.drop(db.bind, checkfirst=True)
     Supplier.__table__.create(db.bind, checkfirst=True)
     return {"msg": "Suppliers table dropped and recreated"}
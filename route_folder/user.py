@@ -1,23 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Path, status
-from sqlalchemy.orm import Session, joinedload
-from model_folder.model import User, Staff
-from database import SessionLocal
-from typing import Annotated, List
-from pydantic import BaseModel, Field, EmailStr
-from util.auth import get_current_user
-
-
-#Dependecies
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload, selectinload
+from model_folder.model import ArchivedOrder, Order, User, Staff
+from database import dbDepend
+from typing import Annotated, List, Optional
+from pydantic import BaseModel, Field, EmailStr, model_validator
+from datetime import datetime
+from util.auth import userDepend
+from util.batch import in_request_order, parse_ids
+from util.writes import update_returning
+
 
 router = APIRouter()
-dbDependency = Annotated[Session, Depends(get_db)]
-userDepend = Annotated[Staff, Depends(get_current_user)]
 
 
 # --- Pydantic Schemas ---
@@ -46,19 +40,57 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class UserBatch(BaseModel):
+    items: List[UserResponse]
+    missing: List[int]
+
+class CustomerOrderLine(BaseModel):
+    id: int
+    product_id: Optional[int]
+    quantity: Optional[int]
+    price: Optional[float]
+    discount: Optional[float]
+    bill_number: Optional[int]
+    location_id: Optional[int]
+    is_active: bool
+
+    class Config:
+        from_attributes = True
+
+class CustomerOrder(BaseModel):
+    id: int
+    detail: Optional[str]
+    order_date: datetime
+    is_active: bool
+    lines: Optional[List[CustomerOrderLine]] = None
+
+class OrderHistoryQuery(BaseModel):
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    before_date: Optional[datetime] = Field(None, description="`order_date` of the last order on the previous page")
+    before_id: Optional[int] = Field(None, description="`id` of the last order on the previous page")
+    include_inactive: bool = False
+    include_lines: bool = False
+    limit: int = Field(50, gt=0, le=500)
+
+    @model_validator(mode="after")
+    def cursor_pair(self):
+        if (self.before_date is None) != (self.before_id is None):
+            raise ValueError("Provide both before_date and before_id, or neither")
+        return self
+
 # --- FastAPI Router ---
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=UserResponse, summary="Register new user")
-async def create_user(db: dbDependency, cust: UserCreate, user: userDepend):
+async def create_user(db: dbDepend, cust: UserCreate, user: userDepend):
     """Register a new user with the system."""
     new_user = User(**cust.model_dump(), is_active=True)  # Active by default
     db.add(new_user)
     db.commit()
-    db.refresh(new_user)
     return new_user
 
 @router.get("/", status_code=status.HTTP_200_OK, summary="Get all active users")
-async def get_all_active_users(db: dbDependency, user: userDepend):
+async def get_all_active_users(db: dbDepend, user: userDepend):
     """Retrieve a list of all active users"""
     users = db.query(User).options(joinedload(User.staff)).filter(User.is_active == True).order_by(User.id).all()
     return [
@@ -74,20 +106,64 @@ async def get_all_active_users(db: dbDependency, user: userDepend):
     ]
 
 @router.get("/inactive", status_code=status.HTTP_200_OK, response_model=List[UserResponse], summary="Get all inactive users")
-async def get_all_inactive_users(db: dbDependency, user: userDepend):
+async def get_all_inactive_users(db: dbDepend, user: userDepend):
     """Retrieve a list of all inactive (soft-deleted) users."""
     return db.query(User).filter(User.is_active == False).order_by(User.id).all()
 
+@router.get("/batch", status_code=status.HTTP_200_OK, response_model=UserBatch, summary="Get many users by ID")
+async def get_users_by_ids(db: dbDepend, ids: Annotated[List[int], Depends(parse_ids)], user: userDepend):
+    """Users for `ids` in request order from one IN query; unknown ids are listed in `missing`."""
+    items, missing = in_request_order(db.query(User).filter(User.id.in_(ids)).all(), ids, lambda u: u.id)
+    return {"items": items, "missing": missing}
+
 @router.get("/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponse, summary="Get user by ID")
-async def get_user_by_id(db: dbDependency, user_id: Annotated[int, Path(gt=0, example=1)], user: userDepend):
+async def get_user_by_id(db: dbDepend, user_id: Annotated[int, Path(gt=0, example=1)], user: userDepend):
     """Retrieve a user by their ID."""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
 
+@router.get("/{user_id}/orders", status_code=status.HTTP_200_OK, response_model=List[CustomerOrder], summary="Order history of a user")
+async def get_user_orders(db: dbDepend, user_id: Annotated[int, Path(gt=0)], params: Annotated[OrderHistoryQuery, Query()], user: userDepend):
+    """
+    A customer's orders, newest first, optionally with their lines.
+
+    Live and archived orders are both served from their (customer_id,
+    order_date) index: each tier is asked for one page and the two are merged.
+    To page back, pass the last order's `order_date` and `id` as `before_date`
+    and `before_id`. Lines come from one extra batched query per tier.
+    """
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    orders = []
+    for model in (Order, ArchivedOrder):
+        query = db.query(model).filter(model.customer_id == user_id)
+        if not params.include_inactive:
+            query = query.filter(model.is_active == True)
+        if params.since is not None:
+            query = query.filter(model.order_date >= params.since)
+        if params.until is not None:
+            query = query.filter(model.order_date <= params.until)
+        if params.before_id is not None:
+            query = query.filter(tuple_(model.order_date, model.id) < tuple_(params.before_date, params.before_id))
+        if params.include_lines:
+            query = query.options(selectinload(model.order_details))
+        orders += query.order_by(model.order_date.desc(), model.id.desc()).limit(params.limit).all()
+    orders.sort(key=lambda order: (order.order_date, order.id), reverse=True)
+    return [
+        CustomerOrder(
+            id=order.id,
+            detail=order.detail,
+            order_date=order.order_date,
+            is_active=order.is_active,
+            lines=order.order_details if params.include_lines else None,
+        )
+        for order in orders[:params.limit]
+    ]
+
 @router.patch("/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponse, summary="Update user")
-async def update_user(db: dbDependency, cust_req: UserUpdate, user_id: Annotated[int, Path(gt=0)], user: userDepend):
+async def update_user(db: dbDepend, cust_req: UserUpdate, user_id: Annotated[int, Path(gt=0)], user: userDepend):
     """Update user details."""
     user_obj = db.query(User).filter(User.id == user_id).first()
     if not user_obj:
@@ -95,28 +171,23 @@ async def update_user(db: dbDependency, cust_req: UserUpdate, user_id: Annotated
     for field, value in cust_req.model_dump(exclude_unset=True).items():
         setattr(user_obj, field, value)
     db.commit()
-    db.refresh(user_obj)
     return user_obj
 
 
 @router.patch("/{user_id}/deactivate", status_code=status.HTTP_200_OK, response_model=UserResponse, summary="Deactivate user")
-async def deactivate_user(db: dbDependency, user_id: Annotated[int, Path(gt=0)], user: userDepend):
+async def deactivate_user(db: dbDepend, user_id: Annotated[int, Path(gt=0)], user: userDepend):
     """Soft-delete a user by setting is_active to False."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = update_returning(db, User, {"is_active": False}, User.id == user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    user.is_active = False
     db.commit()
-    db.refresh(user)
     return user
 
 @router.patch("/{user_id}/reactivate", status_code=status.HTTP_200_OK, response_model=UserResponse, summary="Reactivate user")
-async def reactivate_user(db: dbDependency, user_id: Annotated[int, Path(gt=0)], user: userDepend):
+async def reactivate_user(db: dbDepend, user_id: Annotated[int, Path(gt=0)], user: userDepend):
     """Reactivate a previously deactivated user."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = update_returning(db, User, {"is_active": True}, User.id == user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    user.is_active = True
     db.commit()
-    db.refresh(user)
     return user
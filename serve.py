@@ -0,0 +1,39 @@
+# Multi-process server entry point.
+#
+#     python createtables.py              # once per deploy
+#     python serve.py --workers 16
+#
+# Every worker is a separate process that imports the app on its own, so each
+# one builds its own engine/pool and CryptContext; nothing is shared between
+# workers except the database. Workers dispose their pool on shutdown.
+import argparse
+import os
+import uvicorn
+from database import check_worker_safety, dispose_engines, engine
+from util.schema import verify_schema
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the inventory API with one process per core.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="Seconds to let in-flight requests finish on shutdown")
+    args = parser.parse_args()
+
+    verify_schema(engine)
+    check_worker_safety(args.workers)
+    # The parent only supervises; don't hand its connections to the workers.
+    dispose_engines()
+
+    uvicorn.run(
+        "route:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
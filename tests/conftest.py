@@ -0,0 +1,78 @@
+import os
+import sys
+import tempfile
+import uuid
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# One scratch database for the whole run; set before anything imports database.py.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+# Every request in the suite comes from a handful of staff members.
+os.environ.setdefault("RATE_LIMIT_BURST", "1000000")
+os.environ.setdefault("RATE_LIMIT_PER_SECOND", "1000000")
+os.environ.setdefault("JOB_POLL_SECONDS", "0.05")
+os.environ.setdefault("AUDIT_FLUSH_SECONDS", "0.05")
+
+import pytest
+from fastapi.testclient import TestClient
+from database import SessionLocal, engine
+from model_folder.model import Category, Product, Staff, Supplier
+from util.auth import create_token
+from util.schema import bootstrap_schema
+
+bootstrap_schema(engine)
+
+
+@pytest.fixture(scope="module")
+def client():
+    """The app with its lifespan (job workers, audit writer, change follower) running."""
+    from route import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def make_staff(role_id: int = 1, is_active: bool = True) -> Staff:
+    name = f"staff-{uuid.uuid4().hex[:8]}"
+    with SessionLocal() as db:
+        staff = Staff(username=name, email=f"{name}@example.com", password=name, role_id=role_id, is_active=is_active)
+        db.add(staff)
+        db.commit()
+        db.refresh(staff)
+        db.expunge(staff)
+        return staff
+
+
+def auth_headers(staff: Staff) -> dict:
+    return {"Authorization": f"Bearer {create_token(staff.username, staff.id, timedelta(minutes=30))}"}
+
+
+@pytest.fixture
+def staff() -> Staff:
+    return make_staff()
+
+
+@pytest.fixture
+def headers(staff) -> dict:
+    return auth_headers(staff)
+
+
+@pytest.fixture
+def products():
+    """make(n, unit=10, price=5.0) -> ids of n new products in a new category and supplier."""
+    def make(count: int = 3, unit: int = 10, price: float = 5.0) -> list[int]:
+        tag = uuid.uuid4().hex[:8]
+        with SessionLocal() as db:
+            category = Category(name=f"cat-{tag}", description=f"category {tag}", is_active=True)
+            supplier = Supplier(name=f"sup-{tag}", is_active=True)
+            db.add_all([category, supplier])
+            db.flush()
+            rows = [
+                Product(name=f"p-{tag}-{i}", desc="test product", unit=unit, price=price, cat_id=category.id,
+                        supplier_id=supplier.id, status="Available")
+                for i in range(count)
+            ]
+            db.add_all(rows)
+            db.commit()
+            return [row.id for row in rows]
+    return make
@@ -0,0 +1,57 @@
+import datetime
+import uuid
+from database import SessionLocal
+from model_folder.model import ArchivedOrder, ArchivedOrderDetail, Order, Order_Detail, User
+from util.archive import archivable_orders, archive_orders
+
+DAY = datetime.timedelta(days=1)
+
+
+def _orders() -> tuple[int, dict[str, int]]:
+    now = datetime.datetime.utcnow()
+    with SessionLocal() as db:
+        customer = User(email=f"{uuid.uuid4().hex[:8]}@example.com", is_active=True)
+        db.add(customer)
+        db.flush()
+        orders = {
+            "old": Order(customer_id=customer.id, order_date=now - 800 * DAY, is_active=True),
+            "closed": Order(customer_id=customer.id, order_date=now - 60 * DAY, is_active=False),
+            "open": Order(customer_id=customer.id, order_date=now - 60 * DAY, is_active=True),
+            "busy": Order(customer_id=customer.id, order_date=now - 800 * DAY, is_active=True),
+        }
+        db.add_all(orders.values())
+        db.flush()
+        db.add_all([
+            Order_Detail(order_id=orders["old"].id, price=2.0, quantity=1, date=now - 800 * DAY, is_active=True),
+            Order_Detail(order_id=orders["busy"].id, price=2.0, quantity=1, date=now - DAY, is_active=True),
+        ])
+        db.add(Order(order_date=now, is_active=True))  # keeps the newest id live
+        db.commit()
+        return customer.id, {name: order.id for name, order in orders.items()}
+
+
+def test_old_and_closed_orders_move_to_the_archive_and_back(client, headers):
+    customer_id, ids = _orders()
+    with SessionLocal() as db:
+        due = set(archivable_orders(db, datetime.datetime.utcnow(), 100_000)) & set(ids.values())
+        assert due == {ids["old"], ids["closed"]}
+        assert archive_orders(db, sorted(due)) == {"orders": 2, "order_details": 1}
+        db.commit()
+        assert db.get(Order, ids["old"]) is None
+        assert db.query(ArchivedOrderDetail).filter(ArchivedOrderDetail.order_id == ids["old"]).count() == 1
+
+    # Reads fall through to the archive.
+    assert client.get(f"/orders/{ids['old']}", headers=headers).json()["id"] == ids["old"]
+    assert client.get(f"/orders/{ids['old']}/receipt", headers=headers).json()["total"] == 2.0
+    batch = client.get("/orders/batch", params={"ids": f"{ids['old']},{ids['open']}"}, headers=headers).json()
+    assert [o["id"] for o in batch["items"]] == [ids["old"], ids["open"]]
+    history = client.get(f"/users/{customer_id}/orders", params={"include_inactive": True}, headers=headers).json()
+    assert {o["id"] for o in history} == set(ids.values())
+
+    restored = client.post(f"/orders/{ids['old']}/restore", headers=headers)
+    assert restored.status_code == 200 and restored.json()["id"] == ids["old"]
+    with SessionLocal() as db:
+        assert db.get(ArchivedOrder, ids["old"]) is None
+        assert db.query(Order_Detail).filter(Order_Detail.order_id == ids["old"]).count() == 1
+    assert client.post(f"/orders/{ids['open']}/restore", headers=headers).status_code == 409  # not archived
+    assert client.post("/orders/999999/restore", headers=headers).status_code == 404
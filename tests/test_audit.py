@@ -0,0 +1,45 @@
+import json
+import logging
+import time
+from sqlalchemy import create_engine
+import util.audit
+from database import SessionLocal
+from model_folder.model import AuditEvent
+from util.audit import AuditWriter
+
+
+def _events(entity: str, entity_ids: list[str], action: str) -> list[AuditEvent]:
+    deadline = time.monotonic() + 5
+    while True:
+        with SessionLocal() as db:
+            found = db.query(AuditEvent).filter(
+                AuditEvent.entity == entity, AuditEvent.entity_id.in_(entity_ids), AuditEvent.action == action
+            ).all()
+        if len(found) >= len(entity_ids) or time.monotonic() > deadline:
+            return found
+
+
+def test_a_set_based_update_is_recorded_per_row(client, headers, products):
+    ids = products(3)
+    response = client.post("/products/bulk/deactivate", json={"ids": ids}, headers=headers)
+    assert response.json() == {"affected": 3}
+    events = _events("products", [str(i) for i in ids], "bulk_update")
+    assert sorted(int(event.entity_id) for event in events) == ids
+    for event in events:
+        after = json.loads(event.changes)["after"]
+        assert after["status"] == "Unavailable" and after["unit"] == 10
+
+
+def test_stop_logs_events_it_could_not_write(monkeypatch, tmp_path, caplog):
+    monkeypatch.setattr(util.audit, "engine", create_engine(f"sqlite:///{tmp_path}/missing/audit.db"))
+    writer = AuditWriter(batch_size=10)
+    writer.add([(None, None, "products", "1", "update", {"before": {}, "after": {}})])
+    with caplog.at_level(logging.ERROR, logger="util.audit"):
+        writer.stop()
+    assert "1 audit events not written at shutdown" in caplog.text
+
+
+def test_a_full_buffer_drops_and_counts_new_events():
+    writer = AuditWriter(buffer_size=2)
+    writer.add([(None, None, "products", str(i), "update", {}) for i in range(3)])
+    assert writer.dropped == 1
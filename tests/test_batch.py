@@ -0,0 +1,23 @@
+from util.batch import MAX_BATCH_IDS
+
+
+def test_products_come_back_in_request_order_with_the_missing_ids(client, headers, products):
+    first, _, third = products(3)
+    response = client.get("/products/batch", params={"ids": [f"{third},999999", str(first), str(third)]}, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == [third, first]
+    assert body["missing"] == [999999]
+    assert all(item["category_name"] for item in body["items"])
+
+
+def test_orders_and_users_are_fetched_by_ids(client, headers):
+    assert client.get("/orders/batch", params={"ids": "999998,999999"}, headers=headers).json() == {
+        "items": [], "missing": [999998, 999999],
+    }
+    assert client.get("/users/batch", params={"ids": "999999"}, headers=headers).json()["missing"] == [999999]
+
+
+def test_bad_id_lists_are_rejected(client, headers):
+    for ids in ("1,x", "0", ",", ",".join(str(i) for i in range(1, MAX_BATCH_IDS + 2))):
+        assert client.get("/products/batch", params={"ids": ids}, headers=headers).status_code == 422, ids
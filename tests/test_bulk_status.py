@@ -0,0 +1,46 @@
+import datetime
+from database import SessionLocal
+from model_folder.model import Order, Order_Detail, Product
+
+
+def _statuses(ids: list[int]) -> list[str]:
+    with SessionLocal() as db:
+        return [db.get(Product, i).status for i in ids]
+
+
+def test_products_are_deactivated_and_reactivated_by_filter(client, headers, products):
+    ids = products(3)
+    with SessionLocal() as db:
+        supplier_id = db.get(Product, ids[0]).supplier_id
+    first = client.post("/products/bulk/deactivate", json={"ids": ids[:2]}, headers=headers)
+    assert first.json() == {"affected": 2}
+    # Only rows that actually change state are counted.
+    again = client.post("/products/bulk/deactivate", json={"supplier_id": supplier_id}, headers=headers)
+    assert again.json() == {"affected": 1}
+    assert _statuses(ids) == ["Unavailable"] * 3
+    back = client.post("/products/bulk/reactivate", json={"ids": ids, "supplier_id": supplier_id}, headers=headers)
+    assert back.json() == {"affected": 3}
+    assert _statuses(ids) == ["Available"] * 3
+
+
+def test_a_bulk_request_without_a_filter_is_rejected(client, headers):
+    for path in ("/products/bulk/deactivate", "/orders/bulk/deactivate", "/orderdetails/bulk/reactivate"):
+        assert client.post(path, json={}, headers=headers).status_code == 422
+
+
+def test_orders_and_their_lines_are_deactivated_before_a_date(client, headers):
+    now = datetime.datetime.utcnow()
+    with SessionLocal() as db:
+        old, new = Order(is_active=True, order_date=now - datetime.timedelta(days=30)), Order(is_active=True, order_date=now)
+        db.add_all([old, new])
+        db.flush()
+        lines = [Order_Detail(order_id=order.id, is_active=True, date=order.order_date, price=1.0, total=1.0) for order in (old, new)]
+        db.add_all(lines)
+        db.commit()
+        order_ids, line_ids = [old.id, new.id], [line.id for line in lines]
+    cutoff = (now - datetime.timedelta(days=1)).isoformat()
+    assert client.post("/orders/bulk/deactivate", json={"ids": order_ids, "before": cutoff}, headers=headers).json() == {"affected": 1}
+    assert client.post("/orderdetails/bulk/deactivate", json={"order_ids": order_ids}, headers=headers).json() == {"affected": 2}
+    with SessionLocal() as db:
+        assert [db.get(Order, i).is_active for i in order_ids] == [False, True]
+        assert [db.get(Order_Detail, i).is_active for i in line_ids] == [False, False]
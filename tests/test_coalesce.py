@@ -0,0 +1,64 @@
+import asyncio
+import util.coalesce
+from conftest import auth_headers, make_staff
+from util.coalesce import CoalescingMiddleware
+
+
+def _scope(headers: dict, path: str = "/products/") -> dict:
+    return {
+        "type": "http", "method": "GET", "path": path, "query_string": b"",
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+    }
+
+
+def _run(middleware, scopes):
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def one(scope):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+        await middleware(scope, receive, send)
+        return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+    async def many():
+        return await asyncio.gather(*(one(scope) for scope in scopes))
+    return asyncio.run(many())
+
+
+def _app(calls: list):
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"listing"})
+    return app
+
+
+def test_identical_listings_share_one_handler_run_and_one_role_lookup(monkeypatch):
+    lookups = []
+    real = util.coalesce._active_role
+    monkeypatch.setattr(util.coalesce, "_active_role", lambda staff_id: lookups.append(staff_id) or real(staff_id))
+    calls = []
+    middleware = CoalescingMiddleware(_app(calls))
+    same_role = [auth_headers(make_staff()) for _ in range(3)]
+
+    results = _run(middleware, [_scope(headers) for headers in same_role for _ in range(5)])
+    assert results == [(200, b"listing")] * 15
+    assert calls == ["/products/"]
+    assert sorted(lookups) == sorted(set(lookups)) and len(lookups) == 3
+
+    _run(middleware, [_scope(same_role[0])])
+    assert len(lookups) == 3  # still cached
+    assert calls == ["/products/"] * 2
+
+
+def test_inactive_staff_and_other_roles_are_not_coalesced():
+    calls = []
+    middleware = CoalescingMiddleware(_app(calls))
+    inactive = auth_headers(make_staff(is_active=False))
+    other_role = auth_headers(make_staff(role_id=2))
+    _run(middleware, [_scope(inactive), _scope(inactive), _scope(other_role), _scope(auth_headers(make_staff()))])
+    assert len(calls) == 4
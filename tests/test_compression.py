@@ -0,0 +1,58 @@
+import asyncio
+import gzip
+import json
+import zlib
+from util.compression import CompressionMiddleware, brotli, negotiate
+
+
+def _respond(chunks: list[bytes], content_type: bytes = b"application/json"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+def _call(app, accept_encoding: str = "gzip") -> tuple[dict, list[bytes]]:
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(scope, receive, send))
+    return {k.decode(): v.decode() for k, v in sent[0]["headers"]}, [m["body"] for m in sent[1:]]
+
+
+def test_negotiation_honours_q_values():
+    assert negotiate("gzip;q=0.5, br;q=0") == "gzip"
+    assert negotiate("br;q=0, gzip;q=0") is None
+    assert negotiate("identity") is None
+    assert negotiate("*") == ("br" if brotli is not None else "gzip")
+
+
+def test_a_large_json_body_is_gzipped_with_vary():
+    body = json.dumps([{"id": i, "name": "product"} for i in range(100)]).encode()
+    headers, chunks = _call(_respond([body]))
+    assert headers["content-encoding"] == "gzip" and headers["vary"] == "Accept-Encoding"
+    assert int(headers["content-length"]) == len(chunks[0]) < len(body)
+    assert gzip.decompress(chunks[0]) == body
+
+
+def test_small_and_incompressible_bodies_pass_through():
+    headers, chunks = _call(_respond([b'{"ok": true}']))
+    assert "content-encoding" not in headers and headers["vary"] == "Accept-Encoding"
+    assert chunks == [b'{"ok": true}']
+    headers, chunks = _call(_respond([b"\x89PNG" * 100], b"image/png"))
+    assert "content-encoding" not in headers and "vary" not in headers
+
+
+def test_a_stream_is_flushed_chunk_by_chunk():
+    events = [f"data: {i}\n\n".encode() for i in range(3)]
+    headers, chunks = _call(_respond(events, b"text/event-stream"))
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+    decoder = zlib.decompressobj(31)
+    # Each event can be decoded as soon as its chunk arrives.
+    assert [decoder.decompress(chunk) for chunk in chunks] == events
@@ -0,0 +1,46 @@
+import datetime
+import numpy as np
+import pytest
+from database import SessionLocal
+from model_folder.model import Order_Detail, Product
+from util.forecast import FORECAST_HISTORY_DAYS, FORECAST_HORIZON_DAYS, forecast_matrix, level_weights, run_forecast
+
+SATURDAY = np.datetime64("2026-01-03")
+
+
+@pytest.mark.parametrize("method", ["exponential", "moving_average"])
+def test_level_weights_sum_to_one(method):
+    assert level_weights(60, method).sum() == pytest.approx(1)
+    with pytest.raises(ValueError):
+        level_weights(60, "guess")
+
+
+def test_steady_and_weekly_demand_are_forecast():
+    history = np.zeros((2, 56))
+    history[0] = 2
+    history[1, ::7] = 7  # only ever sold on Saturdays
+    forecast = forecast_matrix(history, SATURDAY, 14)
+    assert forecast[0] == pytest.approx(np.full(14, 2.0))
+    # The history ends on a Friday, so the forecast starts on a Saturday.
+    assert forecast[1] == pytest.approx(np.tile([7.0, 0, 0, 0, 0, 0, 0], 2))
+
+
+def test_a_run_forecasts_every_product_and_sizes_shortfalls(client, headers, products):
+    selling, idle = products(2, unit=10)
+    today = datetime.datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    with SessionLocal() as db:
+        db.add_all([
+            Order_Detail(product_id=selling, quantity=3, price=1.0, total=3.0, is_active=True, date=today - datetime.timedelta(days=d))
+            for d in range(1, FORECAST_HISTORY_DAYS + 1)
+        ])
+        db.commit()
+        supplier_id = db.get(Product, selling).supplier_id
+        assert run_forecast(db)["with_sales"] >= 1
+
+    forecast = client.get(f"/forecasts/products/{selling}", headers=headers).json()
+    assert forecast["daily"] == pytest.approx([3.0] * FORECAST_HORIZON_DAYS)
+    assert forecast["shortfall"] == pytest.approx(3.0 * FORECAST_HORIZON_DAYS - 10)
+    by_supplier = client.get(f"/forecasts/suppliers/{supplier_id}", headers=headers).json()
+    assert [p["product_id"] for p in by_supplier["products"]] == [selling, idle]
+    assert by_supplier["shortfall"] == pytest.approx(forecast["shortfall"])
+    assert client.get("/forecasts/suppliers/999999", headers=headers).status_code == 404
@@ -0,0 +1,62 @@
+import datetime
+import uuid
+from database import SessionLocal
+from model_folder.model import IdempotencyKey, Payment
+
+PAYMENT = {"other_details": "front desk", "payment_type": "Card"}
+
+
+def _post(client, headers, key, body=PAYMENT):
+    return client.post("/payments/", json=body, headers={**headers, "Idempotency-Key": key})
+
+
+def _payments(details: str) -> int:
+    with SessionLocal() as db:
+        return db.query(Payment).filter(Payment.other_details == details).count()
+
+
+def _abandon(key: str, locked_until: datetime.datetime) -> None:
+    """Leave the key as a request that crashed before its response was stored would."""
+    with SessionLocal() as db:
+        db.query(IdempotencyKey).filter(IdempotencyKey.key == key).update(
+            {IdempotencyKey.status_code: None, IdempotencyKey.response_body: None, IdempotencyKey.locked_until: locked_until}
+        )
+        db.commit()
+
+
+def test_a_retry_replays_the_stored_response(client, headers):
+    body = {**PAYMENT, "other_details": f"replay {uuid.uuid4().hex}"}
+    key = uuid.uuid4().hex
+    first = _post(client, headers, key, body)
+    second = _post(client, headers, key, body)
+    assert first.status_code == second.status_code == 201
+    assert second.content == first.content
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert _payments(body["other_details"]) == 1
+
+
+def test_the_same_key_with_another_body_is_rejected(client, headers):
+    key = uuid.uuid4().hex
+    assert _post(client, headers, key).status_code == 201
+    response = _post(client, headers, key, {**PAYMENT, "payment_type": "Cash"})
+    assert response.status_code == 422
+
+
+def test_a_retry_takes_over_a_key_whose_request_never_finished(client, headers, staff):
+    body = {**PAYMENT, "other_details": f"takeover {uuid.uuid4().hex}"}
+    key = uuid.uuid4().hex
+    assert _post(client, headers, key, body).status_code == 201
+    stored_key = f"{staff.id}:{key}"
+
+    _abandon(stored_key, datetime.datetime.utcnow() + datetime.timedelta(minutes=1))
+    assert _post(client, headers, key, body).status_code == 409  # may still be running
+
+    _abandon(stored_key, datetime.datetime.utcnow() - datetime.timedelta(seconds=1))
+    assert _post(client, headers, key, {**PAYMENT, "payment_type": "Cash"}).status_code == 422  # not the same request
+    retried = _post(client, headers, key, body)
+    assert retried.status_code == 201 and "idempotent-replayed" not in retried.headers
+    assert _payments(body["other_details"]) == 2
+
+    replayed = _post(client, headers, key, body)
+    assert replayed.headers["idempotent-replayed"] == "true" and replayed.content == retried.content
@@ -0,0 +1,102 @@
+import datetime
+import threading
+import pytest
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from model_folder.model import Job
+from util.jobs import (
+    _claim_next, enqueue, enqueue_if_idle, job_handler, renew_leases, request_cancel, requeue_stale_jobs, run_job,
+)
+
+KIND = "test.echo"
+
+
+@job_handler(KIND)
+def echo(db, ctx):
+    return {"echo": ctx.payload, "attempt": ctx.attempt}
+
+
+@pytest.fixture(autouse=True)
+def no_jobs():
+    with SessionLocal() as db:
+        db.query(Job).delete()
+        db.commit()
+
+
+def _job(job_id: int) -> Job:
+    with SessionLocal() as db:
+        return db.get(Job, job_id)
+
+
+def _running(lease_until) -> int:
+    with SessionLocal() as db:
+        job = enqueue(db, KIND)
+        job.status, job.started_at, job.lease_until = "running", datetime.datetime.utcnow(), lease_until
+        db.commit()
+        return job.id
+
+
+def test_a_queued_job_runs_and_stores_its_result():
+    with SessionLocal() as db:
+        job_id = enqueue(db, KIND, {"n": 1}).id
+    job = _claim_next(datetime.datetime.utcnow())
+    assert job.id == job_id and job.status == "running" and job.lease_until is not None
+    run_job(job)
+    done = _job(job_id)
+    assert done.status == "succeeded"
+    assert done.result == '{"echo": {"n": 1}, "attempt": 1}'
+
+
+def test_concurrent_schedulers_queue_one_job():
+    results = []
+    barrier = threading.Barrier(8)
+
+    def schedule_once():
+        barrier.wait()
+        results.append(enqueue_if_idle(KIND))
+
+    threads = [threading.Thread(target=schedule_once) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1
+    with SessionLocal() as db:
+        assert db.query(Job).filter(Job.kind == KIND).count() == 1
+        # The index holds even for a caller that skipped the check.
+        with pytest.raises(IntegrityError):
+            enqueue(db, KIND, dedupe_key=KIND)
+
+
+def test_a_running_job_blocks_scheduling_unless_excluded():
+    _running(datetime.datetime.utcnow() + datetime.timedelta(minutes=1))
+    assert enqueue_if_idle(KIND) is False
+    assert enqueue_if_idle(KIND, include_running=False) is True
+    assert enqueue_if_idle(KIND, include_running=False) is False
+
+
+def test_cancel_stops_a_queued_job_and_flags_a_running_one():
+    with SessionLocal() as db:
+        queued = enqueue(db, KIND)
+        assert request_cancel(db, queued).status == "cancelled"
+    running_id = _running(datetime.datetime.utcnow() + datetime.timedelta(minutes=1))
+    with SessionLocal() as db:
+        job = request_cancel(db, db.get(Job, running_id))
+        assert (job.status, job.cancel_requested) == ("running", True)
+    assert _claim_next(datetime.datetime.utcnow()) is None
+
+
+def test_only_jobs_whose_lease_ran_out_are_requeued():
+    now = datetime.datetime.utcnow()
+    alive = _running(now + datetime.timedelta(minutes=1))
+    dead = _running(now - datetime.timedelta(seconds=1))
+    assert requeue_stale_jobs() == 1
+    assert _job(alive).status == "running"
+    assert _job(dead).status == "queued"
+
+
+def test_renewing_a_lease_keeps_the_job_running():
+    job_id = _running(datetime.datetime.utcnow() - datetime.timedelta(seconds=1))
+    renew_leases([job_id])
+    assert _job(job_id).lease_until > datetime.datetime.utcnow()
+    assert requeue_stale_jobs() == 0
@@ -0,0 +1,59 @@
+import uuid
+from database import SessionLocal
+from model_folder.model import LocationStock, Product, StockMovement
+from util.ledger import record_movement, record_transfer
+
+
+def _location(client, headers, name: str) -> int:
+    response = client.post("/locations/", json={"name": f"{name}-{uuid.uuid4().hex[:8]}", "kind": "store"}, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def _held(location_id: int, product_id: int) -> int:
+    with SessionLocal() as db:
+        row = db.get(LocationStock, (location_id, product_id))
+        return 0 if row is None else row.quantity
+
+
+def _stocked(client, headers, products, quantity: int = 5) -> tuple[int, int, int]:
+    source, destination = _location(client, headers, "source"), _location(client, headers, "destination")
+    product_id = products(1, unit=0)[0]
+    with SessionLocal() as db:
+        record_movement(db, product_id, quantity, "adjustment", "test", source)
+        db.commit()
+    return source, destination, product_id
+
+
+def test_a_transfer_moves_stock_between_locations(client, headers, products):
+    source, destination, product_id = _stocked(client, headers, products)
+    body = {"from_location_id": source, "to_location_id": destination,
+            "lines": [{"product_id": product_id, "quantity": 2}, {"product_id": product_id, "quantity": 1}]}
+    response = client.post("/locations/transfers", json=body, headers=headers)
+    assert response.status_code == 200 and response.json() == {"moved": 3}
+    assert (_held(source, product_id), _held(destination, product_id)) == (2, 3)
+    with SessionLocal() as db:
+        assert db.get(Product, product_id).unit == 5
+        assert db.query(StockMovement).filter(StockMovement.product_id == product_id, StockMovement.kind == "transfer").count() == 2
+
+
+def test_a_transfer_of_more_than_is_held_changes_nothing(client, headers, products):
+    source, destination, product_id = _stocked(client, headers, products)
+    other = products(1)[0]  # held nowhere
+    body = {"from_location_id": source, "to_location_id": destination,
+            "lines": [{"product_id": product_id, "quantity": 5}, {"product_id": other, "quantity": 1}]}
+    response = client.post("/locations/transfers", json=body, headers=headers)
+    assert response.status_code == 409 and str([other]) in response.json()["detail"]
+    assert (_held(source, product_id), _held(destination, product_id)) == (5, 0)
+
+
+def test_two_transfers_cannot_both_take_the_same_stock(client, headers, products):
+    source, destination, product_id = _stocked(client, headers, products)
+    with SessionLocal() as first, SessionLocal() as second:
+        # Both see enough stock before either writes.
+        assert _held(source, product_id) == 5
+        assert record_transfer(first, product_id, 4, source, destination)
+        first.commit()
+        assert not record_transfer(second, product_id, 4, source, destination)
+        second.rollback()
+    assert (_held(source, product_id), _held(destination, product_id)) == (1, 4)
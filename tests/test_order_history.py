@@ -0,0 +1,54 @@
+import datetime
+import uuid
+from database import SessionLocal
+from model_folder.model import Order, Order_Detail, User
+
+DAY = datetime.timedelta(days=1)
+
+
+def _customer(days_ago: list[int]) -> tuple[int, list[int], datetime.datetime]:
+    """A customer with one order per entry of `days_ago`; the oldest is inactive, the newest has a line."""
+    now = datetime.datetime(2026, 6, 1, 12)
+    with SessionLocal() as db:
+        customer = User(email=f"{uuid.uuid4().hex[:8]}@example.com", is_active=True)
+        db.add(customer)
+        db.flush()
+        orders = [Order(customer_id=customer.id, order_date=now - days * DAY, is_active=True) for days in days_ago]
+        orders[-1].is_active = False
+        db.add_all(orders)
+        db.flush()
+        db.add(Order_Detail(order_id=orders[0].id, quantity=2, price=3.0, total=6.0, is_active=True))
+        db.commit()
+        return customer.id, [order.id for order in orders], now
+
+
+def _history(client, headers, user_id: int, **params) -> list[dict]:
+    response = client.get(f"/users/{user_id}/orders", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_history_is_paged_newest_first(client, headers):
+    user_id, ids, _ = _customer([1, 2, 3, 4, 5])
+    first = _history(client, headers, user_id, limit=2)
+    assert [o["id"] for o in first] == ids[:2]
+    last = first[-1]
+    rest = _history(client, headers, user_id, limit=10, before_date=last["order_date"], before_id=last["id"])
+    assert [o["id"] for o in rest] == ids[2:4]  # the inactive one is left out
+    assert [o["id"] for o in _history(client, headers, user_id, include_inactive=True)] == ids
+
+
+def test_history_is_filtered_by_date_and_carries_lines(client, headers):
+    user_id, ids, now = _customer([1, 2, 3])
+    window = _history(client, headers, user_id, since=(now - 2 * DAY).isoformat(), until=(now - DAY).isoformat())
+    assert [o["id"] for o in window] == ids[:2]
+    with_lines = _history(client, headers, user_id, include_lines=True)
+    assert [len(o["lines"]) for o in with_lines] == [1, 0]
+    assert with_lines[0]["lines"][0]["quantity"] == 2
+    assert _history(client, headers, user_id)[0]["lines"] is None
+
+
+def test_bad_requests_are_rejected(client, headers):
+    user_id, _, _ = _customer([1])
+    assert client.get(f"/users/{user_id}/orders", params={"before_id": 1}, headers=headers).status_code == 422
+    assert client.get("/users/999999/orders", headers=headers).status_code == 404
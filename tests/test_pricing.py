@@ -0,0 +1,58 @@
+import datetime
+import time
+import pytest
+from database import SessionLocal
+from model_folder.model import Product
+
+
+def _rule(client, headers, **rule) -> dict:
+    response = client.post("/pricing/rules", json={"name": "test rule", **rule}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def _quote(client, headers, lines, **extra) -> dict:
+    response = client.post("/pricing/quote", json={"lines": lines, **extra}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_the_lowest_rule_in_force_prices_each_line(client, headers, products):
+    product_id, plain = products(2, price=5.0)
+    with SessionLocal() as db:
+        cat_id = db.get(Product, product_id).cat_id
+    tomorrow = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    category_rule = _rule(client, headers, kind="percent", value=10, category_id=cat_id)
+    bulk_rule = _rule(client, headers, kind="price", value=3.0, product_id=product_id, min_quantity=10)
+    _rule(client, headers, kind="amount", value=4.0, product_id=plain, starts_at=tomorrow.isoformat())
+
+    quote = _quote(client, headers, [{"product_id": product_id, "quantity": 1}, {"product_id": product_id, "quantity": 10},
+                                     {"product_id": plain, "quantity": 2}])
+    one, ten, other = quote["lines"]
+    assert (one["unit_price"], one["rule_id"], one["discount"]) == (pytest.approx(4.5), category_rule["id"], pytest.approx(10))
+    assert (ten["unit_price"], ten["rule_id"], ten["line_total"]) == (pytest.approx(3.0), bulk_rule["id"], pytest.approx(30))
+    assert other["line_total"] == pytest.approx(9.0)  # the category rule; tomorrow's one is not in force yet
+    assert quote["total"] == pytest.approx(4.5 + 30 + 9.0)
+    later = _quote(client, headers, [{"product_id": plain, "quantity": 1}], at=(tomorrow + datetime.timedelta(hours=1)).isoformat())
+    assert later["lines"][0]["unit_price"] == pytest.approx(1.0)
+
+
+def test_rule_edits_reprice_the_catalogue(client, headers, products):
+    product_id = products(1, price=8.0)[0]
+    rule = _rule(client, headers, kind="amount", value=2.0, product_id=product_id)
+    deadline = time.monotonic() + 5
+    while True:
+        response = client.get(f"/pricing/products/{product_id}", headers=headers)
+        if response.status_code == 200 and response.json()["rule_id"] == rule["id"] or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert response.json()["unit_price"] == pytest.approx(6.0)
+
+
+def test_bad_rules_and_unknown_products_are_rejected(client, headers):
+    assert client.post("/pricing/rules", json={"name": "too much", "kind": "percent", "value": 150}, headers=headers).status_code == 422
+    unknown_scope = {"name": "nowhere", "kind": "percent", "value": 5, "category_id": 999999}
+    assert client.post("/pricing/rules", json=unknown_scope, headers=headers).status_code == 404
+    response = client.post("/pricing/quote", json={"lines": [{"product_id": 999999}]}, headers=headers)
+    assert response.status_code == 404 and "999999" in response.json()["detail"]
+    assert client.patch("/pricing/rules/999999/deactivate", headers=headers).status_code == 404
@@ -0,0 +1,39 @@
+import uuid
+from database import SessionLocal
+from model_folder.model import Product
+
+
+def _body(product_id: int, **changes) -> dict:
+    with SessionLocal() as db:
+        product = db.get(Product, product_id)
+        body = {"name": "widget", "desc": "a test widget", "unit": 5, "price": 2.0,
+                "cat_id": product.cat_id, "supplier_id": product.supplier_id}
+    return {**body, **changes}
+
+
+def test_an_unknown_category_or_supplier_is_not_written(client, headers, products):
+    body = _body(products(1)[0])
+    with SessionLocal() as db:
+        before = db.query(Product).count()
+    assert client.post("/products/", json={**body, "cat_id": 999999}, headers=headers).status_code == 404
+    assert client.post("/products/", json={**body, "supplier_id": 999999}, headers=headers).status_code == 404
+    with SessionLocal() as db:
+        assert db.query(Product).count() == before
+    assert client.get("/products/", headers=headers).status_code == 200
+
+
+def test_an_unknown_category_is_not_set_on_update(client, headers, products):
+    product_id = products(1)[0]
+    response = client.patch(f"/products/{product_id}", json={"cat_id": 999999}, headers=headers)
+    assert response.status_code == 404
+    assert client.get(f"/products/{product_id}", headers=headers).status_code == 200
+
+
+def test_product_codes_are_unique_and_looked_up(client, headers, products):
+    code = uuid.uuid4().hex
+    body = _body(products(1)[0], code=code)
+    created = client.post("/products/", json=body, headers=headers)
+    assert created.status_code == 201 and created.json()["unit"] == 5
+    assert client.post("/products/", json=body, headers=headers).status_code == 409
+    found = client.get(f"/products/by-code/{code}", headers=headers)
+    assert found.status_code == 200 and found.json()["id"] == created.json()["id"]
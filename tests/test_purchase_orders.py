@@ -0,0 +1,54 @@
+import uuid
+from database import SessionLocal
+from model_folder.model import LocationStock, Product
+
+
+def _order(client, headers, product_ids: list[int], **extra) -> dict:
+    with SessionLocal() as db:
+        supplier_id = db.get(Product, product_ids[0]).supplier_id
+    lines = [{"product_id": pid, "quantity": 4 * (i + 1), "unit_cost": 2.5} for i, pid in enumerate(product_ids)]
+    response = client.post("/purchase-orders/", json={"supplier_id": supplier_id, "lines": lines, **extra}, headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+def _units(product_ids: list[int]) -> list[int]:
+    with SessionLocal() as db:
+        return [db.get(Product, pid).unit for pid in product_ids]
+
+
+def test_receiving_adds_every_line_to_stock_once(client, headers, products):
+    ids = products(2, unit=1)
+    location = client.post("/locations/", json={"name": f"dock-{uuid.uuid4().hex[:8]}"}, headers=headers).json()["id"]
+    po = _order(client, headers, ids, location_id=location)
+    assert (po["status"], po["line_count"], po["total_quantity"], po["total_cost"]) == ("open", 2, 12, 30.0)
+
+    received = client.post(f"/purchase-orders/{po['id']}/receive", headers=headers)
+    assert received.status_code == 200 and received.json()["status"] == "received"
+    assert _units(ids) == [5, 9]
+    with SessionLocal() as db:
+        assert [db.get(LocationStock, (location, pid)).quantity for pid in ids] == [4, 8]
+    detail = client.get(f"/purchase-orders/{po['id']}", headers=headers).json()
+    assert [line["received_quantity"] for line in detail["lines"]] == [4, 8]
+
+    assert client.post(f"/purchase-orders/{po['id']}/receive", headers=headers).status_code == 409
+    assert client.post(f"/purchase-orders/{po['id']}/cancel", headers=headers).status_code == 409
+    assert _units(ids) == [5, 9]
+
+
+def test_a_cancelled_order_cannot_be_received(client, headers, products):
+    ids = products(1, unit=1)
+    po = _order(client, headers, ids)
+    assert client.post(f"/purchase-orders/{po['id']}/cancel", headers=headers).json()["status"] == "cancelled"
+    assert client.post(f"/purchase-orders/{po['id']}/receive", headers=headers).status_code == 409
+    assert _units(ids) == [1]
+    assert client.post("/purchase-orders/999999/receive", headers=headers).status_code == 404
+
+
+def test_unknown_products_are_rejected(client, headers, products):
+    ids = products(1)
+    with SessionLocal() as db:
+        supplier_id = db.get(Product, ids[0]).supplier_id
+    body = {"supplier_id": supplier_id, "lines": [{"product_id": 999999, "quantity": 1}]}
+    response = client.post("/purchase-orders/", json=body, headers=headers)
+    assert response.status_code == 404 and "999999" in response.json()["detail"]
@@ -0,0 +1,57 @@
+import asyncio
+import util.ratelimit
+from conftest import auth_headers, make_staff
+from util.ratelimit import MemoryBackend, RateLimitMiddleware
+
+
+async def _ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _call(middleware, path: str = "/orders/active", headers: dict | None = None, method: str = "GET") -> tuple[int, dict]:
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": b"", "client": ("10.0.0.1", 1234),
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()],
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"], {k.decode(): v.decode() for k, v in sent[0].get("headers", [])}
+
+
+def test_the_memory_backend_refills_and_forgets_the_oldest_keys():
+    backend = MemoryBackend(max_keys=2)
+
+    async def takes():
+        return [await backend.take("a", 1, 2), await backend.take("a", 1, 2), await backend.take("a", 1, 2, cost=1.5)]
+    first, second, third = asyncio.run(takes())
+    assert first == second == 0 and 1.4 < third <= 1.5
+    for key in ("b", "c"):
+        asyncio.run(backend.take(key, 1, 2))
+    assert "a" not in backend._buckets and len(backend._buckets) == 2
+
+
+def test_each_staff_member_has_their_own_bucket(monkeypatch):
+    monkeypatch.setattr(util.ratelimit, "RATE_LIMIT_PER_SECOND", 0.1)
+    monkeypatch.setattr(util.ratelimit, "RATE_LIMIT_BURST", 2)
+    middleware = RateLimitMiddleware(_ok, MemoryBackend())
+    busy, other = auth_headers(make_staff()), auth_headers(make_staff())
+    assert [_call(middleware, headers=busy)[0] for _ in range(2)] == [200, 200]
+    status, headers = _call(middleware, headers=busy)
+    assert status == 429 and int(headers["retry-after"]) >= 1
+    assert _call(middleware, headers=other)[0] == 200
+    # A full listing costs more than the burst allows.
+    assert _call(middleware, "/products/", headers=auth_headers(make_staff()))[0] == 429
+
+
+def test_logins_are_limited_per_client_ip(monkeypatch):
+    monkeypatch.setattr(util.ratelimit, "RATE_LIMIT_LOGIN_BURST", 1)
+    middleware = RateLimitMiddleware(_ok, MemoryBackend())
+    assert _call(middleware, "/auth/login", method="POST")[0] == 200
+    assert _call(middleware, "/auth/login", method="POST")[0] == 429
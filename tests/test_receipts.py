@@ -0,0 +1,39 @@
+import pytest
+from database import SessionLocal
+from model_folder.model import Order, Order_Detail, Payment, Product
+
+
+def test_a_receipt_totals_the_active_lines(client, headers, products):
+    first, second = products(2)
+    with SessionLocal() as db:
+        payment = Payment(payment_type="Card", is_active=True)
+        order = Order(detail="receipt test", is_active=True)
+        db.add_all([payment, order])
+        db.flush()
+        db.add_all([
+            Order_Detail(order_id=order.id, product_id=first, price=10.0, quantity=3, discount=10, is_active=True,
+                         bill_number=payment.bill_number),
+            Order_Detail(order_id=order.id, product_id=second, price=4.0, quantity=None, is_active=True),
+            Order_Detail(order_id=order.id, product_id=second, price=100.0, quantity=1, is_active=False),
+        ])
+        db.commit()
+        order_id, name = order.id, db.get(Product, first).name
+
+    response = client.get(f"/orders/{order_id}/receipt", headers=headers)
+    assert response.status_code == 200
+    receipt = response.json()
+    assert [line["line_total"] for line in receipt["lines"]] == [pytest.approx(27.0), pytest.approx(4.0)]
+    assert (receipt["lines"][0]["product_name"], receipt["lines"][0]["payment_type"]) == (name, "Card")
+    assert receipt["lines"][1]["quantity"] == 1
+    assert (receipt["subtotal"], receipt["discount_total"], receipt["total"]) == pytest.approx((34.0, 3.0, 31.0))
+    assert client.get("/orders/999999/receipt", headers=headers).status_code == 404
+
+
+def test_an_order_line_is_returned_by_id(client, headers, products):
+    with SessionLocal() as db:
+        line = Order_Detail(product_id=products(1)[0], price=2.0, quantity=1, is_active=True)
+        db.add(line)
+        db.commit()
+        line_id = line.id
+    response = client.get(f"/orderdetails/{line_id}", headers=headers)
+    assert response.status_code == 200 and response.json()["id"] == line_id
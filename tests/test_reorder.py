@@ -0,0 +1,37 @@
+import datetime
+from database import SessionLocal
+from model_folder.model import Order_Detail, Product, ReorderPoint
+from util.reorder import REORDER_LEAD_DAYS, REORDER_SAFETY_DAYS, REORDER_WINDOW_DAYS, evaluate
+
+
+def _sell(product_id: int, quantity: int, days_ago: float = 1) -> None:
+    with SessionLocal() as db:
+        date = datetime.datetime.utcnow() - datetime.timedelta(days=days_ago)
+        db.add(Order_Detail(product_id=product_id, quantity=quantity, price=1.0, total=quantity, date=date, is_active=True))
+        db.commit()
+
+
+def test_new_sales_raise_the_reorder_point_and_show_in_the_report(client, headers, products):
+    low, plenty, quiet = products(3, unit=5)
+    with SessionLocal() as db:
+        db.get(Product, plenty).unit = 1000
+        supplier_id = db.get(Product, low).supplier_id
+        db.commit()
+    for product_id in (low, plenty):
+        _sell(product_id, REORDER_WINDOW_DAYS)  # one a day
+    _sell(quiet, 100, days_ago=REORDER_WINDOW_DAYS + 1)  # outside the window
+
+    with SessionLocal() as db:
+        evaluate(db)
+        assert evaluate(db)["evaluated"] == 0  # nothing new since
+        point = db.get(ReorderPoint, low)
+        assert point.daily_velocity == 1.0
+        assert point.reorder_point == REORDER_LEAD_DAYS + REORDER_SAFETY_DAYS
+        assert db.get(ReorderPoint, quiet).reorder_point == 0
+
+    response = client.get("/reorder/low-stock", params={"supplier_id": supplier_id}, headers=headers)
+    assert response.status_code == 200
+    [group] = response.json()
+    assert group["supplier_id"] == supplier_id
+    assert [p["id"] for p in group["products"]] == [low]
+    assert client.get(f"/reorder/{low}", headers=headers).json()["reorder_point"] == point.reorder_point
@@ -0,0 +1,70 @@
+import time
+import uuid
+import pytest
+from sqlalchemy import select
+import database
+from database import (
+    STICKY_COOKIE, STICKY_HEADER, RoutingSession, primary_until, read_only_request, sticky_to_primary, sticky_token,
+    sticky_until,
+)
+from model_folder.model import Supplier
+
+
+@pytest.fixture
+def replica(monkeypatch, tmp_path):
+    """A replica engine configured for the test; it only has to be told apart from the primary."""
+    bind = database.make_engine(f"sqlite:///{tmp_path}/replica.db")
+    monkeypatch.setattr(database, "replica_engines", [bind])
+    monkeypatch.setattr(database, "_replica_cycle", iter(lambda: bind, None))
+    yield bind
+    bind.dispose()
+
+
+@pytest.fixture
+def read_only():
+    token = read_only_request.set(True)
+    yield
+    read_only_request.reset(token)
+
+
+def test_sticky_tokens_round_trip_and_reject_forgeries(replica):
+    until = time.time() + 30
+    token = sticky_token(until)
+    assert sticky_until({STICKY_HEADER: token}) == pytest.approx(until, abs=0.001)
+    assert sticky_until({"cookie": f"theme=dark; {STICKY_COOKIE}={token}"}) == pytest.approx(until, abs=0.001)
+    assert sticky_to_primary({STICKY_HEADER: token})
+    forged = f"{until + 3600:.3f}.{token.rpartition('.')[2]}"
+    assert sticky_until({STICKY_HEADER: forged}) == 0.0
+    assert sticky_until({"cookie": "not a cookie;;="}) == 0.0
+    assert not sticky_to_primary({STICKY_HEADER: sticky_token(time.time() - 1)})
+
+
+def test_read_only_selects_go_to_a_replica(replica, read_only):
+    with RoutingSession(bind=database.engine) as db:
+        assert db.get_bind(clause=select(Supplier)) is replica
+        assert db.get_bind(clause=select(Supplier).with_for_update()) is database.engine
+        db.info["wrote"] = True
+        assert db.get_bind(clause=select(Supplier)) is database.engine
+
+
+def test_a_client_that_just_wrote_reads_from_the_primary(replica, read_only):
+    token = primary_until.set(time.time() + 30)
+    try:
+        with RoutingSession(bind=database.engine) as db:
+            assert db.get_bind(clause=select(Supplier)) is database.engine
+    finally:
+        primary_until.reset(token)
+
+
+def test_writes_are_always_sent_to_the_primary(replica):
+    with RoutingSession(bind=database.engine) as db:
+        assert db.get_bind(clause=select(Supplier)) is database.engine
+
+
+def test_a_response_to_a_write_carries_the_sticky_deadline(client, headers, replica):
+    response = client.post("/suppliers/", json={"name": f"sup-{uuid.uuid4().hex[:8]}"}, headers=headers)
+    assert response.status_code == 201
+    token = response.headers[STICKY_HEADER]
+    assert sticky_until({STICKY_HEADER: token}) > time.time()
+    assert STICKY_COOKIE in response.headers["set-cookie"]
+    client.cookies.clear()
@@ -0,0 +1,159 @@
+import pytest
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import Session
+from model_folder.model import SCHEMA_VERSION, Base, Order_Detail, Product, SchemaVersion
+from util.schema import bootstrap_schema, verify_schema
+
+# The tables as the original create_all at import time left them, before schema versioning.
+BASELINE = [
+    """CREATE TABLE categories (
+        id INTEGER NOT NULL, is_active BOOLEAN, name VARCHAR, description VARCHAR,
+        PRIMARY KEY (id), UNIQUE (name), UNIQUE (description))""",
+    "CREATE INDEX ix_categories_id ON categories (id)",
+    """CREATE TABLE roles (
+        id INTEGER NOT NULL, name VARCHAR, is_active BOOLEAN, description VARCHAR,
+        PRIMARY KEY (id), UNIQUE (name))""",
+    "CREATE INDEX ix_roles_id ON roles (id)",
+    """CREATE TABLE payments (
+        bill_number INTEGER NOT NULL, payment_type VARCHAR, is_active BOOLEAN, other_details VARCHAR,
+        PRIMARY KEY (bill_number))""",
+    "CREATE INDEX ix_payments_bill_number ON payments (bill_number)",
+    """CREATE TABLE suppliers (
+        id INTEGER NOT NULL, name VARCHAR, address VARCHAR, phone VARCHAR, is_active BOOLEAN, fax INTEGER,
+        email VARCHAR, other_details VARCHAR,
+        PRIMARY KEY (id), UNIQUE (fax), UNIQUE (email))""",
+    "CREATE INDEX ix_suppliers_id ON suppliers (id)",
+    """CREATE TABLE staffs (
+        id INTEGER NOT NULL, lastname VARCHAR, firstname VARCHAR, address VARCHAR, is_active BOOLEAN,
+        username VARCHAR, email VARCHAR, password VARCHAR, phone VARCHAR, role_id INTEGER,
+        PRIMARY KEY (id), UNIQUE (email), UNIQUE (password), FOREIGN KEY(role_id) REFERENCES roles (id))""",
+    "CREATE INDEX ix_staffs_id ON staffs (id)",
+    """CREATE TABLE products (
+        id INTEGER NOT NULL, name VARCHAR, "desc" VARCHAR, unit INTEGER, other_details VARCHAR, price FLOAT,
+        cat_id INTEGER, supplier_id INTEGER, status VARCHAR,
+        PRIMARY KEY (id), FOREIGN KEY(cat_id) REFERENCES categories (id),
+        FOREIGN KEY(supplier_id) REFERENCES suppliers (id))""",
+    "CREATE INDEX ix_products_id ON products (id)",
+    """CREATE TABLE users (
+        id INTEGER NOT NULL, lastname VARCHAR, firstname VARCHAR, is_active BOOLEAN, email VARCHAR,
+        phone VARCHAR, staff_id INTEGER,
+        PRIMARY KEY (id), UNIQUE (email), FOREIGN KEY(staff_id) REFERENCES staffs (id))""",
+    "CREATE INDEX ix_users_id ON users (id)",
+    """CREATE TABLE orders (
+        id INTEGER NOT NULL, customer_id INTEGER, detail VARCHAR, is_active BOOLEAN, order_date DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(customer_id) REFERENCES users (id))""",
+    "CREATE INDEX ix_orders_id ON orders (id)",
+    """CREATE TABLE order_details (
+        id INTEGER NOT NULL, price FLOAT, date DATETIME, is_active BOOLEAN, order_id INTEGER,
+        product_id INTEGER, bill_number INTEGER, discount FLOAT, total FLOAT,
+        PRIMARY KEY (id), FOREIGN KEY(order_id) REFERENCES orders (id),
+        FOREIGN KEY(product_id) REFERENCES products (id),
+        FOREIGN KEY(bill_number) REFERENCES payments (bill_number))""",
+    "CREATE INDEX ix_order_details_id ON order_details (id)",
+    "INSERT INTO categories (id, is_active, name) VALUES (1, 1, 'cat')",
+    "INSERT INTO suppliers (id, is_active, name) VALUES (1, 1, 'sup')",
+    "INSERT INTO products (id, name, unit, price, cat_id, supplier_id, status) VALUES (1, 'kept', 4, 2.5, 1, 1, 'Available')",
+    "INSERT INTO order_details (id, price, is_active, product_id, total) VALUES (1, 2.5, 1, 1, 2.5)",
+]
+VERSION_1 = BASELINE + [
+    "CREATE TABLE schema_version (version INTEGER NOT NULL, PRIMARY KEY (version))",
+    "INSERT INTO schema_version (version) VALUES (1)",
+]
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A scratch SQLite file, prepared with the given statements."""
+    engines = []
+
+    def make(statements):
+        engine = create_engine(f"sqlite:///{tmp_path}/upgrade{len(engines)}.db")
+        engines.append(engine)
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+def _assert_current(engine):
+    verify_schema(engine)
+    found = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {c["name"] for c in found.get_columns(table.name)} == {c.name for c in table.columns}, table.name
+    assert "ix_products_code" in {index["name"] for index in found.get_indexes("products")}
+
+
+def test_upgrades_a_database_created_before_versioning(database):
+    engine = database(BASELINE)
+    assert bootstrap_schema(engine) == SCHEMA_VERSION
+    _assert_current(engine)
+    with Session(engine) as db:
+        product = db.scalars(select(Product)).one()
+        assert (product.name, product.unit, product.code) == ("kept", 4, None)
+        detail = db.scalars(select(Order_Detail)).one()
+        assert (detail.quantity, detail.location_id) == (1, None)
+
+
+def test_upgrades_a_version_1_database(database):
+    engine = database(VERSION_1)
+    bootstrap_schema(engine)
+    _assert_current(engine)
+    with Session(engine) as db:
+        assert db.scalars(select(SchemaVersion.version)).all() == [SCHEMA_VERSION]
+        assert db.scalars(select(Product.name)).all() == ["kept"]
+
+
+def test_upgrade_skips_columns_that_are_already_there(database):
+    # Version 5 with the location columns of version 6 already in place, partly by an earlier attempt.
+    engine = database(VERSION_1 + [
+        "ALTER TABLE order_details ADD COLUMN quantity INTEGER DEFAULT 1",
+        "ALTER TABLE order_details ADD COLUMN location_id INTEGER",
+        "CREATE TABLE purchase_orders (id INTEGER NOT NULL, supplier_id INTEGER, status VARCHAR, reference VARCHAR, "
+        "location_id INTEGER, created_by INTEGER, created_at DATETIME, received_at DATETIME, PRIMARY KEY (id))",
+        "UPDATE schema_version SET version = 5",
+    ])
+    bootstrap_schema(engine)
+    _assert_current(engine)
+
+
+SNAPSHOTS = (
+    "CREATE TABLE stock_snapshots (id INTEGER NOT NULL, product_id INTEGER, unit INTEGER, {}"
+    "taken_at DATETIME, PRIMARY KEY (id))"
+)
+
+
+@pytest.mark.parametrize("last_movement_id", [True, False])
+def test_upgrade_drops_snapshot_movement_ids_only_where_present(database, last_movement_id):
+    # A version-14 database; without the column, stock_snapshots was created by a later create_all.
+    engine = database(VERSION_1 + [
+        "ALTER TABLE order_details ADD COLUMN quantity INTEGER DEFAULT 1",
+        "ALTER TABLE order_details ADD COLUMN location_id INTEGER",
+        "ALTER TABLE products ADD COLUMN code VARCHAR",
+        "CREATE UNIQUE INDEX ix_products_code ON products (code)",
+        SNAPSHOTS.format("last_movement_id INTEGER, " if last_movement_id else ""),
+        "INSERT INTO stock_snapshots (id, product_id, unit, taken_at) VALUES (1, 1, 4, '2026-01-01 00:00:00')",
+        "UPDATE schema_version SET version = 14",
+    ])
+    bootstrap_schema(engine)
+    _assert_current(engine)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT product_id, unit FROM stock_snapshots").all() == [(1, 4)]
+
+
+def test_creates_an_empty_database_and_is_repeatable(database):
+    engine = database([])
+    with pytest.raises(RuntimeError):
+        verify_schema(engine)
+    bootstrap_schema(engine)
+    bootstrap_schema(engine)
+    _assert_current(engine)
+
+
+def test_refuses_a_database_newer_than_the_code(database):
+    engine = database(VERSION_1 + [f"UPDATE schema_version SET version = {SCHEMA_VERSION + 1}"])
+    with pytest.raises(RuntimeError):
+        bootstrap_schema(engine)
@@ -0,0 +1,21 @@
+import pytest
+from sqlalchemy import create_engine
+from database import check_worker_safety, enable_wal
+
+
+def test_one_worker_needs_no_checks():
+    check_worker_safety(1, create_engine("sqlite://"))
+
+
+def test_an_in_memory_database_cannot_be_shared_by_workers():
+    with pytest.raises(RuntimeError, match="in-memory"):
+        check_worker_safety(4, create_engine("sqlite://"))
+
+
+def test_workers_need_a_sqlite_file_in_wal_mode(tmp_path):
+    bind = create_engine(f"sqlite:///{tmp_path}/serve.db")
+    with pytest.raises(RuntimeError, match="createtables"):
+        check_worker_safety(4, bind)
+    assert enable_wal(bind) == "wal"
+    check_worker_safety(4, bind)
+    bind.dispose()
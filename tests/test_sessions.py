@@ -0,0 +1,33 @@
+import uuid
+from sqlalchemy import event
+from database import RoutingSession
+
+
+def _request_sessions(request) -> tuple[int, object]:
+    """How many request-scoped sessions (see database.get_db) began a transaction during `request`."""
+    sessions = set()
+
+    def begun(session, transaction, connection):
+        if "statement_timeout_ms" in session.info:  # set by get_db only; not the background workers' sessions
+            sessions.add(id(session))
+    event.listen(RoutingSession, "after_begin", begun)
+    try:
+        response = request()
+    finally:
+        event.remove(RoutingSession, "after_begin", begun)
+    return len(sessions), response
+
+
+def test_auth_and_handler_share_one_session(client, headers, products):
+    products(1)
+    sessions, response = _request_sessions(lambda: client.get("/suppliers/", headers=headers))
+    assert response.status_code == 200 and response.json()
+    assert sessions == 1
+
+
+def test_a_write_is_committed_by_the_request(client, headers):
+    name = f"sup-{uuid.uuid4().hex[:8]}"
+    sessions, created = _request_sessions(lambda: client.post("/suppliers/", json={"name": name}, headers=headers))
+    assert created.status_code == 201 and sessions == 1
+    found = client.get(f"/suppliers/{created.json()['id']}", headers=headers)
+    assert found.status_code == 200 and found.json()["name"] == name
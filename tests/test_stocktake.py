@@ -0,0 +1,58 @@
+import pytest
+from database import SessionLocal
+from model_folder.model import Product, StockMovement
+from util.stocktake import CountParser
+
+
+def test_count_files_parse_across_arbitrary_chunks():
+    data = "\ufeffCode,Counted\nA-1,3\n\n\"B,2\",4\nC-3".encode() + b",5"
+    parser = CountParser()
+    rows = []
+    for i in range(0, len(data), 3):
+        rows += parser.feed(data[i:i + 3])
+    rows += parser.feed(b"", final=True)
+    assert parser.by_code
+    assert rows == [(2, "A-1", "3"), (4, "B,2", "4"), (5, "C-3", "5")]
+    with pytest.raises(ValueError):
+        CountParser().feed(b"sku,qty\n1,2\n", final=True)
+
+
+def _upload(client, headers, take_id: int, body: str, **params):
+    return client.post(f"/stocktakes/{take_id}/counts", content=body.encode(), params=params,
+                       headers={**headers, "Content-Type": "text/csv"})
+
+
+def test_counts_are_staged_compared_and_applied(client, headers, products):
+    short, over, untouched = products(3, unit=10, price=2.0)
+    take = client.post("/stocktakes/", json={"reference": "test count"}, headers=headers).json()
+    assert take["status"] == "open"
+
+    body = f"product_id,counted\n{short},8\n{over},6\n{over},6\n{untouched},x\n999999,1\n"
+    upload = _upload(client, headers, take["id"], body).json()
+    assert (upload["received"], upload["staged"], upload["rejected_count"], upload["line_count"]) == (5, 3, 2, 2)
+    assert [r["line"] for r in upload["rejected"]] == [5, 6]
+
+    report = client.get(f"/stocktakes/{take['id']}/variance", headers=headers).json()
+    assert [(line["product_id"], line["variance"], line["value"]) for line in report["lines"]] == [(short, -2, -4.0), (over, 2, 4.0)]
+    assert (report["summary"]["units_over"], report["summary"]["units_short"]) == (2, 2)
+
+    applied = client.post(f"/stocktakes/{take['id']}/apply", headers=headers)
+    assert applied.status_code == 200 and applied.json()["stock_take"]["status"] == "applied"
+    with SessionLocal() as db:
+        assert [db.get(Product, pid).unit for pid in (short, over, untouched)] == [8, 12, 10]
+        assert db.query(StockMovement).filter(StockMovement.batch_id == applied.json()["batch_id"]).count() == 2
+    # The report now compares with the stock on record when it was applied.
+    assert client.get(f"/stocktakes/{take['id']}/variance", headers=headers).json()["summary"]["lines_with_variance"] == 2
+    assert client.post(f"/stocktakes/{take['id']}/apply", headers=headers).status_code == 409
+    assert _upload(client, headers, take["id"], body).status_code == 409
+
+
+def test_replace_discards_earlier_uploads_and_a_bad_header_is_rejected(client, headers, products):
+    product_id = products(1)[0]
+    take_id = client.post("/stocktakes/", json={}, headers=headers).json()["id"]
+    _upload(client, headers, take_id, f"product_id,counted\n{product_id},4\n")
+    _upload(client, headers, take_id, f"product_id,counted\n{product_id},1\n", replace=True)
+    report = client.get(f"/stocktakes/{take_id}/variance", params={"include_matching": True}, headers=headers).json()
+    assert [line["counted"] for line in report["lines"]] == [1]
+    assert _upload(client, headers, take_id, "sku,qty\n1,2\n").status_code == 422
+    assert client.post(f"/stocktakes/{take_id}/cancel", headers=headers).json()["status"] == "cancelled"
@@ -0,0 +1,63 @@
+import asyncio
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from database import DATABASE_URL, engine
+from model_folder.model import AuditEvent, Category, Product, StockMovement, Supplier
+from util.changes import ChangeFollower, IdFollower
+from util.stream import BroadcastHub, ProductFeed
+
+with Session(engine) as db:
+    db.add_all([Category(id=1, name="cat"), Supplier(id=1, name="sup")])
+    db.add_all([Product(id=i, name=f"p{i}", desc="stream product", unit=10, price=5.0, cat_id=1, supplier_id=1, status="Available") for i in (1, 2)])
+    db.commit()
+
+
+async def _next_event(subscriber) -> dict:
+    return await asyncio.wait_for(subscriber.queue.get(), 5)
+
+
+def test_feed_receives_changes_committed_by_another_process():
+    async def scenario():
+        source = ChangeFollower(poll_seconds=0.05)
+        feed = ProductFeed(BroadcastHub(), source)
+        source.start()
+        feed.start()
+        subscriber = feed.hub.subscribe()
+        # A separate engine and a plain Session: nothing in this process hears about the commit.
+        other_worker = create_engine(DATABASE_URL)
+        try:
+            with Session(other_worker) as db:
+                db.query(Product).filter(Product.id == 1).update({Product.unit: 15})
+                db.execute(insert(StockMovement).values(product_id=1, quantity=5, kind="receipt"))
+                db.commit()
+            event = await _next_event(subscriber)
+            assert event == {"type": "product", "id": 1, "price": 5.0, "unit": 15, "status": "Available"}
+
+            with Session(other_worker) as db:
+                db.query(Product).filter(Product.id == 2).update({Product.price: 4.5})
+                db.execute(insert(AuditEvent).values(entity="products", entity_id="2", action="update", changes="{}"))
+                db.commit()
+            event = await _next_event(subscriber)
+            assert event["id"] == 2 and event["price"] == 4.5
+        finally:
+            await feed.stop()
+            source.stop()
+            other_worker.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_follower_reads_ids_that_commit_out_of_order():
+    follower = IdFollower(StockMovement.id, StockMovement.product_id)
+    with engine.begin() as conn:
+        follower.poll(conn)
+        start = follower.high
+        conn.execute(insert(StockMovement).values(id=start + 3, product_id=1, quantity=1, kind="receipt"))
+    with engine.begin() as conn:
+        assert [row[0] for row in follower.poll(conn)] == [start + 3]
+        assert set(follower.gaps) == {start + 1, start + 2}
+        # The lower id commits after the higher one was read.
+        conn.execute(insert(StockMovement).values(id=start + 1, product_id=2, quantity=1, kind="receipt"))
+    with engine.begin() as conn:
+        assert follower.poll(conn) == [(start + 1, 2)]
+        assert set(follower.gaps) == {start + 2}
@@ -0,0 +1,39 @@
+import uuid
+from database import SessionLocal
+from model_folder.model import Category, Product
+from util.writes import update_returning
+
+
+def test_update_returning_refreshes_the_held_object(products):
+    product_id = products(1)[0]
+    with SessionLocal() as db:
+        held = db.get(Product, product_id)
+        updated = update_returning(db, Product, {"unit": Product.unit + 5}, Product.id == product_id)
+        assert updated is held and held.unit == 15
+        assert update_returning(db, Product, {"unit": 0}, Product.id == product_id, Product.status == "Gone") is None
+        db.commit()
+        assert held.unit == 15
+
+
+def test_deactivate_and_reactivate_return_the_new_state(client, headers, products):
+    product_id = products(2)[0]
+    with SessionLocal() as db:
+        cat_id = db.get(Product, product_id).cat_id
+    off = client.patch(f"/categories/{cat_id}/deactivate", headers=headers).json()
+    assert (off["is_active"], off["product_count"]) == (False, 2)
+    assert client.patch(f"/categories/{cat_id}/reactivate", headers=headers).json()["is_active"] is True
+    assert client.patch(f"/products/{product_id}/deactivate", headers=headers).json()["status"] == "Unavailable"
+    assert client.patch(f"/products/{product_id}/deactivate", headers=headers).status_code == 404
+
+
+def test_a_patch_returns_what_was_written(client, headers, products):
+    product_id = products(1)[0]
+    with SessionLocal() as db:
+        other = Category(name=f"moved-{uuid.uuid4().hex[:8]}", is_active=True)
+        db.add(other)
+        db.commit()
+        other_id, other_name = other.id, other.name
+    response = client.patch(f"/products/{product_id}", json={"cat_id": other_id, "unit": 7, "price": 9.5}, headers=headers)
+    body = response.json()
+    assert response.status_code == 200
+    assert (body["category_name"], body["unit"], body["price"]) == (other_name, 7, 9.5)
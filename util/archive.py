@@ -0,0 +1,95 @@
+import datetime
+import os
+from typing import Optional
+from sqlalchemy import exists, func, insert, literal, select
+from sqlalchemy.orm import Session
+from model_folder.model import ArchivedOrder, ArchivedOrderDetail, Order, Order_Detail
+from util.jobs import JobContext, job_handler, schedule
+
+# Orders older than this move to the archive tables, with all their lines.
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "365"))
+# Deactivated (closed) orders move sooner.
+ORDER_ARCHIVE_INACTIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_INACTIVE_AFTER_DAYS", "30"))
+ORDER_ARCHIVE_EVERY_SECONDS = float(os.getenv("ORDER_ARCHIVE_EVERY_SECONDS", "3600"))
+# Orders moved per transaction; each batch commits on its own so locks stay short.
+ORDER_ARCHIVE_BATCH = int(os.getenv("ORDER_ARCHIVE_BATCH", "500"))
+
+ORDER_COLUMNS = [c.name for c in Order.__table__.columns]
+DETAIL_COLUMNS = [c.name for c in Order_Detail.__table__.columns]
+
+
+def _copy(db: Session, source, target, columns: list[str], *criteria, **values) -> None:
+    """INSERT ... SELECT the matching rows of `source` into `target`, with `values` as extra constant columns."""
+    rows = select(*[source.__table__.c[name] for name in columns], *[literal(v) for v in values.values()]).where(*criteria)
+    db.execute(insert(target).from_select(columns + list(values), rows))
+
+
+def _delete(db: Session, model, *criteria) -> int:
+    return db.query(model).filter(*criteria).delete(synchronize_session=False)
+
+
+def archivable_orders(db: Session, now: datetime.datetime, limit: int) -> list[int]:
+    """Ids of orders due for archiving: old, or deactivated a while ago, with no recent lines."""
+    old = now - datetime.timedelta(days=ORDER_ARCHIVE_AFTER_DAYS)
+    closed = now - datetime.timedelta(days=ORDER_ARCHIVE_INACTIVE_AFTER_DAYS)
+    quiet_since = max(old, closed)  # an order with a line newer than this is still being worked on
+    # SQLite reuses the highest rowid once it is deleted; keep the newest row live so archived ids are never handed out again.
+    newest_order = db.query(func.max(Order.id)).scalar()
+    newest_detail = db.query(func.max(Order_Detail.id)).scalar()
+    recent_line = exists().where(Order_Detail.order_id == Order.id, (Order_Detail.date >= quiet_since) | (Order_Detail.id == newest_detail))
+    return [
+        order_id for (order_id,) in db.query(Order.id)
+        .filter(
+            (Order.order_date < old) | ((Order.is_active == False) & (Order.order_date < closed)),
+            Order.id != newest_order,
+            ~recent_line,
+        )
+        .order_by(Order.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)  # on PostgreSQL new lines for these orders wait, then fail their foreign key
+    ]
+
+
+def archive_orders(db: Session, order_ids: list[int]) -> dict:
+    """Move these orders and their lines to the archive tables in one set-based pass; the caller commits."""
+    now = datetime.datetime.utcnow()
+    # Parents are copied before and deleted after their lines so foreign keys hold throughout.
+    _copy(db, Order, ArchivedOrder, ORDER_COLUMNS, Order.id.in_(order_ids), archived_at=now)
+    _copy(db, Order_Detail, ArchivedOrderDetail, DETAIL_COLUMNS, Order_Detail.order_id.in_(order_ids), archived_at=now)
+    details = _delete(db, Order_Detail, Order_Detail.order_id.in_(order_ids))
+    orders = _delete(db, Order, Order.id.in_(order_ids))
+    return {"orders": orders, "order_details": details}
+
+
+def restore_order(db: Session, order_id: int) -> Optional[Order]:
+    """Move an archived order and its lines back to the live tables; None if it is not archived. The caller commits."""
+    if not db.query(ArchivedOrder.id).filter(ArchivedOrder.id == order_id).first():
+        return None
+    _copy(db, ArchivedOrder, Order, ORDER_COLUMNS, ArchivedOrder.id == order_id)
+    _copy(db, ArchivedOrderDetail, Order_Detail, DETAIL_COLUMNS, ArchivedOrderDetail.order_id == order_id)
+    _delete(db, ArchivedOrderDetail, ArchivedOrderDetail.order_id == order_id)
+    _delete(db, ArchivedOrder, ArchivedOrder.id == order_id)
+    return db.get(Order, order_id)
+
+
+def run_archival(db: Session, now: Optional[datetime.datetime] = None, ctx: Optional[JobContext] = None) -> dict:
+    now = now or datetime.datetime.utcnow()
+    totals = {"orders": 0, "order_details": 0}
+    while True:
+        order_ids = archivable_orders(db, now, ORDER_ARCHIVE_BATCH)
+        if not order_ids:
+            return totals
+        moved = archive_orders(db, order_ids)
+        db.commit()
+        for key, count in moved.items():
+            totals[key] += count
+        if ctx is not None:
+            ctx.check_cancelled()
+
+
+@job_handler("orders.archive")
+def archive_job(db: Session, ctx: JobContext):
+    return run_archival(db, ctx=ctx)
+
+
+schedule("orders.archive", ORDER_ARCHIVE_EVERY_SECONDS)
@@ -0,0 +1,229 @@
+import datetime
+import json
+import logging
+import os
+import threading
+from collections import deque
+from sqlalchemy import event, insert, inspect, select, tuple_
+from database import RoutingSession, current_staff_id, engine
+from model_folder.model import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+# Events waiting to be written; beyond this, new events are dropped (and counted) rather than slowing requests.
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "50000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "1"))
+
+# Bookkeeping tables, and stock_movements, which is already an attributed append-only record.
+NOT_AUDITED = {
+    "audit_log", "schema_version", "jobs", "idempotency_keys", "watermarks",
+    "reorder_points", "stock_snapshots", "stock_movements", "product_prices",
+    "demand_forecasts", "stock_take_lines",
+}
+REDACTED = {"password"}
+# Rows re-read per query when recording a set-based UPDATE.
+BATCH = 1000
+
+
+def _value(key: str, value):
+    return "***" if key in REDACTED and value is not None else value
+
+
+def _key_text(values) -> str:
+    return ",".join(str(v) for v in values)
+
+
+def _entity_id(state) -> str:
+    return _key_text(state.mapper.primary_key_from_instance(state.obj()))
+
+
+def _row_event(state, action: str) -> tuple | None:
+    before, after = {}, {}
+    columns = state.mapper.column_attrs
+    if action == "update":
+        # Only attributes set since the row was loaded can have changed.
+        for key in state.committed_state:
+            if key not in columns:
+                continue
+            history = state.attrs[key].history
+            if history.added:
+                before[key] = _value(key, history.deleted[0] if history.deleted else None)
+                after[key] = _value(key, history.added[0])
+        if not after:
+            return None
+    else:
+        values = after if action == "insert" else before
+        for attr in columns:
+            value = state.dict.get(attr.key)
+            if value is not None:
+                values[attr.key] = _value(attr.key, value)
+    return (datetime.datetime.utcnow(), current_staff_id.get(), state.mapper.local_table.name, _entity_id(state), action, {"before": before, "after": after})
+
+
+def _pending(session) -> list:
+    return session.info.setdefault("audit_events", [])
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _collect(session, flush_context):
+    events = []
+    for objects, action in ((session.new, "insert"), (session.dirty, "update"), (session.deleted, "delete")):
+        for obj in objects:
+            state = inspect(obj)
+            if state.mapper.local_table.name in NOT_AUDITED:
+                continue
+            row = _row_event(state, action)
+            if row is not None:
+                events.append(row)
+    if events:
+        _pending(session).extend(events)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _collect_statement(orm_execute_state):
+    # Set-based UPDATE/DELETE never reach the flush: find the rows first, run the
+    # statement, then record one event per row with the values it now holds (the
+    # whole row, as which columns an UPDATE sets is not public statement API).
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete) or orm_execute_state.execution_options.get("audited"):
+        return None
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.local_table.name in NOT_AUDITED:
+        return None
+    statement = orm_execute_state.statement
+    table = mapper.local_table
+    key = list(table.primary_key.columns)
+    session = orm_execute_state.session
+    affected = select(*key)
+    if statement.whereclause is not None:
+        affected = affected.where(statement.whereclause)
+    # Locked, so the rows found are the rows the statement then changes.
+    ids = [tuple(row) for row in session.execute(affected.with_for_update())]
+    result = orm_execute_state.invoke_statement()
+    if not ids:
+        return result
+    now, staff_id = datetime.datetime.utcnow(), current_staff_id.get()
+    if orm_execute_state.is_delete:
+        _pending(session).extend(
+            (now, staff_id, table.name, _key_text(id_), "bulk_delete", {"before": {}, "after": {}}) for id_ in ids
+        )
+        return result
+    columns = [column for column in table.columns if not column.primary_key]
+    events = []
+    for start in range(0, len(ids), BATCH):
+        chunk = ids[start:start + BATCH]
+        match = key[0].in_([id_[0] for id_ in chunk]) if len(key) == 1 else tuple_(*key).in_(chunk)
+        for row in session.execute(select(*key, *columns).where(match)):
+            after = {column.key: _value(column.key, value) for column, value in zip(columns, row[len(key):])}
+            events.append((now, staff_id, table.name, _key_text(row[:len(key)]), "bulk_update", {"before": {}, "after": after}))
+    _pending(session).extend(events)
+    return result
+
+
+def row_updated(session, obj, values: dict) -> None:
+    """Record an UPDATE ... RETURNING of `values` into `obj`; it bypassed the flush, so only the new values are known."""
+    state = inspect(obj)
+    if state.mapper.local_table.name in NOT_AUDITED:
+        return
+    after = {key: _value(key, getattr(obj, key)) for key in values}  # as returned, in case `values` held SQL expressions
+    _pending(session).append((datetime.datetime.utcnow(), current_staff_id.get(), state.mapper.local_table.name, _entity_id(state), "update", {"before": {}, "after": after}))
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _enqueue(session):
+    events = session.info.pop("audit_events", None)
+    if events:
+        writer.add(events)
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    session.info.pop("audit_events", None)
+
+
+class AuditWriter:
+    """
+    Buffers committed audit events in memory and inserts them in batches from a background thread.
+
+    The request path only appends to a deque. The thread writes every
+    AUDIT_FLUSH_SECONDS, or sooner once AUDIT_BATCH_SIZE events are waiting;
+    `stop()` writes whatever is left, logging rather than raising if it cannot.
+    """
+
+    def __init__(self, buffer_size: int = AUDIT_BUFFER_SIZE, batch_size: int = AUDIT_BATCH_SIZE, flush_seconds: float = AUDIT_FLUSH_SECONDS):
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        self._buffer: deque = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, events: list) -> None:
+        with self._lock:
+            room = self.buffer_size - len(self._buffer)
+            if room < len(events):
+                self.dropped += len(events) - max(room, 0)
+                events = events[:max(room, 0)]
+            self._buffer.extend(events)
+            ready = len(self._buffer) >= self.batch_size
+        if ready:
+            self._wake.set()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            # Shutdown goes on; the events still buffered are lost with the process.
+            logger.exception("%d audit events not written at shutdown", len(self._buffer))
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of events written."""
+        written = 0
+        while True:
+            with self._lock:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            if not batch:
+                return written
+            rows = [
+                {"created_at": created_at, "staff_id": staff_id, "entity": entity, "entity_id": entity_id,
+                 "action": action, "changes": json.dumps(changes, default=str)}
+                for created_at, staff_id, entity, entity_id, action, changes in batch
+            ]
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(AuditEvent.__table__), rows)
+            except Exception:
+                with self._lock:
+                    self._buffer.extendleft(reversed(batch))
+                raise
+            written += len(batch)
+
+    def _loop(self) -> None:
+        reported = 0
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Writing audit events failed; retrying in %ss", self.flush_seconds)
+                self._stop.wait(self.flush_seconds)
+            if self.dropped != reported:
+                logger.warning("Audit buffer full, %d events dropped", self.dropped - reported)
+                reported = self.dropped
+
+
+writer = AuditWriter()
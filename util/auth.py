@@ -1,32 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+from database import current_staff_id, dbDepend
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
-from typing import Annotated
-from passlib.context import CryptContext
-from model_folder import model
+from typing import Annotated, Optional
 from model_folder.model import Staff
+from util.security import verify_password
 
 SECRET_KEY = "956d7c6e06bb27e9268b7a1e9e42db8bccc89b04f4738b98cae66778f1a36844"#to generate secretkey, do "./openssl.exe rand -hex 32" after putting the files in your folder
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 app = APIRouter()
-model.Base.metadata.create_all(bind=engine)
-bcrypt_context = CryptContext(schemes=['bcrypt'],deprecated='auto')
 oauth_bearer = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-dbDepend = Annotated[Session, Depends(get_db)]
-
 
 # def create_access_token(data: dict, expires_delta: timedelta):
 #     if expires_delta:
@@ -66,6 +53,22 @@ def create_token(username:str, user_id:int, expires:timedelta) -> str:
     return encoded_jwt
 
 
+def staff_id_from_header(authorization: Optional[str]) -> Optional[int]:
+    """
+    Staff id from a `Bearer` Authorization header, checking only the token signature and expiry.
+
+    For middleware that needs a cheap per-staff key; it does not replace
+    get_current_user, which also checks the staff row.
+    """
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:].strip(), SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("id")
+
+
 async def get_current_user(db: dbDepend ,token: str = Depends(oauth_bearer)):
     credential_exception = HTTPException(status_code=401, detail="UNAUTHORIZED, credentials could not be validated", headers={"WWW-Authenticate": "Bearer"})
     try:
@@ -78,17 +81,20 @@ async def get_current_user(db: dbDepend ,token: str = Depends(oauth_bearer)):
         if user is None:
             print ("DEBUG: No user found")
             raise credential_exception
+        current_staff_id.set(user.id)
         return user
     
     except JWTError as e:
         print(f"JWT error: {e}")
         raise credential_exception
+
+userDepend = Annotated[Staff, Depends(get_current_user)]
        
 def authenticate_user(username: str, passwordd: str, db: dbDepend):
     sta = db.query(Staff).filter(Staff.username == username).first()
     if not sta:
         return False
-    if not bcrypt_context.verify(passwordd, sta.password):
+    if not verify_password(passwordd, sta.password):
         return False
     
 
@@ -99,7 +105,7 @@ async def login(loginrqst: Annotated[OAuth2PasswordRequestForm, Depends()], db:
     sta = db.query(Staff).filter(Staff.username == user).first()
     if not sta:
         return "User not found"
-    if not bcrypt_context.verify(user_pas, sta.password):
+    if not verify_password(user_pas, sta.password):
         return "Wrong credentials"
     # staffc = authenticate_user(user, user_pas, db)
     # if not staffc:
@@ -0,0 +1,32 @@
+from typing import Annotated, Callable, Iterable, List, TypeVar
+from fastapi import HTTPException, Query, status
+
+T = TypeVar("T")
+
+MAX_BATCH_IDS = 500
+
+
+def parse_ids(
+    ids: Annotated[List[str], Query(description="Ids as repeated `ids=1&ids=2` or comma-separated `ids=1,2`")],
+) -> List[int]:
+    """Requested ids in order of first appearance, without duplicates."""
+    parsed: dict[int, None] = {}
+    for chunk in ids:
+        for part in chunk.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit() or int(part) <= 0:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid id: {part!r}")
+            parsed[int(part)] = None
+    if not parsed:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Provide at least one id")
+    if len(parsed) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    return list(parsed)
+
+
+def in_request_order(rows: Iterable[T], ids: List[int], key: Callable[[T], int]) -> tuple[List[T], List[int]]:
+    """Rows reordered to follow `ids`, and the ids that matched no row."""
+    by_id = {key(row): row for row in rows}
+    return [by_id[i] for i in ids if i in by_id], [i for i in ids if i not in by_id]
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+from sqlalchemy import case, func, select
+from database import engine
+from model_folder.model import AuditEvent, StockMovement
+
+# How often each worker process reads the shared tables for product changes made by any process.
+CHANGES_POLL_SECONDS = float(os.getenv("CHANGES_POLL_SECONDS", "0.5"))
+# A missing id below the newest one seen may belong to a transaction that is still committing
+# (PostgreSQL hands out sequence values before commit); it is looked for again until this old.
+CHANGES_GAP_SECONDS = float(os.getenv("CHANGES_GAP_SECONDS", "60"))
+CHANGES_BATCH = int(os.getenv("CHANGES_BATCH", "5000"))
+
+MAX_GAPS = 10_000
+
+
+class IdFollower:
+    """
+    Reads the rows of a table added since the last read, by increasing id.
+
+    Ids skipped over are remembered as gaps and read again on later polls
+    until they show up or are CHANGES_GAP_SECONDS old, so a row whose id was
+    assigned before a newer row's but committed after it is not lost.
+    """
+
+    def __init__(self, id_column, *columns, gap_seconds: float = CHANGES_GAP_SECONDS, batch: int = CHANGES_BATCH):
+        self.id_column = id_column
+        self.columns = columns
+        self.gap_seconds = gap_seconds
+        self.batch = batch
+        self.high: Optional[int] = None
+        self.gaps: dict[int, float] = {}
+
+    def poll(self, conn) -> list:
+        """New rows as (id, *columns) tuples; the first call only records where the table ends."""
+        if self.high is None:
+            self.high = conn.execute(select(func.coalesce(func.max(self.id_column), 0))).scalar()
+            return []
+        now = time.monotonic()
+        self.gaps = {id_: since for id_, since in self.gaps.items() if now - since < self.gap_seconds}
+        wanted = self.id_column > self.high
+        if self.gaps:
+            wanted = wanted | self.id_column.in_(list(self.gaps))
+        rows = [tuple(row) for row in conn.execute(
+            select(self.id_column, *self.columns).where(wanted).order_by(self.id_column).limit(self.batch)
+        )]
+        expected = self.high + 1
+        for row in rows:
+            id_ = row[0]
+            self.gaps.pop(id_, None)
+            if id_ < expected:
+                continue
+            if id_ - expected <= MAX_GAPS - len(self.gaps):
+                self.gaps.update((missing, now) for missing in range(expected, id_))
+            expected = id_ + 1
+        self.high = expected - 1
+        return rows
+
+
+class ChangeFollower:
+    """
+    Reports product changes committed by any worker process, from a background thread.
+
+    Every process polls the shared record of changes by id: stock_movements
+    for stock, and audit_log for everything else (price, status, category
+    names). Listeners get the changed product ids, or None when the change is
+    not tied to known products. Audit rows are written in batches after the
+    commit, so those changes arrive up to AUDIT_FLUSH_SECONDS later.
+    """
+
+    def __init__(self, poll_seconds: float = CHANGES_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.listeners: list[Callable[[Optional[set]], None]] = []
+        self._movements = IdFollower(StockMovement.id, StockMovement.product_id)
+        self._audit = IdFollower(
+            AuditEvent.id, AuditEvent.entity, AuditEvent.entity_id,
+            case((AuditEvent.entity == "categories", AuditEvent.changes)),
+        )
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self.poll()  # mark where the tables end, so only later changes are reported
+        self._thread = threading.Thread(target=self._loop, name="change-follower", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def poll(self) -> None:
+        """Read once and tell the listeners."""
+        with engine.connect() as conn:
+            movements = self._movements.poll(conn)
+            audit = self._audit.poll(conn)
+        product_ids = {product_id for _, product_id in movements if product_id is not None}
+        everything = False
+        for _, entity, entity_id, changes in audit:
+            if entity == "products":
+                if entity_id is None:
+                    everything = True  # no row recorded
+                else:
+                    product_ids.add(int(entity_id))
+            elif entity == "categories" and "name" in json.loads(changes or "{}").get("after", {}):
+                everything = True  # products carry their category's name
+        if everything:
+            self._notify(None)
+        elif product_ids:
+            self._notify(product_ids)
+
+    def _notify(self, product_ids: Optional[set]) -> None:
+        for listener in list(self.listeners):
+            try:
+                listener(product_ids)
+            except Exception:
+                traceback.print_exc()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.poll()
+            except Exception:
+                traceback.print_exc()
+
+
+follower = ChangeFollower()
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import time
+from typing import Optional
+from urllib.parse import parse_qsl
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from database import engine, sticky_to_primary
+from model_folder.model import Staff
+from util.auth import staff_id_from_header
+
+# Listings that every terminal requests at once when a store opens; their
+# responses do not depend on which staff member of a role asks.
+COALESCED_PATHS = ("/products/", "/categories/")
+# How long a staff member's role is reused for keying before it is looked up again.
+COALESCE_ROLE_TTL_SECONDS = float(os.getenv("COALESCE_ROLE_TTL_SECONDS", "5"))
+
+
+def _active_role(staff_id: int) -> Optional[tuple]:
+    with engine.connect() as conn:
+        row = conn.execute(select(Staff.role_id).where(Staff.id == staff_id, Staff.is_active == True)).first()
+    return None if row is None else (row[0],)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.start: Optional[dict] = None
+        self.body: Optional[bytes] = None
+
+
+class CoalescingMiddleware:
+    """
+    Single-flight for GETs to COALESCED_PATHS.
+
+    While a request is being computed, identical requests (same path, query
+    parameters and Accept-Encoding, from active staff members of the same
+    role) wait for it and get the same response bytes instead of running the
+    handler again. A waiter never reaches get_current_user, so the key uses the
+    staff member's role read from the primary; one lookup per staff member is
+    shared by concurrent requests and reused for COALESCE_ROLE_TTL_SECONDS,
+    which bounds how long a deactivated account can still share a response
+    (the first request of a flight is always checked by its handler). Requests whose reads must
+    stay on the primary after a write (see database.sticky_to_primary) are not
+    coalesced, as the flight may have read from a replica. Only 200 responses
+    are shared; if the first request fails or is cancelled, the waiters run on
+    their own. Requests arriving after it finishes start a new flight, so
+    nothing is served stale.
+    """
+
+    def __init__(self, app, paths=COALESCED_PATHS):
+        self.app = app
+        self.paths = set(paths)
+        self._flights: dict[tuple, _Flight] = {}
+        self._roles: dict[int, tuple[float, asyncio.Future]] = {}
+
+    async def _role(self, staff_id: int) -> Optional[tuple]:
+        now = time.monotonic()
+        entry = self._roles.get(staff_id)
+        if entry is None or entry[0] <= now:
+            if entry is None and len(self._roles) >= 1024:
+                self._roles = {k: v for k, v in self._roles.items() if v[0] > now}
+            entry = self._roles[staff_id] = (now + COALESCE_ROLE_TTL_SECONDS,
+                                             asyncio.ensure_future(run_in_threadpool(_active_role, staff_id)))
+        try:
+            # Shielded: a waiter that is cancelled must not cancel the others' lookup.
+            return await asyncio.shield(entry[1])
+        except Exception:
+            if self._roles.get(staff_id) is entry:
+                del self._roles[staff_id]
+            raise
+
+    async def _key(self, scope) -> Optional[tuple]:
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        staff_id = staff_id_from_header(headers.get("authorization"))
+        if staff_id is None or sticky_to_primary(headers):
+            return None
+        role = await self._role(staff_id)
+        if role is None:
+            return None  # let the handler reject it
+        query = tuple(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+        return role, scope["path"], query, headers.get("accept-encoding", "")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        key = await self._key(scope)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            await flight.done.wait()
+            if flight.body is None:
+                await self.app(scope, receive, send)
+                return
+            await send(flight.start)
+            await send({"type": "http.response.body", "body": flight.body})
+            return
+
+        flight = self._flights[key] = _Flight()
+        start = {}
+        chunks = []
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive, capture_send)
+        finally:
+            del self._flights[key]
+            if start.get("status") == 200:
+                flight.start = start
+                flight.body = b"".join(chunks)
+            flight.done.set()
+        if start:
+            await send(start)
+            await send({"type": "http.response.body", "body": b"".join(chunks)})
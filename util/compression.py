@@ -0,0 +1,150 @@
+import os
+import zlib
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick "br" or "gzip" from an Accept-Encoding header, honouring q-values; None if neither is acceptable."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda enc: accepted.get(enc, wildcard))
+    return best if accepted.get(best, wildcard) > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int = COMPRESSION_GZIP_LEVEL, brotli_quality: int = COMPRESSION_BROTLI_QUALITY):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress and flush, so a streamed chunk reaches the client without waiting for more."""
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.finish()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_FINISH)
+
+
+def compress(encoding: str, data: bytes, **levels) -> bytes:
+    return _Compressor(encoding, **levels).finish(data)
+
+
+class CompressionMiddleware:
+    """
+    Brotli/gzip compression of response bodies, chosen from Accept-Encoding.
+
+    Whole responses below `minimum_size` are left alone. Streaming responses
+    are compressed chunk by chunk and flushed after each chunk. Bodies that are
+    already encoded, or whose type does not compress (images, archives), pass
+    through unchanged. Every response of a compressible type carries
+    `Vary: Accept-Encoding`, compressed or not, so caches keep the variants apart.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for key, value in scope["headers"]:
+            if key.lower() == b"accept-encoding":
+                accept = value.decode("latin-1")
+        encoding = negotiate(accept) if accept else None
+        await self.app(scope, receive, _Responder(send, encoding, self.minimum_size).send)
+
+
+def _vary(headers: list) -> list:
+    """`headers` with Accept-Encoding added to Vary."""
+    vary = [v for k, v in headers if k.lower() == b"vary"]
+    if any(part.strip().lower() in (b"accept-encoding", b"*") for v in vary for part in v.split(b",")):
+        return headers
+    return [(k, v) for k, v in headers if k.lower() != b"vary"] + [(b"vary", b", ".join(vary + [b"Accept-Encoding"]))]
+
+
+class _Responder:
+    def __init__(self, send, encoding: Optional[str], minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.mode = None  # "identity" or "compress", decided on the first body chunk
+        self.compressor = None
+
+    def _compressible(self) -> bool:
+        headers = {k.lower(): v for k, v in self.start.get("headers", [])}
+        if b"content-encoding" in headers:
+            return False
+        content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _headers(self, length: Optional[int]) -> list:
+        headers = _vary([(k, v) for k, v in self.start.get("headers", []) if k.lower() != b"content-length"])
+        headers.append((b"content-encoding", self.encoding.encode()))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return headers
+
+    async def send(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            self.start = message
+            return
+        if kind != "http.response.body" or self.mode == "identity":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+        if self.mode is None:
+            compressible = self._compressible()
+            if self.encoding is None or not compressible or (not more and len(body) < self.minimum_size):
+                self.mode = "identity"
+                if compressible:
+                    self.start = {**self.start, "headers": _vary(list(self.start.get("headers", [])))}
+                await self._send(self.start)
+                await self._send(message)
+                return
+            self.mode = "compress"
+            self.compressor = _Compressor(self.encoding)
+            if not more:
+                data = self.compressor.finish(body)
+                await self._send({**self.start, "headers": self._headers(len(data))})
+                await self._send({"type": "http.response.body", "body": data})
+                return
+            await self._send({**self.start, "headers": self._headers(None)})
+
+        data = self.compressor.chunk(body) if more else self.compressor.finish(body)
+        await self._send({"type": "http.response.body", "body": data, "more_body": more})
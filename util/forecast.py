@@ -0,0 +1,128 @@
+import datetime
+import json
+import os
+from typing import Optional
+import numpy as np
+from sqlalchemy import func, insert, select, union_all
+from sqlalchemy.orm import Session
+from model_folder.model import ArchivedOrderDetail, DemandForecast, Order_Detail, Product
+from util.jobs import JobContext, job_handler, schedule
+
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "182"))
+FORECAST_HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", "14"))
+# "exponential" (simple exponential smoothing) or "moving_average", both with weekly seasonality.
+FORECAST_METHOD = os.getenv("FORECAST_METHOD", "exponential")
+FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", "0.1"))
+FORECAST_WINDOW_DAYS = int(os.getenv("FORECAST_WINDOW_DAYS", "28"))
+FORECAST_EVERY_SECONDS = float(os.getenv("FORECAST_EVERY_SECONDS", str(24 * 3600)))
+# Products per block of the products x days matrix; bounds memory on large catalogues.
+FORECAST_BLOCK = int(os.getenv("FORECAST_BLOCK", "50000"))
+
+BATCH = 1000
+
+
+def level_weights(days: int, method: str = FORECAST_METHOD) -> np.ndarray:
+    """Weights (summing to 1) that turn a series of `days` values, oldest first, into its current level."""
+    if method == "moving_average":
+        window = min(FORECAST_WINDOW_DAYS, days)
+        weights = np.zeros(days)
+        weights[days - window:] = 1 / window
+        return weights
+    if method != "exponential":
+        raise ValueError(f"Unknown forecast method '{method}'")
+    # Unrolled l_t = a * x_t + (1 - a) * l_(t-1), starting from l_0 = x_0.
+    weights = FORECAST_ALPHA * (1 - FORECAST_ALPHA) ** np.arange(days - 1, -1, -1, dtype=float)
+    weights[0] += (1 - FORECAST_ALPHA) ** days
+    return weights
+
+
+def _weekday(days: np.ndarray) -> np.ndarray:
+    # Monday is 0; the epoch was a Thursday.
+    return (days.astype("datetime64[D]").astype(np.int64) + 3) % 7
+
+
+def forecast_matrix(history: np.ndarray, first_day: np.datetime64, horizon: int, method: str = FORECAST_METHOD) -> np.ndarray:
+    """
+    Forecast every row of `history` (products x days, starting `first_day`) for the next `horizon` days.
+
+    Weekly seasonal indices (weekday mean over overall mean) are divided out,
+    the deseasonalised series are reduced to a level with one matrix-vector
+    product, and the level is multiplied back by the seasonal index of each
+    future weekday. Days on a weekday a product never sells say nothing about
+    its level, so they are left out and the remaining weights rescaled.
+    """
+    products, days = history.shape
+    weekday = _weekday(first_day + np.arange(days))
+    overall = history.mean(axis=1, keepdims=True)
+    season = np.ones((products, 7))
+    for day in range(7):
+        on_day = weekday == day
+        if on_day.any():
+            season[:, day] = history[:, on_day].mean(axis=1)
+    season = np.divide(season, overall, out=np.ones_like(season), where=overall > 0)
+    seasonal = season[:, weekday]
+    deseasonalised = np.divide(history, seasonal, out=np.zeros_like(history), where=seasonal > 0)
+    weights = level_weights(days, method)
+    covered = (seasonal > 0) @ weights
+    level = np.divide(deseasonalised @ weights, covered, out=np.zeros(products), where=covered > 0)
+    future = _weekday(first_day + days + np.arange(horizon))
+    return level[:, None] * season[:, future]
+
+
+def _daily_sales(db: Session, since: datetime.datetime):
+    lines = union_all(*[
+        select(model.product_id, model.date, model.quantity).where(model.is_active == True, model.date >= since, model.product_id.isnot(None))
+        for model in (Order_Detail, ArchivedOrderDetail)
+    ]).subquery()
+    day = func.date(lines.c.date)
+    return db.execute(
+        select(lines.c.product_id, day, func.sum(func.coalesce(lines.c.quantity, 1)))
+        .group_by(lines.c.product_id, day)
+        .order_by(lines.c.product_id)
+    )
+
+
+def run_forecast(db: Session, now: Optional[datetime.datetime] = None, ctx: Optional[JobContext] = None) -> dict:
+    """
+    Forecast every product from one aggregated query of daily quantities and
+    replace the stored forecasts in one transaction.
+    """
+    now = now or datetime.datetime.utcnow()
+    today = np.datetime64(now.date(), "D")
+    first_day = today - FORECAST_HISTORY_DAYS
+    sales = [tuple(row) for row in _daily_sales(db, datetime.datetime.combine(first_day.astype(datetime.date), datetime.time()))]
+    sold_ids = np.array([row[0] for row in sales], dtype=np.int64)
+    sold_day = (np.array([str(row[1]) for row in sales], dtype="datetime64[D]") - first_day).astype(np.int64)
+    sold_qty = np.array([row[2] for row in sales], dtype=float)
+    in_window = (sold_day >= 0) & (sold_day < FORECAST_HISTORY_DAYS)  # today is incomplete
+    sold_ids, sold_day, sold_qty = sold_ids[in_window], sold_day[in_window], sold_qty[in_window]
+
+    product_ids = np.array([p for (p,) in db.query(Product.id).order_by(Product.id)], dtype=np.int64)
+    db.query(DemandForecast).delete(synchronize_session=False)
+    for start in range(0, len(product_ids), FORECAST_BLOCK):
+        block = product_ids[start:start + FORECAST_BLOCK]
+        history = np.zeros((len(block), FORECAST_HISTORY_DAYS))
+        rows = (sold_ids >= block[0]) & (sold_ids <= block[-1])
+        np.add.at(history, (np.searchsorted(block, sold_ids[rows]), sold_day[rows]), sold_qty[rows])
+        forecast = np.round(forecast_matrix(history, first_day, FORECAST_HORIZON_DAYS), 3)
+        totals = forecast.sum(axis=1)
+        for offset in range(0, len(block), BATCH):
+            db.execute(insert(DemandForecast), [
+                {"product_id": product_id, "method": FORECAST_METHOD, "horizon_days": FORECAST_HORIZON_DAYS,
+                 "daily": json.dumps(daily), "total": total, "computed_at": now}
+                for product_id, daily, total in zip(
+                    block[offset:offset + BATCH].tolist(), forecast[offset:offset + BATCH].tolist(), totals[offset:offset + BATCH].tolist(),
+                )
+            ])
+        if ctx is not None:
+            ctx.check_cancelled()
+    db.commit()
+    return {"products": len(product_ids), "with_sales": int(len(np.unique(sold_ids))), "method": FORECAST_METHOD}
+
+
+@job_handler("demand.forecast")
+def forecast_job(db: Session, ctx: JobContext):
+    return run_forecast(db, ctx=ctx)
+
+
+schedule("demand.forecast", FORECAST_EVERY_SECONDS)
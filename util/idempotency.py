@@ -0,0 +1,198 @@
+import datetime
+import hashlib
+import os
+from typing import Optional
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from database import SessionLocal
+from model_folder.model import IdempotencyKey
+from util.auth import staff_id_from_header
+from util.jobs import JobContext, job_handler, schedule
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_EXPIRE_EVERY_SECONDS = float(os.getenv("IDEMPOTENCY_EXPIRE_EVERY_SECONDS", "900"))
+# How long a key stays locked to a request that has not finished; longer than any request takes.
+# Past this, the holder is presumed dead (e.g. its process crashed) and a retry takes the key over.
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENT_PATHS = ("/orders/", "/orderdetails/", "/payments/")
+# Responses that depend on who/when rather than on the request itself are not replayed.
+NOT_STORED = {401, 403, 409, 429}
+
+
+def _claim(key: str, fingerprint: str) -> tuple[Optional[datetime.datetime], Optional[IdempotencyKey]]:
+    """
+    Claim `key` for this request: (claim time, None) if it is ours now, else (None, the existing row).
+
+    A key is taken over when it has expired, or when the request holding it
+    never finished and its lock ran out and this retry is the same request.
+    """
+    now = datetime.datetime.utcnow()
+    values = {
+        "fingerprint": fingerprint, "status_code": None, "content_type": None, "response_body": None, "created_at": now,
+        "expires_at": now + datetime.timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        "locked_until": now + datetime.timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+    }
+    with SessionLocal() as db:
+        try:
+            db.add(IdempotencyKey(key=key, **values))
+            db.commit()
+            return now, None
+        except IntegrityError:
+            db.rollback()
+        abandoned = and_(
+            IdempotencyKey.status_code.is_(None),
+            IdempotencyKey.fingerprint == fingerprint,
+            or_(IdempotencyKey.locked_until < now, IdempotencyKey.locked_until.is_(None)),
+        )
+        # Conditional, so of several retries racing for the key only one wins it.
+        taken = (
+            db.query(IdempotencyKey)
+            .filter(IdempotencyKey.key == key, or_(IdempotencyKey.expires_at < now, abandoned))
+            .update(values, synchronize_session=False)
+        )
+        db.commit()
+        if taken:
+            return now, None
+        existing = db.get(IdempotencyKey, key)
+        if existing is not None:
+            db.expunge(existing)
+        return None, existing
+
+
+def _held(key: str, claimed_at: datetime.datetime):
+    # A request whose lock ran out may have lost the key to a retry; it must not touch the retry's row.
+    return and_(IdempotencyKey.key == key, IdempotencyKey.created_at == claimed_at)
+
+
+def _store(key: str, claimed_at: datetime.datetime, status_code: int, content_type: Optional[str], body: bytes) -> None:
+    with SessionLocal() as db:
+        db.query(IdempotencyKey).filter(_held(key, claimed_at)).update(
+            {IdempotencyKey.status_code: status_code, IdempotencyKey.content_type: content_type,
+             IdempotencyKey.response_body: body.decode("utf-8", "replace"), IdempotencyKey.locked_until: None},
+            synchronize_session=False,
+        )
+        db.commit()
+
+
+def _release(key: str, claimed_at: datetime.datetime) -> None:
+    with SessionLocal() as db:
+        db.query(IdempotencyKey).filter(_held(key, claimed_at)).delete(synchronize_session=False)
+        db.commit()
+
+
+class IdempotencyMiddleware:
+    """
+    Makes POSTs to IDEMPOTENT_PATHS safe to retry when the client sends an Idempotency-Key header.
+
+    The first request with a key runs normally and its response is stored
+    for IDEMPOTENCY_TTL_SECONDS. A retry with the same key and body gets the
+    stored response back (with `Idempotent-Replayed: true`) without reaching
+    the handler. The same key with a different body gets 422, and a retry
+    while the first request is still running gets 409, until
+    IDEMPOTENCY_LOCK_SECONDS have passed: the first request is then presumed
+    lost and the retry runs in its place. Keys are scoped per staff member.
+    """
+
+    def __init__(self, app, paths=IDEMPOTENT_PATHS):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        client_key = headers.get("idempotency-key")
+        staff_id = staff_id_from_header(headers.get("authorization"))
+        if not client_key or staff_id is None:
+            await self.app(scope, receive, send)
+            return
+        if len(client_key) > 255:
+            await JSONResponse({"detail": "Idempotency-Key is too long"}, status_code=400)(scope, receive, send)
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        digest = hashlib.sha256()
+        for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body):
+            digest.update(part)
+            digest.update(b"\0")
+        key = f"{staff_id}:{client_key}"
+
+        claimed_at, existing = await run_in_threadpool(_claim, key, digest.hexdigest())
+        if claimed_at is None:
+            if existing is None:
+                # Swept between the insert and the lookup; the client can simply retry.
+                response = JSONResponse({"detail": "A request with this Idempotency-Key is still in progress"}, status_code=409)
+            elif existing.fingerprint != digest.hexdigest():
+                response = JSONResponse({"detail": "Idempotency-Key was already used with a different request"}, status_code=422)
+            elif existing.status_code is None:
+                response = JSONResponse({"detail": "A request with this Idempotency-Key is still in progress"}, status_code=409)
+            else:
+                response = Response(
+                    content=existing.response_body,
+                    status_code=existing.status_code,
+                    media_type=existing.content_type,
+                    headers={"Idempotent-Replayed": "true"},
+                )
+            await response(scope, receive, send)
+            return
+
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        started = {}
+        chunks = []
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                started.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await run_in_threadpool(_release, key, claimed_at)
+            raise
+        status_code = started.get("status", 500)
+        if status_code >= 500 or status_code in NOT_STORED:
+            await run_in_threadpool(_release, key, claimed_at)
+            return
+        content_type = dict((k.decode("latin-1").lower(), v.decode("latin-1")) for k, v in started.get("headers", [])).get("content-type")
+        await run_in_threadpool(_store, key, claimed_at, status_code, content_type, b"".join(chunks))
+
+
+def expire_keys(db: Session, batch: int = 5000) -> int:
+    """Delete expired keys in batches so the sweep never holds long locks."""
+    now = datetime.datetime.utcnow()
+    total = 0
+    while True:
+        ids = [k for (k,) in db.query(IdempotencyKey.key).filter(IdempotencyKey.expires_at < now).limit(batch)]
+        if not ids:
+            return total
+        db.query(IdempotencyKey).filter(IdempotencyKey.key.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        total += len(ids)
+
+
+@job_handler("idempotency.expire")
+def expire_job(db: Session, ctx: JobContext):
+    return {"expired": expire_keys(db)}
+
+
+schedule("idempotency.expire", IDEMPOTENCY_EXPIRE_EVERY_SECONDS)
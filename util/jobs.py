@@ -0,0 +1,279 @@
+import datetime
+import json
+import os
+import threading
+import time
+import traceback
+from typing import Any, Callable, Optional
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from model_folder.model import Job
+
+# Threads per API process that execute queued jobs; 0 disables the in-process worker.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+# A running job's lease; its worker renews it every third of this. A job whose lease ran out
+# belonged to a worker that died and is queued again.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+_handlers: dict[str, Callable[[Session, "JobContext"], Any]] = {}
+_schedules: dict[str, float] = {}
+
+
+class JobCancelled(Exception):
+    """Raised by a handler (usually via JobContext.check_cancelled) to stop early."""
+
+
+class JobContext:
+    def __init__(self, job_id: int, payload: dict, attempt: int):
+        self.job_id = job_id
+        self.payload = payload
+        self.attempt = attempt
+
+    def cancelled(self) -> bool:
+        with SessionLocal() as db:
+            return bool(db.query(Job.cancel_requested).filter(Job.id == self.job_id).scalar())
+
+    def check_cancelled(self) -> None:
+        if self.cancelled():
+            raise JobCancelled()
+
+
+def job_handler(kind: str):
+    """
+    Register `fn(db, ctx)` as the handler for jobs of `kind`.
+
+    The return value must be JSON-serialisable; it is stored as the job result.
+    Long loops should call `ctx.check_cancelled()` between batches.
+    """
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def schedule(kind: str, every_seconds: float) -> None:
+    """Queue a `kind` job every `every_seconds` while the worker pool runs (skipped if one is already pending)."""
+    _schedules[kind] = every_seconds
+
+
+def enqueue(db: Session, kind: str, payload: Optional[dict] = None, created_by: Optional[int] = None, max_attempts: int = 3,
+            dedupe_key: Optional[str] = None) -> Job:
+    """
+    Queue a job and commit; returns immediately with the new Job row.
+
+    With a `dedupe_key`, raises IntegrityError if a queued job already has that key.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind '{kind}'")
+    job = Job(kind=kind, payload=json.dumps(payload or {}), created_by=created_by, max_attempts=max_attempts, dedupe_key=dedupe_key)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def request_cancel(db: Session, job: Job) -> Job:
+    """
+    Cancel a queued job at once; ask a running job to stop at its next check.
+
+    Both are conditional updates, so a worker claiming the job at the same
+    moment either finds it cancelled or runs it with the stop requested.
+    Returns the job as it now stands.
+    """
+    cancelled = (
+        db.query(Job)
+        .filter(Job.id == job.id, Job.status == "queued")
+        .update({Job.status: "cancelled", Job.finished_at: datetime.datetime.utcnow()}, synchronize_session=False)
+    )
+    if not cancelled:
+        db.query(Job).filter(Job.id == job.id, Job.status == "running").update({Job.cancel_requested: True}, synchronize_session=False)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def _claim_next(now: datetime.datetime) -> Optional[Job]:
+    with SessionLocal() as db:
+        candidate = (
+            db.query(Job.id)
+            .filter(Job.status == "queued", Job.run_after <= now)
+            .order_by(Job.run_after, Job.id)
+            .first()
+        )
+        if candidate is None:
+            return None
+        # Conditional update: only one worker (thread or process) wins the row.
+        claimed = (
+            db.query(Job)
+            .filter(Job.id == candidate.id, Job.status == "queued")
+            .update({
+                Job.status: "running", Job.started_at: now, Job.attempts: Job.attempts + 1,
+                Job.lease_until: now + datetime.timedelta(seconds=JOB_LEASE_SECONDS),
+            }, synchronize_session=False)
+        )
+        db.commit()
+        if claimed != 1:
+            return None
+        job = db.get(Job, candidate.id)
+        db.expunge(job)
+        return job
+
+
+def _finish(job_id: int, **values) -> None:
+    with SessionLocal() as db:
+        db.query(Job).filter(Job.id == job_id).update(values, synchronize_session=False)
+        db.commit()
+
+
+def run_job(job: Job) -> None:
+    handler = _handlers.get(job.kind)
+    now = datetime.datetime.utcnow
+    if handler is None:
+        _finish(job.id, status="failed", error=f"No handler registered for job kind '{job.kind}'", finished_at=now())
+        return
+    ctx = JobContext(job.id, json.loads(job.payload or "{}"), job.attempts)
+    try:
+        with SessionLocal() as db:
+            result = handler(db, ctx)
+    except JobCancelled:
+        _finish(job.id, status="cancelled", finished_at=now())
+    except Exception as exc:
+        traceback.print_exc()
+        if job.attempts < job.max_attempts:
+            delay = JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+            _finish(job.id, status="queued", error=repr(exc), run_after=now() + datetime.timedelta(seconds=delay))
+        else:
+            _finish(job.id, status="failed", error=repr(exc), finished_at=now())
+    else:
+        _finish(job.id, status="succeeded", result=json.dumps(result), error=None, finished_at=now())
+
+
+def enqueue_if_idle(kind: str, created_by: Optional[int] = None, include_running: bool = True) -> bool:
+    """
+    Queue `kind` unless a job of that kind is already queued or running (in any process).
+
+    With `include_running=False` only a queued job counts: one already running
+    may have read its inputs before the caller's change committed. The queued
+    check is the unique index on Job.dedupe_key, so schedulers in several
+    worker processes racing here still queue a single job.
+    """
+    with SessionLocal() as db:
+        if include_running and db.query(Job.id).filter(Job.kind == kind, Job.status == "running").first() is not None:
+            return False
+        try:
+            enqueue(db, kind, created_by=created_by, dedupe_key=kind)
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+
+
+def renew_leases(job_ids: list[int]) -> None:
+    lease_until = datetime.datetime.utcnow() + datetime.timedelta(seconds=JOB_LEASE_SECONDS)
+    with SessionLocal() as db:
+        db.query(Job).filter(Job.id.in_(job_ids), Job.status == "running").update(
+            {Job.lease_until: lease_until}, synchronize_session=False
+        )
+        db.commit()
+
+
+def requeue_stale_jobs() -> int:
+    """Queue again the running jobs whose lease has run out (no lease: started before leases existed)."""
+    now = datetime.datetime.utcnow()
+    with SessionLocal() as db:
+        count = (
+            db.query(Job)
+            .filter(Job.status == "running", or_(Job.lease_until < now, Job.lease_until.is_(None)))
+            .update({Job.status: "queued", Job.lease_until: None}, synchronize_session=False)
+        )
+        db.commit()
+    return count
+
+
+class JobWorkerPool:
+    """
+    Threads that poll the jobs table and run handlers off the request path.
+
+    A heartbeat thread renews the leases of the jobs this pool is running and
+    queues again the jobs of workers whose leases ran out.
+    """
+
+    def __init__(self, size: int = JOB_WORKERS):
+        self.size = size
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._running: set[int] = set()
+        self._running_lock = threading.Lock()
+
+    def start(self) -> None:
+        if self.size <= 0:
+            return
+        self._stop.clear()
+        requeue_stale_jobs()
+        for i in range(self.size):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        if _schedules:
+            thread = threading.Thread(target=self._schedule_loop, name="job-scheduler", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10) -> None:
+        """Stop claiming new jobs and wait (up to `timeout`) for running ones to finish."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = _claim_next(datetime.datetime.utcnow())
+            except Exception:
+                traceback.print_exc()
+                job = None
+            if job is None:
+                self._stop.wait(JOB_POLL_SECONDS)
+                continue
+            with self._running_lock:
+                self._running.add(job.id)
+            try:
+                run_job(job)
+            finally:
+                with self._running_lock:
+                    self._running.discard(job.id)
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(JOB_LEASE_SECONDS / 3):
+            with self._running_lock:
+                running = list(self._running)
+            try:
+                if running:
+                    renew_leases(running)
+                requeue_stale_jobs()
+            except Exception:
+                traceback.print_exc()
+
+    def _schedule_loop(self) -> None:
+        next_due = {kind: 0.0 for kind in _schedules}
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for kind, every in _schedules.items():
+                if now < next_due.get(kind, 0.0):
+                    continue
+                next_due[kind] = now + every
+                try:
+                    enqueue_if_idle(kind)
+                except Exception:
+                    traceback.print_exc()
+            self._stop.wait(min(_schedules.values(), default=JOB_POLL_SECONDS))
+
+
+workers = JobWorkerPool()
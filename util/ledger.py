@@ -0,0 +1,247 @@
+import datetime
+import os
+import uuid
+from typing import Optional
+from sqlalchemy import DateTime, Integer, String, Select, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from database import current_staff_id
+from model_folder.model import LocationStock, Product, StockMovement, StockSnapshot, Watermark
+from util.jobs import JobContext, job_handler, schedule
+from util.productcache import catalogue_changed, product_changed
+from util.writes import update_returning
+
+# How often per-product snapshots are taken; bounds the delta a point-in-time query replays.
+LEDGER_SNAPSHOT_SECONDS = float(os.getenv("LEDGER_SNAPSHOT_SECONDS", "3600"))
+# Snapshots are cut off this far in the past. A movement is stamped before its transaction
+# commits, so one still in flight at the cutoff must commit within this time to be counted.
+LEDGER_SNAPSHOT_LAG_SECONDS = float(os.getenv("LEDGER_SNAPSHOT_LAG_SECONDS", "300"))
+
+WATERMARK = "ledger.snapshot"  # value: the last cutoff, in whole seconds since the epoch
+BATCH = 500
+
+
+def _upsert_location_stock(db: Session, rows) -> None:
+    """
+    Add quantities to location_stock, creating missing (location, product) rows.
+
+    `rows` is a list of dicts or a SELECT of location_id, product_id, quantity.
+    One INSERT ... ON CONFLICT on PostgreSQL and SQLite, row by row elsewhere.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        _add_location_stock(db, rows)
+        return
+    ins = (postgresql if dialect == "postgresql" else sqlite).insert(LocationStock)
+    if isinstance(rows, Select):
+        ins = ins.from_select(["location_id", "product_id", "quantity"], rows)
+    else:
+        ins = ins.values(rows)
+    db.execute(ins.on_conflict_do_update(
+        index_elements=[LocationStock.location_id, LocationStock.product_id],
+        set_={"quantity": func.coalesce(LocationStock.quantity, 0) + ins.excluded.quantity},
+    ))
+
+
+def _add_location_stock(db: Session, rows) -> None:
+    """Portable fallback for _upsert_location_stock: SELECT ... FOR UPDATE each row, then UPDATE or INSERT it."""
+    if isinstance(rows, Select):
+        rows = [{"location_id": l, "product_id": p, "quantity": q} for l, p, q in db.execute(rows)]
+    for row in rows:
+        held = (
+            db.query(LocationStock)
+            .filter(LocationStock.location_id == row["location_id"], LocationStock.product_id == row["product_id"])
+            .with_for_update()
+            .first()
+        )
+        if held is None:
+            db.add(LocationStock(**row))
+        else:
+            held.quantity = (held.quantity or 0) + row["quantity"]
+        db.flush()  # so a later row for the same location and product finds this one
+
+
+def record_movement(db: Session, product_id: int, quantity: int, kind: str, reference: Optional[str] = None,
+                    location_id: Optional[int] = None) -> None:
+    """
+    Append one movement and apply it to Product.unit (and the location's stock, if given).
+
+    A constant number of single-row statements in the caller's transaction; the caller commits.
+    """
+    if not quantity or product_id is None:
+        return
+    db.add(StockMovement(product_id=product_id, quantity=quantity, kind=kind, reference=reference,
+                         location_id=location_id, staff_id=current_staff_id.get()))
+    # RETURNING also refreshes the product if the caller holds it, so its unit is current after commit.
+    update_returning(db, Product, {"unit": func.coalesce(Product.unit, 0) + quantity}, Product.id == product_id)
+    product_changed(db, product_id)
+    if location_id is not None:
+        _upsert_location_stock(db, [{"location_id": location_id, "product_id": product_id, "quantity": quantity}])
+
+
+def record_transfer(db: Session, product_id: int, quantity: int, from_location_id: int, to_location_id: int,
+                    reference: Optional[str] = None) -> bool:
+    """
+    Move `quantity` of a product between locations; Product.unit is unchanged.
+
+    The source is debited with a conditional UPDATE (quantity >= the amount moved),
+    so two transfers racing for the same stock cannot both take it on any dialect.
+    Returns False, having written nothing, when the source holds too little; the caller commits.
+    """
+    debited = update_returning(
+        db, LocationStock, {"quantity": LocationStock.quantity - quantity},
+        LocationStock.location_id == from_location_id, LocationStock.product_id == product_id,
+        LocationStock.quantity >= quantity,
+    )
+    if debited is None:
+        return False
+    staff_id = current_staff_id.get()
+    db.add_all([
+        StockMovement(product_id=product_id, quantity=-quantity, kind="transfer", reference=reference,
+                      location_id=from_location_id, staff_id=staff_id),
+        StockMovement(product_id=product_id, quantity=quantity, kind="transfer", reference=reference,
+                      location_id=to_location_id, staff_id=staff_id),
+    ])
+    _upsert_location_stock(db, [{"location_id": to_location_id, "product_id": product_id, "quantity": quantity}])
+    return True
+
+
+def record_movements(db: Session, rows: Select, kind: str) -> str:
+    """
+    Set-based variant of record_movement.
+
+    `rows` selects labelled `product_id`, `quantity` and `reference` columns,
+    and optionally `location_id`. They are appended with one INSERT ... SELECT
+    and applied to Product.unit (and location stock) with one statement each;
+    returns the batch id shared by the new movements.
+    """
+    batch_id = uuid.uuid4().hex
+    src = rows.subquery()
+    location = src.c.location_id if "location_id" in src.c else literal(None, Integer)
+    db.execute(
+        insert(StockMovement).from_select(
+            ["product_id", "quantity", "kind", "reference", "location_id", "batch_id", "staff_id", "created_at"],
+            select(
+                src.c.product_id,
+                src.c.quantity,
+                literal(kind, String),
+                src.c.reference,
+                location,
+                literal(batch_id, String),
+                literal(current_staff_id.get(), Integer),
+                literal(datetime.datetime.utcnow(), DateTime),
+            ).where(src.c.quantity != 0),
+        )
+    )
+    moved = (
+        select(func.sum(StockMovement.quantity))
+        .where(StockMovement.batch_id == batch_id, StockMovement.product_id == Product.id)
+        .scalar_subquery()
+    )
+    apply = (
+        update(Product)
+        .where(Product.id.in_(select(StockMovement.product_id).where(StockMovement.batch_id == batch_id)))
+        .values(unit=func.coalesce(Product.unit, 0) + moved)
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        product_changed(db, *db.execute(apply.returning(Product.id)).scalars())
+    else:
+        db.execute(apply)
+        catalogue_changed(db)
+    if "location_id" in src.c:
+        _upsert_location_stock(
+            db,
+            select(StockMovement.location_id, StockMovement.product_id, func.sum(StockMovement.quantity))
+            .where(StockMovement.batch_id == batch_id, StockMovement.location_id.isnot(None))
+            .group_by(StockMovement.location_id, StockMovement.product_id),
+        )
+    return batch_id
+
+
+def stock_at(db: Session, product_id: int, at: datetime.datetime) -> int:
+    """
+    Product.unit as it was at `at`.
+
+    Starts from the nearest snapshot at or before `at` and adds the movements
+    since, or, before the first snapshot, walks back from the next one.
+    """
+    before = (
+        db.query(StockSnapshot)
+        .filter(StockSnapshot.product_id == product_id, StockSnapshot.taken_at <= at)
+        .order_by(StockSnapshot.taken_at.desc(), StockSnapshot.id.desc())
+        .first()
+    )
+    moved = db.query(func.coalesce(func.sum(StockMovement.quantity), 0)).filter(StockMovement.product_id == product_id)
+    if before is not None:
+        delta = moved.filter(StockMovement.created_at > before.taken_at, StockMovement.created_at <= at).scalar()
+        return before.unit + delta
+
+    after = (
+        db.query(StockSnapshot)
+        .filter(StockSnapshot.product_id == product_id, StockSnapshot.taken_at > at)
+        .order_by(StockSnapshot.taken_at, StockSnapshot.id)
+        .first()
+    )
+    if after is not None:
+        undo = moved.filter(StockMovement.created_at > at, StockMovement.created_at <= after.taken_at).scalar()
+        return after.unit - undo
+
+    current = db.query(func.coalesce(Product.unit, 0)).filter(Product.id == product_id).scalar() or 0
+    return current - moved.filter(StockMovement.created_at > at).scalar()
+
+
+def take_snapshots(db: Session, ctx: Optional[JobContext] = None) -> dict:
+    """
+    Snapshot every product that moved since the last cutoff (all products on the first run).
+
+    The cutoff is LEDGER_SNAPSHOT_LAG_SECONDS ago rather than now: ids and
+    timestamps are handed out before commit, so the newest movements may not
+    all be visible yet. Each snapshot is Product.unit less the movements
+    stamped after the cutoff, i.e. stock after every movement up to it.
+    """
+    now = datetime.datetime.utcnow()
+    cutoff = int((now - datetime.datetime(1970, 1, 1)).total_seconds() - LEDGER_SNAPSHOT_LAG_SECONDS)
+    taken_at = datetime.datetime.utcfromtimestamp(cutoff)
+    mark = db.get(Watermark, WATERMARK)
+    if mark is None:
+        mark = Watermark(name=WATERMARK, value=0)
+        db.add(mark)
+        product_ids = [pid for (pid,) in db.query(Product.id).order_by(Product.id)]
+    elif mark.value >= cutoff:
+        return {"snapshots": 0, "watermark": mark.value}
+    else:
+        product_ids = [
+            pid for (pid,) in db.query(StockMovement.product_id)
+            .filter(StockMovement.created_at > datetime.datetime.utcfromtimestamp(mark.value), StockMovement.created_at <= taken_at)
+            .distinct()
+        ]
+
+    moved_since = (
+        select(func.coalesce(func.sum(StockMovement.quantity), 0))
+        .where(StockMovement.product_id == Product.id, StockMovement.created_at > taken_at)
+        .scalar_subquery()
+    )
+    for start in range(0, len(product_ids), BATCH):
+        if ctx is not None:
+            ctx.check_cancelled()
+        chunk = product_ids[start:start + BATCH]
+        # One statement, so unit and the movements since the cutoff come from the same view of the data.
+        db.execute(
+            insert(StockSnapshot).from_select(
+                ["product_id", "unit", "taken_at"],
+                select(Product.id, func.coalesce(Product.unit, 0) - moved_since, literal(taken_at, DateTime))
+                .where(Product.id.in_(chunk)),
+            )
+        )
+    mark.value = cutoff
+    db.commit()
+    return {"snapshots": len(product_ids), "watermark": cutoff}
+
+
+@job_handler("ledger.snapshot")
+def snapshot_job(db: Session, ctx: JobContext):
+    return take_snapshots(db, ctx)
+
+
+schedule("ledger.snapshot", LEDGER_SNAPSHOT_SECONDS)
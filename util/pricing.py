@@ -0,0 +1,186 @@
+import datetime
+import os
+from typing import Optional
+import numpy as np
+from sqlalchemy import insert, or_
+from sqlalchemy.orm import Session
+from model_folder.model import PricingRule, Product, ProductPrice
+from util.jobs import JobContext, job_handler, schedule
+
+PRICING_REPRICE_SECONDS = float(os.getenv("PRICING_REPRICE_SECONDS", "900"))
+# Lines x rules evaluated at once; bounds the temporary arrays to a few tens of MB.
+PRICING_BLOCK_CELLS = int(os.getenv("PRICING_BLOCK_CELLS", "2000000"))
+
+KINDS = ("percent", "amount", "price")
+BATCH = 1000
+
+
+def line_total(price: Optional[float], quantity: Optional[int], discount: Optional[float]) -> float:
+    """Total of an order line: unit price times quantity, less its percentage discount."""
+    return (price or 0) * (quantity or 1) * (1 - (discount or 0) / 100)
+
+
+def _array(rows, width: int) -> np.ndarray:
+    # NumPy reads plain tuples far faster than Row objects.
+    return np.array([tuple(row) for row in rows], dtype=float).reshape(-1, width)
+
+
+def _ids(values) -> np.ndarray:
+    # Float so a missing id can be NaN, which equals nothing.
+    return np.array(values, dtype=float).reshape(-1)
+
+
+class RuleSet:
+    """The promotions in force at one moment, as parallel arrays."""
+
+    def __init__(self, rules: list[PricingRule]):
+        self.ids = np.array([r.id for r in rules], dtype=np.int64)
+        self.kind = np.array([KINDS.index(r.kind) for r in rules], dtype=np.int8)
+        self.value = np.array([r.value or 0 for r in rules], dtype=float)
+        self.product_id = _ids([r.product_id for r in rules])
+        self.category_id = _ids([r.category_id for r in rules])
+        self.supplier_id = _ids([r.supplier_id for r in rules])
+        self.min_quantity = np.array([r.min_quantity or 1 for r in rules], dtype=float)
+        # Every kind as `list_price * scale + offset`.
+        self.scale = np.select([self.kind == 0, self.kind == 1], [1 - self.value / 100, 1.0], 0.0)
+        self.offset = np.select([self.kind == 0, self.kind == 1], [0.0, -self.value], self.value)
+
+    @classmethod
+    def load(cls, db: Session, at: datetime.datetime) -> "RuleSet":
+        return cls(
+            db.query(PricingRule)
+            .filter(
+                PricingRule.is_active == True,
+                or_(PricingRule.starts_at.is_(None), PricingRule.starts_at <= at),
+                or_(PricingRule.ends_at.is_(None), PricingRule.ends_at > at),
+            )
+            .all()
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def price_lines(rules: RuleSet, list_price, product_id, category_id, supplier_id, quantity) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Unit price of each line after promotions, and the id of the rule that set it (-1: list price).
+
+    Arguments are equal-length arrays, ids as floats with NaN for none. Every
+    line is checked against every rule at once as a lines x rules matrix of
+    masks and candidate prices, in blocks of PRICING_BLOCK_CELLS. The lowest
+    candidate wins; a rule never raises a price above list.
+    """
+    list_price = np.nan_to_num(np.asarray(list_price, dtype=float))
+    unit = list_price.copy()
+    rule = np.full(len(unit), -1, dtype=np.int64)
+    if not len(rules) or not len(unit):
+        return unit, rule
+    block = max(1, PRICING_BLOCK_CELLS // len(rules))
+    for start in range(0, len(unit), block):
+        lines = slice(start, start + block)
+        base = list_price[lines, None]
+        applies = np.asarray(quantity, dtype=float)[lines, None] >= rules.min_quantity
+        for line_ids, rule_ids in ((product_id, rules.product_id), (category_id, rules.category_id), (supplier_id, rules.supplier_id)):
+            applies &= np.isnan(rule_ids) | (np.asarray(line_ids, dtype=float)[lines, None] == rule_ids)
+        candidate = base * rules.scale + rules.offset
+        candidate[~applies] = np.inf
+        best = candidate.argmin(axis=1)
+        best_price = np.maximum(candidate[np.arange(len(best)), best], 0)
+        cheaper = best_price < unit[lines]
+        unit[lines] = np.where(cheaper, best_price, unit[lines])
+        rule[lines] = np.where(cheaper, rules.ids[best], -1)
+    return unit, rule
+
+
+def quote(db: Session, lines: list[tuple[int, int]], at: Optional[datetime.datetime] = None) -> list[Optional[dict]]:
+    """
+    Price a basket of (product_id, quantity) lines in one pass.
+
+    Each result has `list_price`, `unit_price`, `rule_id`, `discount` (the
+    promotion as a percentage of list) and `line_total`; None for an unknown
+    product.
+    """
+    at = at or datetime.datetime.utcnow()
+    product_ids = sorted({product_id for product_id, _ in lines})
+    products = {
+        row[0]: tuple(row[1:])
+        for row in db.query(Product.id, Product.price, Product.cat_id, Product.supplier_id).filter(Product.id.in_(product_ids))
+    }
+    known = [(product_id, quantity) for product_id, quantity in lines if product_id in products]
+    columns = np.array([products[product_id] for product_id, _ in known], dtype=float).reshape(-1, 3)
+    quantity = np.array([quantity for _, quantity in known], dtype=float)
+    unit, rule = price_lines(
+        RuleSet.load(db, at), columns[:, 0], [product_id for product_id, _ in known], columns[:, 1], columns[:, 2], quantity,
+    )
+    list_price = np.nan_to_num(columns[:, 0])
+    discount = np.round(np.where(list_price > 0, (1 - unit / np.where(list_price > 0, list_price, 1)) * 100, 0), 6)
+    priced = iter(zip(list_price.tolist(), unit.tolist(), rule.tolist(), discount.tolist(), (unit * quantity).tolist()))
+    results = []
+    for product_id, _ in lines:
+        if product_id not in products:
+            results.append(None)
+            continue
+        list_, unit_, rule_, discount_, total = next(priced)
+        results.append({
+            "product_id": product_id,
+            "list_price": list_,
+            "unit_price": unit_,
+            "rule_id": rule_ if rule_ >= 0 else None,
+            "discount": discount_,
+            "line_total": total,
+        })
+    return results
+
+
+def _same(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+
+def reprice(db: Session, now: Optional[datetime.datetime] = None, ctx: Optional[JobContext] = None) -> dict:
+    """
+    Recompute ProductPrice for the whole catalogue in one vectorised pass and
+    write only the rows that changed, in one transaction.
+    """
+    now = now or datetime.datetime.utcnow()
+    rules = RuleSet.load(db, now)
+    catalogue = _array(db.query(Product.id, Product.price, Product.cat_id, Product.supplier_id).order_by(Product.id), 4)
+    ids = catalogue[:, 0].astype(np.int64)
+    list_price = np.nan_to_num(catalogue[:, 1])
+    unit, rule = price_lines(rules, list_price, catalogue[:, 0], catalogue[:, 2], catalogue[:, 3], np.ones(len(ids)))
+    rule_id = np.where(rule >= 0, rule, np.nan)
+
+    stored = _array(
+        db.query(ProductPrice.product_id, ProductPrice.list_price, ProductPrice.unit_price, ProductPrice.rule_id).order_by(ProductPrice.product_id), 4,
+    )
+    stored_ids = stored[:, 0].astype(np.int64)
+    position = np.searchsorted(ids, stored_ids)
+    found = position < len(ids)
+    found[found] = ids[position[found]] == stored_ids[found]
+    old = np.full((len(ids), 3), np.nan)
+    old[position[found]] = stored[found, 1:]
+    changed = ~(_same(old[:, 0], list_price) & _same(old[:, 1], unit) & _same(old[:, 2], rule_id))
+    changed_at = np.flatnonzero(changed)
+
+    gone = stored_ids[~found].tolist()
+    for start in range(0, len(gone), BATCH):
+        db.query(ProductPrice).filter(ProductPrice.product_id.in_(gone[start:start + BATCH])).delete(synchronize_session=False)
+    for start in range(0, len(changed_at), BATCH):
+        chunk = changed_at[start:start + BATCH]
+        db.query(ProductPrice).filter(ProductPrice.product_id.in_(ids[chunk].tolist())).delete(synchronize_session=False)
+        db.execute(insert(ProductPrice), [
+            {"product_id": p, "list_price": lp, "unit_price": up, "rule_id": r if r >= 0 else None, "computed_at": now}
+            for p, lp, up, r in zip(ids[chunk].tolist(), list_price[chunk].tolist(), unit[chunk].tolist(), rule[chunk].tolist())
+        ])
+        if ctx is not None and start // BATCH % 50 == 49:
+            ctx.check_cancelled()
+    db.commit()
+    return {"products": len(ids), "changed": len(changed_at), "removed": len(gone), "rules": len(rules)}
+
+
+@job_handler("pricing.reprice")
+def reprice_job(db: Session, ctx: JobContext):
+    return reprice(db, ctx=ctx)
+
+
+# Also runs on this schedule so sales start and end on time.
+schedule("pricing.reprice", PRICING_REPRICE_SECONDS)
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import RoutingSession
+from model_folder.model import Product
+from util.changes import follower
+
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+# Entries expire after this long even without an invalidation; a backstop for
+# changes util.changes never reports (e.g. audit events dropped under load).
+PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "30"))
+
+
+class ProductCodeCache:
+    """
+    Bounded code -> product response cache, least recently used first out.
+
+    Invalidations bump `generation`; a value read from the database before an
+    invalidation is not stored afterwards (see `put`).
+    """
+
+    def __init__(self, max_size: int = PRODUCT_CACHE_SIZE, ttl: float = PRODUCT_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._codes: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, code: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(code)
+                return None
+            self._entries.move_to_end(code)
+            return entry[1]
+
+    def put(self, code: str, value: dict, generation: int) -> None:
+        """Store `value`, read from the database when the cache was at `generation`."""
+        with self._lock:
+            if generation != self.generation or self.max_size <= 0:
+                return
+            self._drop(code)
+            self._entries[code] = (time.monotonic() + self.ttl, value)
+            self._codes[value["id"]] = code
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, product_ids) -> None:
+        with self._lock:
+            self.generation += 1
+            for product_id in product_ids:
+                code = self._codes.get(product_id)
+                if code is not None:
+                    self._drop(code)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._codes.clear()
+
+    def _drop(self, code: str) -> None:
+        entry = self._entries.pop(code, None)
+        if entry is not None:
+            self._codes.pop(entry[1]["id"], None)
+
+
+cache = ProductCodeCache()
+
+
+def product_changed(db: Session, *product_ids: int) -> None:
+    """Drop these products from the cache once `db` commits. ORM changes to Product are tracked automatically."""
+    db.info.setdefault("changed_products", set()).update(product_ids)
+
+
+def catalogue_changed(db: Session) -> None:
+    """Clear the whole cache once `db` commits; for set-based updates whose rows are not known."""
+    db.info["catalogue_changed"] = True
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _track_products(session, flush_context):
+    ids = [obj.id for obj in chain(session.new, session.dirty, session.deleted) if isinstance(obj, Product) and obj.id is not None]
+    if ids:
+        product_changed(session, *ids)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _invalidate(session):
+    changed = session.info.pop("changed_products", None)
+    if session.info.pop("catalogue_changed", False):
+        cache.clear()
+    elif changed:
+        cache.invalidate(changed)
+
+
+def _invalidate_remote(product_ids: Optional[set]) -> None:
+    # Changes committed by any process (this one included) arrive through util.changes.
+    if product_ids is None:
+        cache.clear()
+    else:
+        cache.invalidate(product_ids)
+
+
+follower.listeners.append(_invalidate_remote)
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def _forget(session, previous_transaction):
+    session.info.pop("changed_products", None)
+    session.info.pop("catalogue_changed", None)
@@ -0,0 +1,145 @@
+import abc
+import importlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from starlette.responses import JSONResponse
+from util.auth import staff_id_from_header
+
+# Steady request rate and burst allowed per staff member (or per IP when unauthenticated).
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "20"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "40"))
+# /auth/login runs bcrypt; limit it per client IP.
+RATE_LIMIT_LOGIN_PER_MINUTE = float(os.getenv("RATE_LIMIT_LOGIN_PER_MINUTE", "10"))
+RATE_LIMIT_LOGIN_BURST = int(os.getenv("RATE_LIMIT_LOGIN_BURST", "5"))
+# Requests a single staff member may have in flight in one worker process. The count is
+# not shared, so across the server the cap is this times the number of workers (WEB_CONCURRENCY).
+RATE_LIMIT_CONCURRENCY = int(os.getenv("RATE_LIMIT_CONCURRENCY", "8"))
+# "package.module:ClassName" of a RateLimitBackend shared between processes; in-memory if unset.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "")
+# Take the client IP from X-Forwarded-For (only behind a trusted proxy).
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "") == "1"
+
+LOGIN_PATH = "/auth/login"
+# Full listings and exports cost more tokens than single-row requests.
+PATH_COST = {
+    ("GET", "/products/"): 5,
+    ("GET", "/orderdetails/active"): 5,
+    ("GET", "/users/"): 5,
+    ("POST", "/products/export"): 20,
+}
+# Long-lived streams are not counted against the concurrent request cap.
+UNCAPPED_PATHS = {"/products/stream"}
+
+
+class RateLimitBackend(abc.ABC):
+    """
+    Token-bucket store.
+
+    Subclass this to keep buckets in a store shared by every worker (Redis,
+    memcached...) and point RATE_LIMIT_BACKEND at the subclass. `take` is a
+    coroutine so a networked store can be awaited without blocking the event loop.
+    """
+
+    @abc.abstractmethod
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1.0) -> float:
+        """Take `cost` tokens from `key`'s bucket; return 0 if allowed, else seconds until it would be."""
+
+
+class MemoryBackend(RateLimitBackend):
+    """Per-process buckets, least recently used first out once `max_keys` is reached."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - last) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def load_backend(path: str = RATE_LIMIT_BACKEND) -> RateLimitBackend:
+    if not path:
+        return MemoryBackend()
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+
+def _too_many(retry_after: float, detail: str) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=429, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+class RateLimitMiddleware:
+    """
+    Token-bucket limits per staff id (from the JWT `id` claim) and, for
+    /auth/login and unauthenticated calls, per client IP, plus a cap on each
+    staff member's concurrent requests. Over-limit requests get 429 with
+    Retry-After before any handler or database work runs.
+
+    The buckets live in the configured backend; the concurrency cap is kept
+    per worker process (see RATE_LIMIT_CONCURRENCY).
+    """
+
+    def __init__(self, app, backend: Optional[RateLimitBackend] = None):
+        self.app = app
+        self.backend = backend or load_backend()
+        self._in_flight: dict[int, int] = {}
+
+    def _client_ip(self, scope, headers) -> str:
+        if RATE_LIMIT_TRUST_PROXY and headers.get("x-forwarded-for"):
+            return headers["x-forwarded-for"].split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        path = scope["path"]
+
+        if path == LOGIN_PATH:
+            wait = await self.backend.take(f"login:{self._client_ip(scope, headers)}", RATE_LIMIT_LOGIN_PER_MINUTE / 60, RATE_LIMIT_LOGIN_BURST)
+            if wait:
+                await _too_many(wait, "Too many login attempts")(scope, receive, send)
+                return
+            await self.app(scope, receive, send)
+            return
+
+        staff_id = staff_id_from_header(headers.get("authorization"))
+        bucket = f"staff:{staff_id}" if staff_id is not None else f"ip:{self._client_ip(scope, headers)}"
+        wait = await self.backend.take(bucket, RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, PATH_COST.get((scope["method"], path), 1))
+        if wait:
+            await _too_many(wait, "Rate limit exceeded")(scope, receive, send)
+            return
+        if staff_id is None or path in UNCAPPED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self._in_flight.get(staff_id, 0) >= RATE_LIMIT_CONCURRENCY:
+            await _too_many(1, "Too many concurrent requests")(scope, receive, send)
+            return
+        self._in_flight[staff_id] = self._in_flight.get(staff_id, 0) + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            remaining = self._in_flight[staff_id] - 1
+            if remaining:
+                self._in_flight[staff_id] = remaining
+            else:
+                del self._in_flight[staff_id]
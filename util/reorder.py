@@ -0,0 +1,92 @@
+import datetime
+import math
+import os
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from model_folder.model import Order_Detail, Product, ReorderPoint, Watermark
+from util.jobs import JobContext, job_handler, schedule
+
+REORDER_WINDOW_DAYS = int(os.getenv("REORDER_WINDOW_DAYS", "28"))
+REORDER_LEAD_DAYS = float(os.getenv("REORDER_LEAD_DAYS", "7"))
+REORDER_SAFETY_DAYS = float(os.getenv("REORDER_SAFETY_DAYS", "3"))
+REORDER_EVAL_SECONDS = float(os.getenv("REORDER_EVAL_SECONDS", "300"))
+# Products with no new sales are still re-checked this often, so velocity decays
+# as old lines fall out of the window.
+REORDER_REFRESH_HOURS = float(os.getenv("REORDER_REFRESH_HOURS", "24"))
+
+WATERMARK = "reorder.order_details"
+BATCH = 500
+
+
+def reorder_point_for(daily_velocity: float) -> int:
+    return math.ceil(daily_velocity * (REORDER_LEAD_DAYS + REORDER_SAFETY_DAYS))
+
+
+def recompute(db: Session, product_ids: list[int], now: datetime.datetime) -> int:
+    """Recompute velocity and reorder point for `product_ids` with one grouped query per batch."""
+    since = now - datetime.timedelta(days=REORDER_WINDOW_DAYS)
+    for start in range(0, len(product_ids), BATCH):
+        chunk = product_ids[start:start + BATCH]
+        sold = dict(
+            db.query(Order_Detail.product_id, func.sum(func.coalesce(Order_Detail.quantity, 1)))
+            .filter(Order_Detail.product_id.in_(chunk), Order_Detail.date >= since, Order_Detail.is_active == True)
+            .group_by(Order_Detail.product_id)
+            .all()
+        )
+        db.query(ReorderPoint).filter(ReorderPoint.product_id.in_(chunk)).delete(synchronize_session=False)
+        rows = []
+        for product_id in chunk:
+            velocity = (sold.get(product_id) or 0) / REORDER_WINDOW_DAYS
+            rows.append({
+                "product_id": product_id,
+                "daily_velocity": velocity,
+                "reorder_point": reorder_point_for(velocity),
+                "computed_at": now,
+            })
+        db.bulk_insert_mappings(ReorderPoint, rows)
+    return len(product_ids)
+
+
+def evaluate(db: Session, full: bool = False, ctx: JobContext | None = None) -> dict:
+    """
+    Bring reorder points up to date.
+
+    Only products that gained order lines since the last run (tracked by a
+    watermark on Order_Detail.id), plus products whose figures are older than
+    REORDER_REFRESH_HOURS, are recomputed; `full` recomputes the catalogue.
+    """
+    now = datetime.datetime.utcnow()
+    mark = db.get(Watermark, WATERMARK)
+    if mark is None:
+        mark = Watermark(name=WATERMARK, value=0)
+        db.add(mark)
+    last_id = mark.value or 0
+    max_id = db.query(func.max(Order_Detail.id)).scalar() or 0
+
+    if full:
+        product_ids = [pid for (pid,) in db.query(Product.id).order_by(Product.id)]
+    else:
+        touched = {
+            pid for (pid,) in db.query(Order_Detail.product_id)
+            .filter(Order_Detail.id > last_id, Order_Detail.id <= max_id, Order_Detail.product_id.isnot(None))
+            .distinct()
+        }
+        stale_before = now - datetime.timedelta(hours=REORDER_REFRESH_HOURS)
+        stale = {pid for (pid,) in db.query(ReorderPoint.product_id).filter(ReorderPoint.computed_at < stale_before)}
+        # Products that never sold have no row; the low-stock report treats them as reorder point 0.
+        product_ids = sorted(touched | stale)
+
+    if ctx is not None:
+        ctx.check_cancelled()
+    recompute(db, product_ids, now)
+    mark.value = max_id
+    db.commit()
+    return {"evaluated": len(product_ids), "watermark": max_id}
+
+
+@job_handler("reorder.evaluate")
+def evaluate_job(db: Session, ctx: JobContext):
+    return evaluate(db, full=bool(ctx.payload.get("full")), ctx=ctx)
+
+
+schedule("reorder.evaluate", REORDER_EVAL_SECONDS)
@@ -0,0 +1,140 @@
+from typing import Callable
+from sqlalchemy import Connection, Table, delete, inspect, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from database import enable_wal
+from model_folder import model
+from model_folder.model import SCHEMA_VERSION, SchemaVersion
+
+
+def _has_table(conn: Connection, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+
+def _create_table(table: Table) -> Callable[[Connection], None]:
+    """Create a table ahead of create_all, for columns added in the same step that reference it."""
+    return lambda conn: table.create(conn, checkfirst=True)
+
+
+def _columns(conn: Connection, table: str) -> set[str]:
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+def _add_column(table: str, column: str) -> Callable[[Connection], None]:
+    name = column.split()[0]
+
+    def step(conn: Connection) -> None:
+        # Also skipped when the column is already there (e.g. a table created by _create_table).
+        if _has_table(conn, table) and name not in _columns(conn, table):
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column}")
+    return step
+
+
+def _drop_column(table: str, column: str) -> Callable[[Connection], None]:
+    def step(conn: Connection) -> None:
+        if _has_table(conn, table) and column in _columns(conn, table):
+            conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {column}")
+    return step
+
+
+def _create_index(name: str, table: str, columns: str, unique: bool = False, where: str = "") -> Callable[[Connection], None]:
+    def step(conn: Connection) -> None:
+        if _has_table(conn, table):
+            conn.exec_driver_sql(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+                + (f" WHERE {where}" if where else "")
+            )
+    return step
+
+
+def _drop_index(name: str) -> Callable[[Connection], None]:
+    return lambda conn: conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
+# Steps that upgrade a database from (version - 1) to version. They run before
+# create_all and skip tables that do not exist yet: create_all then creates
+# those in their current shape. Only changes to existing tables belong here.
+MIGRATIONS: dict[int, list[Callable[[Connection], None]]] = {
+    3: [
+        _add_column("order_details", "quantity INTEGER DEFAULT 1"),
+        _create_index("ix_order_details_product_date", "order_details", "product_id, date"),
+    ],
+    5: [
+        _drop_index("ix_stock_movements_batch_id"),
+        _create_index("ix_stock_movements_batch_product", "stock_movements", "batch_id, product_id"),
+    ],
+    6: [
+        _create_table(model.Location.__table__),
+        _add_column("order_details", "location_id INTEGER REFERENCES locations (id)"),
+        _add_column("stock_movements", "location_id INTEGER REFERENCES locations (id)"),
+        _add_column("purchase_orders", "location_id INTEGER REFERENCES locations (id)"),
+    ],
+    8: [
+        _create_index("ix_orders_customer_date", "orders", "customer_id, order_date"),
+    ],
+    9: [
+        _add_column("products", "code VARCHAR"),
+        _create_index("ix_products_code", "products", "code", unique=True),
+    ],
+    15: [
+        _drop_column("stock_snapshots", "last_movement_id"),
+        _create_index("ix_stock_movements_time", "stock_movements", "created_at"),
+    ],
+    16: [
+        _add_column("jobs", "lease_until DATETIME"),
+        _add_column("jobs", "dedupe_key VARCHAR"),
+        _create_index("ux_jobs_queued_dedupe_key", "jobs", "dedupe_key", unique=True, where="status = 'queued'"),
+    ],
+    17: [
+        _add_column("idempotency_keys", "locked_until DATETIME"),
+    ],
+}
+
+
+def _found_version(conn: Connection):
+    """The database's schema version: None if it is empty, 0 if its tables predate versioning."""
+    tables = set(inspect(conn).get_table_names())
+    if SchemaVersion.__tablename__ in tables:
+        found = conn.execute(select(SchemaVersion.version)).scalar()
+        if found is not None:
+            return found
+    return 0 if tables & set(model.Base.metadata.tables) else None
+
+
+def bootstrap_schema(engine) -> int:
+    """
+    Apply pending migrations, create missing tables and stamp the schema version.
+
+    A database whose tables were created before schema versioning (no
+    version row) is upgraded from version 0. This is the only place DDL
+    runs; call it from a deploy step (`python createtables.py`), never from
+    the API workers.
+    """
+    with engine.begin() as conn:
+        found = _found_version(conn)
+        if found is not None and found > SCHEMA_VERSION:
+            raise RuntimeError(f"Database schema is at version {found}, newer than this code ({SCHEMA_VERSION})")
+
+        if found is not None:
+            for version in range(found + 1, SCHEMA_VERSION + 1):
+                for step in MIGRATIONS.get(version, []):
+                    step(conn)
+        model.Base.metadata.create_all(bind=conn)
+
+        conn.execute(delete(SchemaVersion))
+        conn.execute(insert(SchemaVersion).values(version=SCHEMA_VERSION))
+    # After the first write: SQLite only persists WAL mode once the file has pages.
+    enable_wal(engine)
+    return SCHEMA_VERSION
+
+
+def verify_schema(engine) -> None:
+    """Fail fast if the database has not been bootstrapped to SCHEMA_VERSION (one SELECT, no DDL)."""
+    try:
+        with engine.connect() as conn:
+            found = conn.execute(select(SchemaVersion.version)).scalar()
+    except SQLAlchemyError:
+        found = None
+    if found != SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {found}, expected {SCHEMA_VERSION}; run `python createtables.py` first"
+        )
@@ -0,0 +1,234 @@
+import codecs
+import csv
+import datetime
+from typing import Optional
+from sqlalchemy import Integer, Select, String, and_, case, func, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from model_folder.model import LocationStock, Product, StockTake, StockTakeLine
+from util.ledger import record_movements
+
+# Count lines validated and staged per round trip.
+BATCH = 5000
+# Rejected lines listed in an upload result; the rest are only counted.
+MAX_REJECTED = 100
+
+PRODUCT_COLUMNS = ("product_id", "code")
+COUNT_COLUMNS = ("counted", "quantity")
+
+
+class CountParser:
+    """
+    Incremental parser for count files fed in arbitrary byte chunks.
+
+    A count file is UTF-8 CSV with a header row naming the product column
+    (`product_id` or `code`) and the count column (`counted` or `quantity`);
+    other columns are ignored. Every row is one line of the file.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._tail = ""
+        self.line = 0
+        self.by_code = False
+        self._columns: Optional[tuple[int, int]] = None
+
+    def feed(self, data: bytes, final: bool = False) -> list[tuple[int, str, str]]:
+        """(line number, product id or code, count) for every complete row in `data`; raises ValueError on a bad header."""
+        lines = (self._tail + self._decoder.decode(data, final)).split("\n")
+        self._tail = "" if final else lines.pop()
+        rows = []
+        for fields in csv.reader(lines):
+            self.line += 1
+            if not fields or not any(f.strip() for f in fields):
+                continue
+            if self._columns is None:
+                self._columns = self._header(fields)
+                continue
+            product, counted = self._columns
+            rows.append((self.line, _field(fields, product), _field(fields, counted)))
+        if final and self._columns is None:
+            raise ValueError("Count file is empty")
+        return rows
+
+    def _header(self, fields: list[str]) -> tuple[int, int]:
+        names = [f.strip().lower() for f in fields]
+        product = next((name for name in PRODUCT_COLUMNS if name in names), None)
+        counted = next((name for name in COUNT_COLUMNS if name in names), None)
+        if product is None or counted is None:
+            raise ValueError(f"Count file header needs one of {PRODUCT_COLUMNS} and one of {COUNT_COLUMNS}")
+        self.by_code = product == "code"
+        return names.index(product), names.index(counted)
+
+
+def _field(fields: list[str], index: int) -> str:
+    return fields[index].strip() if index < len(fields) else ""
+
+
+def _whole(text: str) -> Optional[int]:
+    try:
+        value = int(text)
+    except ValueError:
+        return None
+    return value if value >= 0 else None
+
+
+def _upsert_lines(db: Session, stock_take_id: int, counts: dict[int, int]) -> None:
+    """Add counts to the staged lines, creating missing ones; the same product counted in several places sums."""
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        _add_lines(db, stock_take_id, counts)
+        return
+    ins = (postgresql if dialect == "postgresql" else sqlite).insert(StockTakeLine)
+    # executemany of one cached statement; a multi-row VALUES would be recompiled for every batch.
+    db.execute(
+        ins.on_conflict_do_update(
+            index_elements=[StockTakeLine.stock_take_id, StockTakeLine.product_id],
+            set_={"counted": StockTakeLine.counted + ins.excluded.counted},
+        ),
+        [{"stock_take_id": stock_take_id, "product_id": product_id, "counted": counted} for product_id, counted in counts.items()],
+    )
+
+
+def _add_lines(db: Session, stock_take_id: int, counts: dict[int, int]) -> None:
+    """Portable fallback for _upsert_lines: SELECT ... FOR UPDATE the existing lines, then UPDATE or INSERT."""
+    held = {
+        line.product_id: line
+        for line in db.query(StockTakeLine)
+        .filter(StockTakeLine.stock_take_id == stock_take_id, StockTakeLine.product_id.in_(list(counts)))
+        .with_for_update()
+    }
+    for product_id, counted in counts.items():
+        if product_id in held:
+            held[product_id].counted += counted
+        else:
+            db.add(StockTakeLine(stock_take_id=stock_take_id, product_id=product_id, counted=counted))
+    db.flush()
+
+
+def stage_counts(db: Session, stock_take_id: int, rows: list[tuple[int, str, str]], by_code: bool) -> tuple[int, list[tuple[int, str]]]:
+    """
+    Validate and stage parsed count rows, BATCH at a time.
+
+    Products are resolved with one IN query per batch. Returns the number of
+    rows staged and the (line, reason) of every row rejected. The caller commits.
+    """
+    staged, rejected = 0, []
+    for start in range(0, len(rows), BATCH):
+        chunk = rows[start:start + BATCH]
+        valid = []
+        for line, key, counted in chunk:
+            quantity, product_id = _whole(counted), _whole(key)
+            if quantity is None:
+                rejected.append((line, "count must be a whole number of at least 0"))
+            elif not by_code and not product_id:
+                rejected.append((line, "product_id must be a positive whole number"))
+            else:
+                valid.append((line, key if by_code else product_id, quantity))
+        keys = {key for _, key, _ in valid}
+        if by_code:
+            found = dict(db.query(Product.code, Product.id).filter(Product.code.in_(keys)).all())
+        else:
+            found = {pid: pid for (pid,) in db.query(Product.id).filter(Product.id.in_(keys))}
+        counts: dict[int, int] = {}
+        for line, key, counted in valid:
+            if key not in found:
+                rejected.append((line, "unknown product"))
+                continue
+            counts[found[key]] = counts.get(found[key], 0) + counted
+            staged += 1
+        if counts:
+            _upsert_lines(db, stock_take_id, counts)
+    return staged, rejected
+
+
+def _on_record(take: StockTake):
+    """Stock on record for each staged line (correlated on StockTakeLine.product_id)."""
+    if take.location_id is None:
+        return select(func.coalesce(Product.unit, 0)).where(Product.id == StockTakeLine.product_id).scalar_subquery()
+    return func.coalesce(
+        select(LocationStock.quantity)
+        .where(LocationStock.location_id == take.location_id, LocationStock.product_id == StockTakeLine.product_id)
+        .scalar_subquery(),
+        0,
+    )
+
+
+def variance(take: StockTake) -> Select:
+    """
+    One row per staged line: product, expected and counted stock, the variance
+    and its value at list price, from a single join of the staged lines
+    against current stock (or against the stock recorded when applied).
+    """
+    if take.status == "applied":
+        expected = func.coalesce(StockTakeLine.expected, 0)
+    elif take.location_id is None:
+        expected = func.coalesce(Product.unit, 0)
+    else:
+        expected = func.coalesce(LocationStock.quantity, 0)
+    difference = StockTakeLine.counted - expected
+    query = (
+        select(
+            StockTakeLine.product_id.label("product_id"),
+            Product.code.label("code"),
+            Product.name.label("name"),
+            expected.label("expected"),
+            StockTakeLine.counted.label("counted"),
+            difference.label("variance"),
+            (difference * func.coalesce(Product.price, 0)).label("value"),
+        )
+        .join(Product, Product.id == StockTakeLine.product_id)
+        .where(StockTakeLine.stock_take_id == take.id)
+    )
+    if take.status != "applied" and take.location_id is not None:
+        query = query.outerjoin(
+            LocationStock, and_(LocationStock.location_id == take.location_id, LocationStock.product_id == StockTakeLine.product_id),
+        )
+    return query
+
+
+def variance_summary(db: Session, take: StockTake) -> dict:
+    """Totals of the variance report in one aggregate query."""
+    lines = variance(take).subquery()
+    row = db.execute(select(
+        func.count(),
+        func.coalesce(func.sum(case((lines.c.variance != 0, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((lines.c.variance > 0, lines.c.variance), else_=0)), 0),
+        func.coalesce(func.sum(case((lines.c.variance < 0, -lines.c.variance), else_=0)), 0),
+        func.coalesce(func.sum(lines.c.value), 0),
+    )).one()
+    return {"lines": row[0], "lines_with_variance": row[1], "units_over": row[2], "units_short": row[3], "net_value": row[4]}
+
+
+def apply_stock_take(db: Session, take: StockTake) -> Optional[str]:
+    """
+    Set stock to the counted quantities in the caller's transaction.
+
+    Claims the open session, locks the counted products, records the stock on
+    record against every line, and writes the differences as "count"
+    movements with record_movements. Returns the movement batch id, or None if
+    the session was no longer open. The caller commits.
+    """
+    claimed = (
+        db.query(StockTake)
+        .filter(StockTake.id == take.id, StockTake.status == "open")
+        .update({StockTake.status: "applied", StockTake.applied_at: datetime.datetime.utcnow()}, synchronize_session=False)
+    )
+    if claimed != 1:
+        return None
+    counted_products = select(StockTakeLine.product_id).where(StockTakeLine.stock_take_id == take.id)
+    # On PostgreSQL, movements of these products wait until the count is applied.
+    db.query(Product.id).filter(Product.id.in_(counted_products)).order_by(Product.id).with_for_update().all()
+    db.query(StockTakeLine).filter(StockTakeLine.stock_take_id == take.id).update(
+        {StockTakeLine.expected: _on_record(take)}, synchronize_session=False
+    )
+    columns = [
+        StockTakeLine.product_id.label("product_id"),
+        (StockTakeLine.counted - StockTakeLine.expected).label("quantity"),
+        literal(f"stock_take:{take.id}", String).label("reference"),
+    ]
+    if take.location_id is not None:
+        columns.append(literal(take.location_id, Integer).label("location_id"))
+    batch_id = record_movements(db, select(*columns).where(StockTakeLine.stock_take_id == take.id), "count")
+    db.query(StockTake).filter(StockTake.id == take.id).update({StockTake.batch_id: batch_id}, synchronize_session=False)
+    return batch_id
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import threading
+import traceback
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from model_folder.model import Product
+from util.changes import ChangeFollower, follower
+
+# Events a subscriber may have waiting; a client that falls this far behind is dropped.
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "256"))
+# Changes committed within this window go out together, one query per batch.
+STREAM_BATCH_SECONDS = float(os.getenv("STREAM_BATCH_SECONDS", "0.25"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+
+DROPPED = {"type": "dropped"}
+CLOSED = {"type": "closed"}
+
+
+class Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.closed = False
+
+    def _end(self, event: dict) -> None:
+        # Make room so the final event always fits.
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+        self.closed = True
+
+
+class BroadcastHub:
+    """
+    Fan-out of events to subscribers, each with a bounded queue.
+
+    Must be used from the event loop thread. A subscriber whose queue is full
+    is sent DROPPED and removed rather than buffered further; the client is
+    expected to reload and reconnect.
+    """
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: set[Subscriber] = set()
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event: dict) -> None:
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber._end(DROPPED)
+                self._subscribers.discard(subscriber)
+
+    def close(self) -> None:
+        for subscriber in self._subscribers:
+            subscriber._end(CLOSED)
+        self._subscribers.clear()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+
+def _load_products(ids: list[int]) -> list[dict]:
+    with SessionLocal() as db:
+        rows = db.query(Product.id, Product.price, Product.unit, Product.status).filter(Product.id.in_(ids)).all()
+    return [{"type": "product", "id": id_, "price": price, "unit": unit, "status": status} for id_, price, unit, status in rows]
+
+
+class ProductFeed:
+    """
+    Publishes product price/unit/status changes to `hub`.
+
+    Changed product ids come from `source`, which sees the commits of every
+    worker process; they are collected and, after STREAM_BATCH_SECONDS,
+    loaded with one query and broadcast.
+    """
+
+    def __init__(self, hub: BroadcastHub, source: ChangeFollower = follower):
+        self.hub = hub
+        self.source = source
+        self._pending: set[int] = set()
+        self._resync = False
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start publishing; call from the event loop (app startup)."""
+        self._loop = asyncio.get_running_loop()
+        self._pending, self._resync = set(), False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        self.source.listeners.append(self.notify)
+
+    async def stop(self) -> None:
+        if self.notify in self.source.listeners:
+            self.source.listeners.remove(self.notify)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.hub.close()
+
+    def notify(self, product_ids: Optional[set]) -> None:
+        """Thread-safe: queue changed products, or a full resync when `product_ids` is None."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        with self._lock:
+            if product_ids is None:
+                self._resync = True
+            else:
+                self._pending.update(product_ids)
+        self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(STREAM_BATCH_SECONDS)
+            self._wake.clear()
+            with self._lock:
+                ids, self._pending = self._pending, set()
+                resync, self._resync = self._resync, False
+            if not len(self.hub):
+                continue
+            if resync:
+                self.hub.publish({"type": "resync"})
+                continue
+            try:
+                events = await run_in_threadpool(_load_products, sorted(ids))
+            except Exception:
+                traceback.print_exc()
+                continue
+            for event in events:
+                self.hub.publish(event)
+
+
+def format_event(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+hub = BroadcastHub()
+product_feed = ProductFeed(hub)
@@ -0,0 +1,33 @@
+from typing import Optional, TypeVar
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from util.audit import row_updated
+
+T = TypeVar("T")
+
+
+def update_returning(db: Session, model: type[T], values: dict, *criteria) -> Optional[T]:
+    """
+    Apply `values` to the `model` row matching `criteria` and return it as a mapped object.
+
+    On dialects with UPDATE ... RETURNING (PostgreSQL, SQLite >= 3.35) this is
+    a single statement that also refreshes any copy already in the session;
+    elsewhere it falls back to SELECT ... FOR UPDATE followed by the UPDATE.
+    Returns None when no row matched. The caller commits.
+    """
+    db.flush()  # pending changes to the same row must not be overwritten by the returned values
+    if db.get_bind().dialect.update_returning:
+        obj = db.scalars(
+            update(model).where(*criteria).values(values).returning(model),
+            execution_options={"synchronize_session": False, "populate_existing": True, "audited": True},
+        ).first()
+        if obj is not None:
+            row_updated(db, obj, values)
+        return obj
+    obj = db.query(model).filter(*criteria).with_for_update().first()
+    if obj is None:
+        return None
+    for field, value in values.items():
+        setattr(obj, field, value)
+    db.flush()
+    return obj